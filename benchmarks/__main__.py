@@ -0,0 +1,114 @@
+"""Benchmarks of the gas station simulator.
+
+Run the benchmarks and save their results:
+
+    python -m benchmarks run --durations day week month --sizes small reference large --output current.json
+
+Cases of the fast engine are run with `--engines simpy fast` and named with a `-fast` suffix.
+
+Compare the results with a baseline, exiting with an error if any case has regressed:
+
+    python -m benchmarks compare baseline.json current.json --threshold 0.1
+"""
+import argparse
+import datetime
+import json
+import platform
+import sys
+from pathlib import Path
+from typing import Dict, Any, List
+
+from benchmarks._runner import run_case
+from benchmarks._scenarios import DURATIONS, STATION_SIZES
+
+# Metrics for which a higher value is better; for all the other ones a lower value is better.
+_THROUGHPUT_METRICS = ('events_per_second', 'customers_per_second')
+
+
+def _run(arguments: argparse.Namespace) -> int:
+    cases = []
+    for engine in arguments.engines:
+        for size in arguments.sizes:
+            for duration in arguments.durations:
+                for repeat in range(arguments.repeats):
+                    case = run_case(size=size, duration=duration, seed=arguments.seed + repeat, engine=engine)
+                    print(
+                        f'{case["name"]}: {case["customers_per_second"]:,.0f} customers/s,'
+                        f' {case["events_per_second"]:,.0f} events/s, peak RSS {case["peak_rss_mb"]:,.1f} MB,'
+                        f' ' + ', '.join(f'{phase} {value:.3f}s' for phase, value in case['phases'].items())
+                    )
+                    cases.append(case)
+
+    report = {
+        'metadata': {
+            'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'cases': cases,
+    }
+    Path(arguments.output).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+def _get_metrics(cases: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    # Repeated cases are reduced to their best value, which is the least noisy one.
+    metrics: Dict[str, Dict[str, float]] = {}
+    for case in cases:
+        values = {key: case[key] for key in _THROUGHPUT_METRICS + ('peak_rss_mb',)}
+        values.update({f'phases.{phase}': value for phase, value in case['phases'].items()})
+        best_values = metrics.setdefault(case['name'], values)
+        for key, value in values.items():
+            best_values[key] = max(best_values[key], value) if key in _THROUGHPUT_METRICS \
+                else min(best_values[key], value)
+    return metrics
+
+
+def _compare(arguments: argparse.Namespace) -> int:
+    baseline = _get_metrics(json.loads(Path(arguments.baseline).read_text())['cases'])
+    current = _get_metrics(json.loads(Path(arguments.current).read_text())['cases'])
+
+    regressions = 0
+    for name in sorted(baseline.keys() & current.keys()):
+        for key, baseline_value in baseline[name].items():
+            current_value = current[name][key]
+            # Very short phases are dominated by noise.
+            if not baseline_value or (key.startswith('phases.') and baseline_value < arguments.min_time):
+                continue
+            change = (current_value - baseline_value) / baseline_value
+            worse = -change if key in _THROUGHPUT_METRICS else change
+            status = 'REGRESSION' if worse > arguments.threshold else 'ok'
+            regressions += status == 'REGRESSION'
+            print(f'{name:<20} {key:<32} {baseline_value:>14.3f} -> {current_value:>14.3f} ({change:+.1%}) {status}')
+
+    for name in sorted(baseline.keys() ^ current.keys()):
+        print(f'{name:<20} present in only one of the results')
+
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('--durations', nargs='+', choices=list(DURATIONS), default=['day', 'week', 'month'])
+    run_parser.add_argument('--sizes', nargs='+', choices=list(STATION_SIZES), default=['reference'])
+    run_parser.add_argument('--engines', nargs='+', choices=['simpy', 'fast'], default=['simpy'])
+    run_parser.add_argument('--repeats', type=int, default=1)
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--output', default='benchmark_results.json')
+
+    compare_parser = subparsers.add_parser('compare', help='compare the results with a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='allowed relative worsening')
+    compare_parser.add_argument('--min-time', type=float, default=0.05, help='ignore phases shorter than this')
+
+    arguments = parser.parse_args()
+    return _run(arguments) if arguments.command == 'run' else _compare(arguments)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Any
+
+from benchmarks._scenarios import DURATIONS, get_simulation_settings, get_profit_calculation_settings
+from gas_station_simulator import GasStationSimulator, LoggingSettings, MonitoringSettings, ProfitCalculator
+
+
+def _get_peak_rss_mb() -> float:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak_rss / 1024**2 if sys.platform == 'darwin' else peak_rss / 1024
+
+
+def _run_case(size: str, duration: str, seed: int, engine: str) -> Dict[str, Any]:
+    settings = get_simulation_settings(size)
+    simulation_time = DURATIONS[duration]
+
+    with tempfile.TemporaryDirectory() as monitored_resources_path:
+        simulator = GasStationSimulator(
+            settings=settings,
+            monitoring_settings=MonitoringSettings(flush_interval=60**2, path=Path(monitored_resources_path)),
+            logging_settings=LoggingSettings.quiet(),
+            seed=seed,
+            engine=engine,
+        )
+
+        start_time = time.perf_counter()
+        simulator.run(time=simulation_time, return_dataframe=False)
+        simulation_time_spent = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        simulator.get_monitored_resources()
+        monitoring_time_spent = time.perf_counter() - start_time
+        monitoring_flush_time_spent = simulator.monitoring_flush_time
+
+    start_time = time.perf_counter()
+    results = simulator.get_results()
+    dataframe_time_spent = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    ProfitCalculator(
+        simulation_settings=settings,
+        profit_calculation_settings=get_profit_calculation_settings(),
+        results=results,
+        simulation_time=simulation_time,
+    ).calculate()
+    profit_time_spent = time.perf_counter() - start_time
+
+    events_quantity = simulator.events_quantity
+    customers_quantity = len(results)
+    return {
+        'name': f'{size}-{duration}' + ('-fast' if engine == 'fast' else ''),
+        'size': size,
+        'duration': duration,
+        'engine': engine,
+        'seed': seed,
+        'events': events_quantity,
+        'customers': customers_quantity,
+        'events_per_second': events_quantity / simulation_time_spent,
+        'customers_per_second': customers_quantity / simulation_time_spent,
+        'peak_rss_mb': _get_peak_rss_mb(),
+        'phases': {
+            # The monitored data is flushed during the simulation, so its time is a part of the simulation phase.
+            'simulation': simulation_time_spent,
+            'monitoring_flush': monitoring_flush_time_spent,
+            'monitoring_alignment': monitoring_time_spent,
+            'dataframe': dataframe_time_spent,
+            'profit_calculation': profit_time_spent,
+        },
+    }
+
+
+def run_case(size: str, duration: str, seed: int = 0, engine: str = 'simpy') -> Dict[str, Any]:
+    """Runs a single benchmark case in a fresh process, so that its peak memory usage is measured in isolation."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(_run_case, size, duration, seed, engine).result()
@@ -0,0 +1,53 @@
+from typing import Dict, Tuple
+
+from gas_station_simulator import SimulationSettings, ProfitCalculationSettings, Exponential, Gamma, Normal, \
+    Binomial, UniformInt
+
+DURATIONS: Dict[str, int] = {
+    'day': 60**2 * 24,
+    'week': 60**2 * 24 * 7,
+    'month': 60**2 * 24 * 30,
+    'year': 60**2 * 24 * 365,
+}
+
+# Pumps quantity, cashiers quantity and road flow; the reference size is the one from `simulator.py`.
+STATION_SIZES: Dict[str, Tuple[int, int, int]] = {
+    'small': (5, 2, 40_000),
+    'reference': (10, 3, 80_000),
+    'large': (20, 6, 160_000),
+}
+
+
+def get_simulation_settings(size: str) -> SimulationSettings:
+    pumps_quantity, cashiers_quantity, cars_road_flow = STATION_SIZES[size]
+
+    margin_arrivals_impact = -0.1
+    every_n_car_to_enter_the_station = 50
+    cars_per_second_on_the_road = cars_road_flow / (24 * 60 * 60)
+    cars_per_second_to_enter_the_station = cars_per_second_on_the_road / every_n_car_to_enter_the_station
+    average_seconds_per_car_to_enter_the_station = 1 / cars_per_second_to_enter_the_station
+    average_arrival_time = average_seconds_per_car_to_enter_the_station / (1 + margin_arrivals_impact)
+
+    return SimulationSettings(
+        pumps_quantity=pumps_quantity,
+        cashiers_quantity=cashiers_quantity,
+        pump_working_time=Exponential(2 * 24 * 60 * 60 / pumps_quantity),
+        pump_outage_time=Gamma(50 * 60, 250 / (50 * 60)),
+        interaction_with_cashier_time=Normal(2 * 60, 20),
+        interaction_with_cashier_while_getting_food_time=UniformInt(30, 60),
+        food_preparation_time=UniformInt(2 * 60, 3 * 60),
+        if_eating=Binomial(1, 0.4),
+        next_car_arrival_time=Exponential(average_arrival_time),
+        customer_fuel_needed=Exponential(50),
+        pump_fueling_speed=0.2,
+    )
+
+
+def get_profit_calculation_settings() -> ProfitCalculationSettings:
+    checkout_monthly_cost = 40_000
+    return ProfitCalculationSettings(
+        hot_dog_profit=2.5,
+        fuel_profit_per_litre=0.2,
+        cashier_hourly_cost=checkout_monthly_cost / 30 / 24,
+        pump_monthly_depreciation_cost=50_000,
+    )
@@ -1,3 +1,21 @@
+from ._version import __version__
+from ._distributions import Distribution, Exponential, Gamma, Normal, Binomial, UniformInt, ArrivalRateProfile
 from ._gas_station_simulator import GasStationSimulator
-from ._settings import SimulationSettings, ProfitCalculationSettings
+from ._staffing import StaffingSchedule
+from ._settings import SimulationSettings, ProfitCalculationSettings, MonitoringSettings, \
+    LoggingSettings
 from ._profit_calculator import ProfitCalculator
+from ._batch_profit_calculator import BatchProfitCalculator
+from ._customer_results import CustomerData, ResultsSummary
+from ._results_sinks import ResultsSink, CsvResultsSink, ParquetResultsSink, FeatherResultsSink, CallbackResultsSink
+from ._kpi import KpiAccumulator
+from ._instrumentation import InstrumentationReport
+from ._parameter_sweep import ParameterSweep
+from ._replications import ReplicationRunner
+from ._estimator import CapacityEstimator
+from ._checkpoint import SimulationCheckpoint
+from ._network import GasStationNetwork
+from ._staffing_optimizer import StaffingOptimizer
+from ._results_cache import ResultsCache, CachedRun
+from ._trace import TraceRecorder, TraceReader, TraceEvent
+from ._streaming import SimulationStream, SimulationSnapshot, SimulationService
@@ -0,0 +1,156 @@
+import dataclasses
+import itertools
+from typing import Dict, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from gas_station_simulator._customer_results import ResultsSummary
+from gas_station_simulator._profit_calculator import _get_cashier_hours, _get_months
+from gas_station_simulator._settings import SimulationSettings, ProfitCalculationSettings
+
+_RUN_COLUMNS = (
+    'simulation_time',
+    'pumps_quantity',
+    'cashier_hours',
+    'cars_quantity',
+    'missed_cars_quantity',
+    'hot_dogs_quantity',
+    'fuel_needed',
+)
+_PRICES = tuple(field.name for field in dataclasses.fields(ProfitCalculationSettings))
+
+
+class BatchProfitCalculator:
+    """Calculates the monthly results of `ProfitCalculator` for many runs under many profit calculation settings.
+
+    `runs` is a DataFrame with a row per run, e.g. built with `summarize_run`, which may contain other columns too.
+    The results of all the runs and settings are computed at once by broadcasting, as matrices with a row per run and
+    a column per settings, so new prices and costs are evaluated without simulating again. Unlike in `ProfitCalculator`
+    the values are not truncated to integers.
+    """
+
+    def __init__(self, runs: pd.DataFrame, profit_calculation_settings: Sequence[ProfitCalculationSettings]):
+        missing_columns = [column for column in _RUN_COLUMNS if column not in runs.columns]
+        if missing_columns:
+            raise ValueError(f'The runs lack the columns {", ".join(missing_columns)}.')
+        if not len(profit_calculation_settings):
+            raise ValueError('At least one profit calculation settings is required.')
+        self.runs = runs
+        self.profit_calculation_settings = list(profit_calculation_settings)
+        self.settings = pd.DataFrame(
+            [[getattr(settings, price) for price in _PRICES] for settings in self.profit_calculation_settings],
+            columns=list(_PRICES),
+        )
+
+    @staticmethod
+    def summarize_run(
+            simulation_settings: SimulationSettings,
+            results: Union[pd.DataFrame, ResultsSummary],
+            simulation_time: int,
+    ) -> Dict[str, float]:
+        """Returns the quantities of a run which its profit depends on, a row of the runs."""
+        summary = results if isinstance(results, ResultsSummary) else ResultsSummary.from_dataframe(results)
+        return {
+            'simulation_time': simulation_time,
+            'pumps_quantity': simulation_settings.pumps_quantity,
+            'cashier_hours': _get_cashier_hours(simulation_settings, simulation_time),
+            'cars_quantity': summary.cars_quantity,
+            'missed_cars_quantity': summary.missed_cars_quantity,
+            'hot_dogs_quantity': summary.hot_dogs_quantity,
+            'fuel_needed': summary.fuel_needed,
+        }
+
+    @classmethod
+    def from_grid(
+            cls,
+            runs: pd.DataFrame,
+            base_settings: ProfitCalculationSettings,
+            grid: Mapping[str, Sequence[float]],
+    ) -> 'BatchProfitCalculator':
+        """Creates a calculator of the cartesian product of the `grid` values applied to `base_settings`."""
+        unknown_keys = set(grid) - set(_PRICES)
+        if unknown_keys:
+            raise ValueError(f'Unknown profit calculation settings {", ".join(sorted(unknown_keys))}.')
+        return cls(runs, [
+            dataclasses.replace(base_settings, **dict(zip(grid, values)))
+            for values in itertools.product(*grid.values())
+        ])
+
+    def calculate(self) -> Dict[str, np.ndarray]:
+        """Returns the keys of `ProfitCalculator.calculate` as matrices of shape (runs, settings)."""
+        runs = {column: self.runs[column].to_numpy(dtype=np.float64)[:, np.newaxis] for column in _RUN_COLUMNS}
+        prices = {price: self.settings[price].to_numpy(dtype=np.float64)[np.newaxis, :] for price in _PRICES}
+        months = _get_months(runs['simulation_time'])
+        shape = (len(self.runs), len(self.settings))
+
+        results = {
+            'pumps_cost': runs['pumps_quantity'] * prices['pump_monthly_depreciation_cost'],
+            'cashiers_cost': runs['cashier_hours'] * prices['cashier_hourly_cost'] / months,
+            'hot_dogs_income': runs['hot_dogs_quantity'] * prices['hot_dog_profit'] / months,
+            'fuel_income': runs['fuel_needed'] * prices['fuel_profit_per_litre'] / months,
+            'cars_quantity': runs['cars_quantity'] / months,
+            'missed_cars_quantity': runs['missed_cars_quantity'] / months,
+        }
+        results = {key: np.broadcast_to(value, shape) for key, value in results.items()}
+        results['total_cost'] = results['pumps_cost'] + results['cashiers_cost']
+        results['total_income'] = results['hot_dogs_income'] + results['fuel_income']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            results['income_per_car'] = results['total_income'] / results['cars_quantity']
+        results['profit'] = results['total_income'] - results['total_cost']
+        results['missed_income'] = results['income_per_car'] * results['missed_cars_quantity']
+        return results
+
+    def get_matrix(self, key: str = 'profit') -> pd.DataFrame:
+        """Returns one of the results with the runs' index as rows and the settings' values as columns."""
+        return pd.DataFrame(
+            self.calculate()[key],
+            index=self.runs.index,
+            columns=pd.MultiIndex.from_frame(self.settings),
+        )
+
+    def sensitivity(
+            self,
+            variation: float = 0.1,
+            ranges: Optional[Mapping[str, Tuple[float, float]]] = None,
+            key: str = 'profit',
+    ) -> pd.DataFrame:
+        """Returns the data of a tornado chart of `key`, averaged over the runs, around every profit calculation
+        settings.
+
+        Every price or cost is moved separately to its `ranges` bounds, by default the value of the settings lowered
+        and raised by `variation`. The rows are sorted by the swing of the result, the widest first.
+        """
+        ranges = dict(ranges or {})
+        unknown_keys = set(ranges) - set(_PRICES)
+        if unknown_keys:
+            raise ValueError(f'Unknown profit calculation settings {", ".join(sorted(unknown_keys))}.')
+
+        scenarios = []
+        rows = []
+        for index, settings in enumerate(self.profit_calculation_settings):
+            base_index = len(scenarios)
+            scenarios.append(settings)
+            for price in _PRICES:
+                value = getattr(settings, price)
+                low_value, high_value = ranges.get(price, (value * (1 - variation), value * (1 + variation)))
+                rows.append({
+                    'settings': index,
+                    'parameter': price,
+                    'base_index': base_index,
+                    'low_index': len(scenarios),
+                    'high_index': len(scenarios) + 1,
+                    'low_value': low_value,
+                    'high_value': high_value,
+                })
+                scenarios.append(dataclasses.replace(settings, **{price: low_value}))
+                scenarios.append(dataclasses.replace(settings, **{price: high_value}))
+
+        means = BatchProfitCalculator(self.runs, scenarios).calculate()[key].mean(axis=0)
+        tornado = pd.DataFrame(rows)
+        tornado['base'] = means[tornado.pop('base_index').to_numpy()]
+        tornado['low'] = means[tornado.pop('low_index').to_numpy()]
+        tornado['high'] = means[tornado.pop('high_index').to_numpy()]
+        tornado['swing'] = (tornado['high'] - tornado['low']).abs()
+        tornado.sort_values(by=['settings', 'swing'], ascending=[True, False], inplace=True, kind='stable')
+        return tornado.set_index(['settings', 'parameter'])
@@ -0,0 +1,144 @@
+import pickle
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from simpy import Process
+from simpy.events import Timeout
+
+from gas_station_simulator._customer_results import _CustomerResultsRecorder
+from gas_station_simulator._environment import _SimulationEnvironment
+from gas_station_simulator._gas_station import _GasStation
+from gas_station_simulator._kpi import KpiAccumulator
+from gas_station_simulator._monitored_resources import _ResourceMonitor
+from gas_station_simulator._settings import SimulationSettings, MonitoringSettings, _SampledSettings
+
+_CAR_GENERATOR = 'car generator'
+_PUMP_BREAKER = 'pump breaker'
+# Prefix of the processes following the staffing schedules, which is followed by the name of the resource.
+_STAFFING = 'staffing of '
+_PLACEHOLDER = 'placeholder'
+_CUSTOMER_REQUESTS = ('_pump_parking_place_request', '_pump_request', '_cashier_request')
+
+
+@dataclass
+class _RequestState:
+    """A request held or awaited by a customer, identified by its number, or by the station if `owner` is None.
+
+    The station's requests are the one of the pump breaker and the placeholders of the staffing schedules.
+    """
+    owner: Optional[int]
+    attribute: str
+    priority: int
+    preempt: bool
+    time: Optional[float]
+    usage_since: Optional[float]
+
+
+@dataclass
+class _SimulationState:
+    settings: SimulationSettings
+    seed: Optional[int]
+    common_random_numbers: bool
+    monitoring_settings: Optional[MonitoringSettings]
+    sampled_settings: _SampledSettings
+    results: _CustomerResultsRecorder
+    kpis: KpiAccumulator
+    time: float
+    next_car_number: int
+    parking_places_level: int
+    monitors: Dict[str, _ResourceMonitor]
+    pump_break_state: Dict[str, Any]
+    customers: List[Dict[str, Any]]
+    # Requests of every resource, first the ones holding it and then the waiting ones, both in their original order.
+    requests: Dict[str, List[_RequestState]]
+    # Processes with the remaining time of their timeouts, in the order the timeouts were scheduled, followed by the
+    # processes waiting for a resource.
+    processes: List[Tuple[Union[int, str], Optional[float]]]
+
+
+@dataclass
+class SimulationCheckpoint:
+    """Snapshot of a simulation between two runs, which can be resumed later or in another process.
+
+    The state is pickled when the checkpoint is taken, so every simulator restored from it gets its own copy and many
+    scenarios can be branched from a single warmed up station. Like any pickle, only load checkpoints you trust.
+    """
+    time: float
+    state: bytes
+
+    def save(self, path: Path):
+        with open(path, 'wb') as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: Path) -> 'SimulationCheckpoint':
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+
+
+def _get_pending_processes(
+        environment: _SimulationEnvironment,
+        processes: Dict[Union[int, str], Process],
+) -> List[Tuple[Union[int, str], Optional[float]]]:
+    scheduled = {id(event): (time, priority, eid) for time, priority, eid, event in environment._queue}  # noqa
+    timed, waiting = [], []
+    for key, process in processes.items():
+        target = process.target
+        if isinstance(target, Timeout) and id(target) in scheduled:
+            event_key = scheduled[id(target)]
+            timed.append((event_key, key, event_key[0] - environment.now))
+        else:
+            waiting.append((key, None))
+    return [(key, delay) for _, key, delay in sorted(timed, key=lambda item: item[0])] + waiting
+
+
+def _get_requests_state(gas_station: _GasStation) -> Dict[str, List[_RequestState]]:
+    owners = {}
+    for number, customer in gas_station.customers.items():
+        for attribute in _CUSTOMER_REQUESTS:
+            request = getattr(customer, attribute)
+            if request is not None:
+                owners[id(request)] = (number, attribute)
+    if gas_station.pump_break_request is not None:
+        owners[id(gas_station.pump_break_request)] = (None, 'pump_break_request')
+    for resource in (gas_station.fuel_pumps, gas_station.cashiers):
+        for placeholder in resource.placeholders:
+            owners[id(placeholder)] = (None, _PLACEHOLDER)
+
+    # Requests of a resource without priorities have none of their attributes.
+    return {
+        resource.name: [
+            _RequestState(
+                *owners[id(request)],
+                priority=getattr(request, 'priority', 0),
+                preempt=getattr(request, 'preempt', True),
+                time=getattr(request, 'time', None),
+                usage_since=getattr(request, 'usage_since', None),
+            )
+            for request in list(resource.users) + list(resource.put_queue)
+        ]
+        for resource in (gas_station.fuel_pumps, gas_station.fuel_pump_parking_place, gas_station.cashiers)
+    }
+
+
+def _restore_requests(gas_station: _GasStation, requests: Dict[str, List[_RequestState]]):
+    for resource in (gas_station.fuel_pumps, gas_station.fuel_pump_parking_place, gas_station.cashiers):
+        for state in requests[resource.name]:
+            request = resource.restore_request(state.priority, state.preempt, state.time, state.usage_since)
+            if state.attribute == _PLACEHOLDER:
+                resource.placeholders.append(request)
+                continue
+            owner = gas_station if state.owner is None else gas_station.customers[state.owner]
+            setattr(owner, state.attribute, request)
+
+
+def _assign_request_processes(gas_station: _GasStation):
+    # Restored requests are made outside of any process, but preemption interrupts the process of the request.
+    if gas_station.pump_break_request is not None:
+        gas_station.pump_break_request.proc = gas_station.pump_breaker
+    for customer in gas_station.customers.values():
+        for attribute in _CUSTOMER_REQUESTS:
+            request = getattr(customer, attribute)
+            if request is not None:
+                request.proc = customer._subprocess if attribute == '_cashier_request' else customer.process  # noqa
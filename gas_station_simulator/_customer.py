@@ -1,149 +1,384 @@
-import copy
-from dataclasses import dataclass, field
-from typing import Optional, Generator, Any
-import random
+import logging
+from enum import IntEnum
+from typing import Generator, Any, Dict, Optional, Union
 import simpy
-from simpy import Event
+from simpy import Event, Process
+from simpy.events import Timeout
+from simpy.resources.resource import Request
 
+from gas_station_simulator._customer_results import _CustomerResultsRecorder, CustomerData
 from gas_station_simulator._environment import _SimulationEnvironment
 from gas_station_simulator._gas_station import _GasStation
+from gas_station_simulator._kpi import KpiAccumulator
 from gas_station_simulator._settings import SimulationSettings
-
-
-@dataclass
-class CustomerData:
-    number: int
-    enter: bool
-    name: str = field(init=False, repr=False)
-    fuel_needed: int = field(init=False, repr=False)
-    expected_fueling_time: int = field(init=False, repr=False)
-    eating: bool = field(init=False, repr=False)
-    arrival_time: int = field(init=False, repr=False)
-    fueling_start_time: int = field(init=False, repr=False)
-    fueling_end_time: int = field(init=False, repr=False)
-    interacting_with_cashier_start_time: int = field(init=False, repr=False)
-    interacting_with_cashier_end_time: int = field(init=False, repr=False)
-    waiting_for_food_time_start_time: Optional[int] = field(init=False, repr=False)
-    waiting_for_food_time_end_time: Optional[int] = field(init=False, repr=False)
+from gas_station_simulator._trace import TraceEvent
+
+
+class _Stage(IntEnum):
+    """Steps of a customer's visit in the order they happen, so a restored customer can skip the finished ones."""
+    ENTERING = 0
+    WAITING_FOR_PUMP_PARKING_PLACE = 1
+    GETTING_TO_THE_PUMP = 2
+    WAITING_FOR_PUMP = 3
+    FUELING = 4
+    LEAVING_THE_PUMP = 5
+    GOING_TO_THE_BUILDING = 6
+    WAITING_FOR_CASHIER = 7
+    INTERACTING_WITH_CASHIER = 8
+    WAITING_FOR_FOOD = 9
+    WAITING_FOR_CASHIER_WITH_FOOD = 10
+    TAKING_THE_FOOD = 11
+    GOING_BACK_TO_THE_CAR = 12
+    LEAVING_THE_STATION = 13
+
+
+# Everything a customer needs to continue its visit, apart from its requests which are restored with the resources.
+_CUSTOMER_STATE = (
+    'number',
+    'stage',
+    'fuel_needed',
+    'expected_fueling_time',
+    'eating',
+    '_row',
+    '_interaction_with_cashier_time',
+    '_interaction_with_cashier_while_getting_food_time',
+    '_food_preparation_time',
+    '_getting_to_the_pump_time',
+    '_going_to_the_building_time',
+    '_going_back_to_the_car_time',
+    '_leaving_the_station_time',
+    '_leaving_the_pump_time',
+    '_fuel_gotten',
+    '_left_fueling_time',
+    '_fueling_started',
+    '_arrival_time',
+    '_start_fueling_time',
+    '_waiting_for_cashier_start_time',
+)
 
 
 class _Customer:
-    def __init__(self, environment: _SimulationEnvironment, number: int, settings: SimulationSettings):
+    def __init__(
+            self,
+            environment: _SimulationEnvironment,
+            number: int,
+            settings: SimulationSettings,
+            results: _CustomerResultsRecorder,
+            kpis: KpiAccumulator,
+            state: Optional[Dict[str, Any]] = None,
+            logger: Optional[Union[logging.Logger, logging.LoggerAdapter]] = None,
+    ):
         self.env = environment
+        self._logger = logger or environment.logger
         self._settings = settings
-
-        self.data = CustomerData(number=number, enter=True)
-        self.data.name = f'Car {number}'
-
-        fuel_needed = self._settings.customer_fuel_needed()
-        self.data.fuel_needed = fuel_needed
-        self.data.expected_fueling_time = int(fuel_needed / self._settings.pump_fueling_speed)
-        self.data.eating = self._settings.if_eating()
+        self._results = results
+        self._kpis = kpis
+        self.name = f'Car {number}'
+        self.process: Optional[Process] = None
+        self._subprocess: Optional[Process] = None
+        self._pump_parking_place_request: Optional[Request] = None
+        self._pump_request: Optional[Request] = None
+        self._cashier_request: Optional[Request] = None
+        self._remaining_delay: Optional[float] = None
+        if state is not None:
+            for attribute in _CUSTOMER_STATE:
+                setattr(self, attribute, state[attribute])
+            return
+
+        self.number = number
+        self.stage = _Stage.ENTERING
+        self._row = results.add(number=number, enter=True)
+
+        self.fuel_needed = self._settings.customer_fuel_needed()
+        self.expected_fueling_time = int(self.fuel_needed / self._settings.pump_fueling_speed)
+        self.eating = bool(self._settings.if_eating())
+        self._interaction_with_cashier_time = self._settings.interaction_with_cashier_time()
+        self._interaction_with_cashier_while_getting_food_time = \
+            self._settings.interaction_with_cashier_while_getting_food_time()
+        self._food_preparation_time = self._settings.food_preparation_time()
+        self._getting_to_the_pump_time = self._settings.getting_to_the_pump_time()
+        self._going_to_the_building_time = self._settings.going_to_the_building_time()
+        self._going_back_to_the_car_time = self._settings.going_back_to_the_car_time()
+        self._leaving_the_station_time = self._settings.leaving_the_station_time()
+        self._leaving_the_pump_time = 0
+        results.set(self._row, 'fuel_needed', self.fuel_needed)
+        results.set(self._row, 'expected_fueling_time', self.expected_fueling_time)
+        results.set_eating(self._row, self.eating)
 
         self._fuel_gotten = 0
+        self._left_fueling_time = self.expected_fueling_time
+        self._fueling_started = False
+        self._arrival_time = None
+        self._start_fueling_time = None
+        self._waiting_for_cashier_start_time = None
+
+    @property
+    def data(self) -> CustomerData:
+        return CustomerData(self._results, self._row)
+
+    @property
+    def current_process(self) -> Optional[Process]:
+        if _Stage.WAITING_FOR_CASHIER <= self.stage <= _Stage.TAKING_THE_FOOD:
+            return self._subprocess
+        return self.process
+
+    def get_state(self) -> Dict[str, Any]:
+        return {attribute: getattr(self, attribute) for attribute in _CUSTOMER_STATE}
+
+    def resume(self, gas_station: _GasStation, delay: Optional[float]):
+        """Continues the visit of a customer restored from a checkpoint, waiting `delay` in its current timeout.
+
+        The requests the customer held or waited for must have been restored before.
+        """
+        self._remaining_delay = delay
+        if _Stage.WAITING_FOR_CASHIER <= self.stage <= _Stage.INTERACTING_WITH_CASHIER:
+            self._subprocess = self.env.process(self.interact_with_the_cashier(gas_station=gas_station))
+        elif _Stage.WAITING_FOR_FOOD <= self.stage <= _Stage.TAKING_THE_FOOD:
+            self._subprocess = self.env.process(self.wait_and_take_the_food(gas_station=gas_station))
+        self.process = self.env.process(self.enter(gas_station=gas_station))
 
     def enter(self, gas_station: _GasStation) -> Generator[Event, Any, Any]:
-        self.data.arrival_time = self.env.now
-        self.env.logger.info(f'[{self.data.name}]: Entering the station.')
-
-        left_fueling_time = copy.copy(self.data.expected_fueling_time)
-
-        while left_fueling_time:
-            self.env.logger.info(f'[{self.data.name}]: Waiting for the pump with the fueling time {left_fueling_time}.')
-
-            pump_parking_place_request = gas_station.fuel_pump_parking_place.request()
-            yield pump_parking_place_request
-            self.env.logger.info(f'[{self.data.name}]: Entering a fuel pump parking place.')
-
-            # Getting out of the car, walking, etc.
-            yield self.env.timeout(random.randint(20, 40))
-
-            pump_request = gas_station.fuel_pumps.request(priority=1)
-            yield pump_request
-
-            self.env.logger.info(f'[{self.data.name}]: Fueling.')
-            self.env.logger.info(f'[STATION]: Getting a pump. {gas_station.fuel_pumps.count} of'
-                                 f' {gas_station.fuel_pumps.capacity} pumps are allocated.')
-            start_fueling_time = self.env.now
-
-            if not hasattr(self.data, 'fueling_start_time'):
-                self.data.fueling_start_time = start_fueling_time
-
-            try:
-                yield self.env.timeout(left_fueling_time)
-                self.env.logger.info(f'[{self.data.name}]: Fueling succeeded.')
-                self._fuel_gotten = self.data.expected_fueling_time
-                left_fueling_time = 0
-                self.data.fueling_end_time = self.env.now
-
-            except simpy.Interrupt:
-                fuel_got = self.env.now - start_fueling_time
-                self._fuel_gotten += fuel_got
-                if self._fuel_gotten > self.data.expected_fueling_time:
-                    raise ValueError('Fuel gotten cannot be higher than fueling time')
-                fuel_percentage = "{:.2f}".format(self._fuel_gotten / self.data.expected_fueling_time * 100)
-                self.env.logger.info(f'[{self.data.name}]: Fueling has been interrupted.'
-                                     f' Have {fuel_percentage}% of the fuel needed.')
-                left_fueling_time -= fuel_got
-
+        if self.stage == _Stage.ENTERING:
+            gas_station.customers[self.number] = self
+            self._arrival_time = self.env.now
+            self._results.set(self._row, 'arrival_time', self._arrival_time)
+            if self.env.trace is not None:
+                self.env.trace.record(self.env.now, TraceEvent.ARRIVAL, self.number, self.fuel_needed,
+                                      self.expected_fueling_time, self.eating)
+            if self.env.verbose:
+                self._logger.info(f'[{self.name}]: Entering the station.')
+
+        while self._left_fueling_time:
+            if self.stage <= _Stage.WAITING_FOR_PUMP_PARKING_PLACE:
+                if self._pump_parking_place_request is None:
+                    if self.env.verbose:
+                        self._logger.info(f'[{self.name}]: Waiting for the pump with the fueling time'
+                                          f' {self._left_fueling_time}.')
+                    self._pump_parking_place_request = gas_station.fuel_pump_parking_place.request()
+                self.stage = _Stage.WAITING_FOR_PUMP_PARKING_PLACE
+                yield self._pump_parking_place_request
+                if self.env.trace is not None:
+                    self.env.trace.record(self.env.now, TraceEvent.PUMP_PARKING_PLACE, self.number)
+                if self.env.verbose:
+                    self._logger.info(f'[{self.name}]: Entering a fuel pump parking place.')
+
+            if self.stage <= _Stage.GETTING_TO_THE_PUMP:
+                # Getting out of the car, walking, etc.
+                yield self._timeout(_Stage.GETTING_TO_THE_PUMP, self._getting_to_the_pump_time)
+
+            if self.stage <= _Stage.WAITING_FOR_PUMP:
+                if self._pump_request is None:
+                    self._pump_request = gas_station.fuel_pumps.request(priority=1)
+                self.stage = _Stage.WAITING_FOR_PUMP
+                try:
+                    yield self._pump_request
+                except simpy.Interrupt:
+                    # A pump breakdown took the pump before the customer started fueling, so it waits for another.
+                    self._pump_request = None
+                    continue
+
+                if self.env.trace is not None:
+                    self.env.trace.record(self.env.now, TraceEvent.PUMP_ACQUIRE, self.number)
+                if self.env.verbose:
+                    self._logger.info(f'[{self.name}]: Fueling.')
+                    self._logger.info(f'[STATION]: Getting a pump. {gas_station.fuel_pumps.count} of'
+                                      f' {gas_station.fuel_pumps.capacity} pumps are allocated.')
+                self._start_fueling_time = self.env.now
+
+                if not self._fueling_started:
+                    self._results.set(self._row, 'fueling_start_time', self._start_fueling_time)
+                    self._kpis.record_pump_waiting_time(self._start_fueling_time - self._arrival_time)
+                    self._fueling_started = True
+
+            if self.stage <= _Stage.FUELING:
+                try:
+                    yield self._timeout(_Stage.FUELING, self._left_fueling_time)
+                    self._finish_fueling()
+
+                except simpy.Interrupt:
+                    fuel_got = self.env.now - self._start_fueling_time
+                    if self._fuel_gotten + fuel_got > self.expected_fueling_time:
+                        raise ValueError('Fuel gotten cannot be higher than fueling time')
+                    if fuel_got == self._left_fueling_time:
+                        # The pump was taken just as the tank got full, so the fueling has succeeded.
+                        self._finish_fueling()
+                    else:
+                        self._fuel_gotten += fuel_got
+                        if self.env.trace is not None:
+                            self.env.trace.record(self.env.now, TraceEvent.PUMP_INTERRUPT, self.number,
+                                                  self._fuel_gotten, self.expected_fueling_time)
+                        if self.env.verbose:
+                            fuel_percentage = "{:.2f}".format(self._fuel_gotten / self.expected_fueling_time * 100)
+                            self._logger.info(f'[{self.name}]: Fueling has been interrupted.'
+                                              f' Have {fuel_percentage}% of the fuel needed.')
+                        self._left_fueling_time -= fuel_got
+                        self._leaving_the_pump_time = self._settings.leaving_the_pump_after_interruption_time()
+
+            if self._left_fueling_time and self.stage <= _Stage.LEAVING_THE_PUMP:
                 # Getting out of the pump parking place and going to the end of the queue
-                yield self.env.timeout(random.randint(20, 40))
-
-            gas_station.fuel_pumps.release(pump_request)
-            self.env.logger.info(f'[STATION]: Releasing a pump. {gas_station.fuel_pumps.count} of'
-                                 f' {gas_station.fuel_pumps.capacity} pumps are allocated.')
-
-            if left_fueling_time == 0:
-
+                yield self._timeout(_Stage.LEAVING_THE_PUMP, self._leaving_the_pump_time)
+                self._getting_to_the_pump_time = self._settings.getting_back_to_the_pump_time()
+
+            gas_station.fuel_pumps.release(self._pump_request)
+            self._pump_request = None
+            if self.env.trace is not None:
+                self.env.trace.record(self.env.now, TraceEvent.PUMP_RELEASE, self.number)
+            if self.env.verbose:
+                self._logger.info(f'[STATION]: Releasing a pump. {gas_station.fuel_pumps.count} of'
+                                  f' {gas_station.fuel_pumps.capacity} pumps are allocated.')
+
+            if self._left_fueling_time:
+                gas_station.fuel_pump_parking_place.release(self._pump_parking_place_request)
+                self._pump_parking_place_request = None
+                self.stage = _Stage.WAITING_FOR_PUMP_PARKING_PLACE
+
+        if self._fueling_started:
+            if self.stage <= _Stage.GOING_TO_THE_BUILDING:
                 # Going to the building etc.
-                yield self.env.timeout(random.randint(30, 60))
-
-                yield self.env.process(self.interact_with_the_cashier(gas_station=gas_station))
-                if self.data.eating:
-                    yield self.env.process(self.wait_and_take_the_food(gas_station=gas_station))
-
+                yield self._timeout(_Stage.GOING_TO_THE_BUILDING, self._going_to_the_building_time)
+
+            if self.stage <= _Stage.INTERACTING_WITH_CASHIER:
+                if self.stage < _Stage.WAITING_FOR_CASHIER:
+                    self._subprocess = self.env.process(self.interact_with_the_cashier(gas_station=gas_station))
+                yield self._subprocess
+            if self.eating and self.stage <= _Stage.TAKING_THE_FOOD:
+                if self.stage < _Stage.WAITING_FOR_FOOD:
+                    self._subprocess = self.env.process(self.wait_and_take_the_food(gas_station=gas_station))
+                yield self._subprocess
+            self._subprocess = None
+
+            if self.stage <= _Stage.GOING_BACK_TO_THE_CAR:
                 # Going back to the car etc.
-                yield self.env.timeout(random.randint(30, 60))
+                yield self._timeout(_Stage.GOING_BACK_TO_THE_CAR, self._going_back_to_the_car_time)
 
-                gas_station.fuel_pump_parking_place.release(pump_parking_place_request)
+                gas_station.fuel_pump_parking_place.release(self._pump_parking_place_request)
+                self._pump_parking_place_request = None
 
         # Leaving
-        yield self.env.timeout(random.randint(15, 30))
+        yield self._timeout(_Stage.LEAVING_THE_STATION, self._leaving_the_station_time)
 
         gas_station.parking_places.put(1)
-        self.env.logger.info(f'[{self.data.name}]: Leaving the station.')
+        if self.env.trace is not None:
+            self.env.trace.record(self.env.now, TraceEvent.LEAVE, self.number, self.env.now - self._arrival_time)
+        if self.env.verbose:
+            self._logger.info(f'[{self.name}]: Leaving the station.')
+        del gas_station.customers[self.number]
+        self._results.finish(self._row)
+        self._kpis.record_served_car(
+            self.fuel_needed, self.eating, self.env.now - self._arrival_time, arrival_time=self._arrival_time)
         return self.data
 
     def interact_with_the_cashier(self, gas_station: _GasStation) -> Generator[Event, Any, Any]:
-        self.env.logger.info(f'[{self.data.name}]: Waiting at the counter.')
-        self.env.logger.info(f'[STATION]: {gas_station.cashiers.count} of {gas_station.cashiers.capacity}'
-                             f' cashiers are allocated.')
-
-        with gas_station.cashiers.request(priority=1) as request:
-            yield request
-            self.data.interacting_with_cashier_start_time = self.env.now
-            self.env.logger.info(f'[{self.data.name}]: Interacting with the cashier.')
-            interacting_time = self._settings.interaction_with_cashier_time()
-            yield self.env.timeout(interacting_time)
-            self.data.interacting_with_cashier_end_time = self.env.now
-
-        self.env.logger.info(f'[STATION]: {gas_station.cashiers.count} of {gas_station.cashiers.capacity}'
-                             f' cashiers are allocated.')
+        if self.stage < _Stage.WAITING_FOR_CASHIER:
+            if self.env.verbose:
+                self._logger.info(f'[{self.name}]: Waiting at the counter.')
+                self._logger.info(f'[STATION]: {gas_station.cashiers.count} of {gas_station.cashiers.capacity}'
+                                  f' cashiers are allocated.')
+            self.stage = _Stage.WAITING_FOR_CASHIER
+            self._waiting_for_cashier_start_time = self.env.now
+            if self.env.trace is not None:
+                self.env.trace.record(self.env.now, TraceEvent.CASHIER_REQUEST, self.number)
+            self._cashier_request = gas_station.cashiers.request(priority=1)
+
+        with self._cashier_request as request:
+            if self.stage == _Stage.WAITING_FOR_CASHIER:
+                yield request
+                self._kpis.record_cashier_waiting_time(self.env.now - self._waiting_for_cashier_start_time)
+                self._results.set(self._row, 'interacting_with_cashier_start_time', self.env.now)
+                if self.env.trace is not None:
+                    self.env.trace.record(self.env.now, TraceEvent.CASHIER_START, self.number)
+                if self.env.verbose:
+                    self._logger.info(f'[{self.name}]: Interacting with the cashier.')
+            yield self._timeout(_Stage.INTERACTING_WITH_CASHIER, self._interaction_with_cashier_time)
+            self._results.set(self._row, 'interacting_with_cashier_end_time', self.env.now)
+            if self.env.trace is not None:
+                self.env.trace.record(self.env.now, TraceEvent.CASHIER_END, self.number)
+        self._cashier_request = None
+
+        if self.env.verbose:
+            self._logger.info(f'[STATION]: {gas_station.cashiers.count} of {gas_station.cashiers.capacity}'
+                              f' cashiers are allocated.')
 
     def wait_and_take_the_food(self, gas_station: _GasStation) -> Generator[Event, Any, Any]:
-        food_preparation_time = self._settings.food_preparation_time()
-        self.env.logger.info(f'[{self.data.name}]: Waiting for a hot-dog.')
-        self.data.waiting_for_food_time_start_time = self.env.now
-        yield self.env.timeout(food_preparation_time)
-
-        self.env.logger.info(f'[STATION]: {gas_station.cashiers.count} of {gas_station.cashiers.capacity}'
-                             f' cashiers are allocated.')
-
-        with gas_station.cashiers.request(priority=0) as request:
-            yield request
-            yield self.env.timeout(self._settings.interaction_with_cashier_while_getting_food_time())
-            self.env.logger.info(f'[{self.data.name}]: Got a hot-dog.')
-
-        self.data.waiting_for_food_time_end_time = self.env.now
-        self.env.logger.info(f'[STATION]: {gas_station.cashiers.count} of {gas_station.cashiers.capacity}'
-                             f' cashiers are allocated.')
+        if self.stage < _Stage.WAITING_FOR_FOOD:
+            if self.env.verbose:
+                self._logger.info(f'[{self.name}]: Waiting for a hot-dog.')
+            self._results.set(self._row, 'waiting_for_food_time_start_time', self.env.now)
+            if self.env.trace is not None:
+                self.env.trace.record(self.env.now, TraceEvent.FOOD_WAIT, self.number)
+
+        if self.stage <= _Stage.WAITING_FOR_FOOD:
+            yield self._timeout(_Stage.WAITING_FOR_FOOD, self._food_preparation_time)
+            if self.env.trace is not None:
+                self.env.trace.record(self.env.now, TraceEvent.FOOD_READY, self.number)
+
+            if self.env.verbose:
+                self._logger.info(f'[STATION]: {gas_station.cashiers.count} of {gas_station.cashiers.capacity}'
+                                  f' cashiers are allocated.')
+            self.stage = _Stage.WAITING_FOR_CASHIER_WITH_FOOD
+            self._cashier_request = gas_station.cashiers.request(priority=0)
+
+        with self._cashier_request as request:
+            if self.stage == _Stage.WAITING_FOR_CASHIER_WITH_FOOD:
+                yield request
+            yield self._timeout(_Stage.TAKING_THE_FOOD, self._interaction_with_cashier_while_getting_food_time)
+            if self.env.verbose:
+                self._logger.info(f'[{self.name}]: Got a hot-dog.')
+        self._cashier_request = None
+
+        self._results.set(self._row, 'waiting_for_food_time_end_time', self.env.now)
+        if self.env.trace is not None:
+            self.env.trace.record(self.env.now, TraceEvent.FOOD_TAKEN, self.number)
+        if self.env.verbose:
+            self._logger.info(f'[STATION]: {gas_station.cashiers.count} of {gas_station.cashiers.capacity}'
+                              f' cashiers are allocated.')
+
+    def _finish_fueling(self):
+        if self.env.trace is not None:
+            self.env.trace.record(self.env.now, TraceEvent.FUELED, self.number)
+        if self.env.verbose:
+            self._logger.info(f'[{self.name}]: Fueling succeeded.')
+        self._fuel_gotten = self.expected_fueling_time
+        self._left_fueling_time = 0
+        self._results.set(self._row, 'fueling_end_time', self.env.now)
+
+    def _timeout(self, stage: _Stage, delay: float) -> Timeout:
+        # A customer restored in the middle of a timeout only waits for the rest of it.
+        self.stage = stage
+        if self._remaining_delay is not None:
+            delay, self._remaining_delay = self._remaining_delay, None
+        return self.env.timeout(delay)
+
+
+def _admit_car(
+        environment: _SimulationEnvironment,
+        gas_station: _GasStation,
+        number: int,
+        settings: SimulationSettings,
+        results: _CustomerResultsRecorder,
+        kpis: KpiAccumulator,
+) -> bool:
+    """Lets an arriving car into the station if there is a free parking place, otherwise records it as missed."""
+    if gas_station.parking_places.level > 0:
+        if environment.verbose:
+            gas_station.logger.info('A car is arriving to the station.')
+        gas_station.parking_places.get(1)
+        customer = _Customer(
+            environment=environment,
+            number=number,
+            settings=settings,
+            results=results,
+            kpis=kpis,
+            logger=gas_station.logger,
+        )
+        customer.process = environment.process(customer.enter(gas_station=gas_station))
+        return True
+
+    results.add(number=number, enter=False, arrival_time=environment.now)
+    kpis.record_missed_car(arrival_time=environment.now)
+    settings.skip_customer()
+    if environment.trace is not None:
+        environment.trace.record(environment.now, TraceEvent.BALK, number)
+    if environment.verbose:
+        gas_station.logger.info('A car missed station since there are no left parking places.')
+    return False
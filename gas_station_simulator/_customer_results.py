@@ -0,0 +1,256 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Iterable, TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from gas_station_simulator._results_sinks import ResultsSink
+
+_FLOAT_COLUMNS = (
+    'fuel_needed',
+    'expected_fueling_time',
+    'arrival_time',
+    'fueling_start_time',
+    'fueling_end_time',
+    'interacting_with_cashier_start_time',
+    'interacting_with_cashier_end_time',
+    'waiting_for_food_time_start_time',
+    'waiting_for_food_time_end_time',
+)
+
+_RESULTS_COLUMNS = ('number', 'enter', 'name', 'fuel_needed', 'expected_fueling_time', 'eating') + _FLOAT_COLUMNS[2:]
+
+
+@dataclass
+class ResultsSummary:
+    """Running totals of the customers' results which are enough to calculate the profit."""
+    cars_quantity: int = 0
+    missed_cars_quantity: int = 0
+    hot_dogs_quantity: int = 0
+    fuel_needed: float = 0
+
+    @classmethod
+    def from_dataframe(cls, results: pd.DataFrame) -> 'ResultsSummary':
+        cars_quantity = int(results['enter'].sum())
+        return cls(
+            cars_quantity=cars_quantity,
+            missed_cars_quantity=int(results['enter'].size - cars_quantity),
+            hot_dogs_quantity=int(results['eating'].sum()),
+            fuel_needed=float(results['fuel_needed'].sum()),
+        )
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[pd.DataFrame]) -> 'ResultsSummary':
+        summary = cls()
+        for chunk in chunks:
+            summary += cls.from_dataframe(chunk)
+        return summary
+
+    def __add__(self, other: 'ResultsSummary') -> 'ResultsSummary':
+        return ResultsSummary(
+            cars_quantity=self.cars_quantity + other.cars_quantity,
+            missed_cars_quantity=self.missed_cars_quantity + other.missed_cars_quantity,
+            hot_dogs_quantity=self.hot_dogs_quantity + other.hot_dogs_quantity,
+            fuel_needed=self.fuel_needed + other.fuel_needed,
+        )
+
+
+class _CustomerResultsRecorder:
+    """Columnar store of the customers' results.
+
+    Every arriving car gets a row which is filled in place while the customer moves through the station, so no
+    per-customer objects are kept. Columns are preallocated and doubled whenever they run out of space. Missing
+    values of the float columns are stored as NaN.
+
+    If a `sink` is given, finished rows are written to it in chunks of at least `chunk_size` rows and dropped from
+    memory. Rows are identified by ids which do not change when the preceding rows are dropped.
+    """
+
+    def __init__(
+            self,
+            initial_capacity: int = 1024,
+            sink: Optional['ResultsSink'] = None,
+            chunk_size: int = 10_000,
+    ):
+        self._sink = sink
+        if sink is not None:
+            sink.open()
+        self._chunk_size = chunk_size
+        self._finished_since_drain = 0
+        self._offset = 0
+        self._size = 0
+        self._capacity = initial_capacity
+        self._columns = {
+            'number': np.empty(initial_capacity, dtype=np.int64),
+            'enter': np.empty(initial_capacity, dtype=bool),
+            'eating': np.empty(initial_capacity, dtype=bool),
+            'finished': np.empty(initial_capacity, dtype=bool),
+            'written': np.empty(initial_capacity, dtype=bool),
+        }
+        self._columns.update({name: np.empty(initial_capacity, dtype=np.float64) for name in _FLOAT_COLUMNS})
+        self._floats = {name: self._columns[name] for name in _FLOAT_COLUMNS}
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, np.ndarray]) -> '_CustomerResultsRecorder':
+        """Creates a recorder of the rows given as the `number`, `enter`, `eating`, `finished` and float columns."""
+        size = len(columns['number'])
+        recorder = cls(initial_capacity=max(size, 1))
+        for name, column in recorder._columns.items():
+            column[:size] = columns[name] if name != 'written' else False
+        recorder._size = size
+        return recorder
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, number: int, enter: bool, arrival_time: float = np.nan) -> int:
+        if self._size == self._capacity:
+            self._grow()
+        index = self._size
+        self._columns['number'][index] = number
+        self._columns['enter'][index] = enter
+        self._columns['eating'][index] = False
+        self._columns['finished'][index] = False
+        self._columns['written'][index] = False
+        for column in self._floats.values():
+            column[index] = np.nan
+        self._floats['arrival_time'][index] = arrival_time
+        self._size += 1
+        row = self._offset + index
+        if not enter:
+            self.finish(row)
+        return row
+
+    def set(self, row: int, column: str, value: float):
+        self._floats[column][row - self._offset] = value
+
+    def get(self, row: int, column: str) -> float:
+        return self._floats[column][row - self._offset]
+
+    def set_eating(self, row: int, eating: bool):
+        self._columns['eating'][row - self._offset] = eating
+
+    def finish(self, row: int):
+        index = row - self._offset
+        self._columns['finished'][index] = True
+        if self._sink is not None:
+            self._finished_since_drain += 1
+            if self._finished_since_drain >= self._chunk_size:
+                self._finished_since_drain = 0
+                self._drain(min_rows=self._chunk_size)
+
+    def replace_sink(self, sink: 'ResultsSink'):
+        """Streams the rows which have not been written yet to `sink`, e.g. in a simulation branched from a
+        checkpoint."""
+        self._sink = sink
+        sink.open()
+
+    def flush(self):
+        """Writes all the finished rows to the sink. Customers who have not left the station are written later, if
+        the simulation is resumed."""
+        if self._sink is None:
+            return
+        self._drain(min_rows=0)
+        pending = self._columns['finished'][:self._size] & ~self._columns['written'][:self._size]
+        if pending.any():
+            self._sink.write(self._to_dataframe(np.flatnonzero(pending)))
+            self._columns['written'][:self._size] |= pending
+
+    def close(self):
+        """Flushes the finished rows and closes the sink at the end of a run."""
+        if self._sink is None:
+            return
+        self.flush()
+        self._sink.close()
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Returns the finished rows which are still kept in memory."""
+        return self._to_dataframe(np.flatnonzero(self._columns['finished'][:self._size]))
+
+    def to_customer_data(self) -> List['CustomerData']:
+        rows = np.flatnonzero(self._columns['finished'][:self._size])
+        rows = rows[np.argsort(self._columns['number'][rows], kind='stable')]
+        return [CustomerData(self, self._offset + row) for row in rows.tolist()]
+
+    def _value(self, row: int, column: str):
+        return self._columns[column][row - self._offset]
+
+    def _to_dataframe(self, rows: np.ndarray) -> pd.DataFrame:
+        enter = self._columns['enter'][rows]
+        number = self._columns['number'][rows]
+
+        name = pd.Series(number).astype(str)
+        name = ('Car ' + name).where(enter)
+
+        columns = {
+            'number': number,
+            'enter': enter,
+            'name': name.to_numpy(),
+            'eating': pd.arrays.BooleanArray(self._columns['eating'][rows], ~enter),
+        }
+        columns.update({key: value[rows] for key, value in self._floats.items()})
+
+        results = pd.DataFrame({key: columns[key] for key in _RESULTS_COLUMNS})
+        order = np.argsort(number, kind='stable')
+        return results.take(order).reset_index(drop=True)
+
+    def _drain(self, min_rows: int):
+        # Only the rows before the oldest customer still in the station can be dropped without moving the ids.
+        finished = self._columns['finished'][:self._size]
+        first_unfinished = self._size if finished.all() else int(np.argmin(finished))
+        if first_unfinished < max(min_rows, 1):
+            return
+        rows = np.flatnonzero(~self._columns['written'][:first_unfinished])
+        if rows.size:
+            self._sink.write(self._to_dataframe(rows))
+        self._drop(first_unfinished)
+
+    def _drop(self, rows_quantity: int):
+        for column in self._columns.values():
+            column[:self._size - rows_quantity] = column[rows_quantity:self._size]
+        self._offset += rows_quantity
+        self._size -= rows_quantity
+
+    def _grow(self):
+        self._capacity *= 2
+        self._columns = {name: np.resize(column, self._capacity) for name, column in self._columns.items()}
+        self._floats = {name: self._columns[name] for name in _FLOAT_COLUMNS}
+
+
+class CustomerData:
+    """Read-only view of a single row of the `_CustomerResultsRecorder`."""
+
+    __slots__ = ('_recorder', '_row')
+
+    def __init__(self, recorder: _CustomerResultsRecorder, row: int):
+        self._recorder = recorder
+        self._row = row
+
+    @property
+    def number(self) -> int:
+        return int(self._recorder._value(self._row, 'number'))  # noqa
+
+    @property
+    def enter(self) -> bool:
+        return bool(self._recorder._value(self._row, 'enter'))  # noqa
+
+    @property
+    def name(self) -> Optional[str]:
+        return f'Car {self.number}' if self.enter else None
+
+    @property
+    def eating(self) -> Optional[bool]:
+        return bool(self._recorder._value(self._row, 'eating')) if self.enter else None  # noqa
+
+    def __getattr__(self, item: str) -> Optional[int]:
+        if item not in _FLOAT_COLUMNS:
+            raise AttributeError(item)
+        value = self._recorder.get(self._row, item)
+        return None if np.isnan(value) else int(value)
+
+    def to_dict(self) -> Dict[str, Optional[int]]:
+        return {column: getattr(self, column) for column in _RESULTS_COLUMNS}
+
+    def __repr__(self) -> str:
+        return f'CustomerData(number={self.number}, enter={self.enter})'
@@ -0,0 +1,238 @@
+import math
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+_SAMPLING_BLOCK_SIZE = 4096
+
+
+class Distribution:
+    """Specification of a random variable which the simulation samples from its own generator.
+
+    Unlike the plain callables, the specifications are picklable and are drawn in blocks, so they are both faster and
+    reproducible for a given simulation seed. Sampled values are truncated to integers like `int()` does.
+    """
+
+    def sample(self, generator: np.random.Generator, size: int) -> np.ndarray:
+        raise NotImplementedError
+
+
+@dataclass(frozen=True)
+class Exponential(Distribution):
+    scale: float
+
+    def sample(self, generator: np.random.Generator, size: int) -> np.ndarray:
+        return generator.exponential(self.scale, size)
+
+
+@dataclass(frozen=True)
+class Gamma(Distribution):
+    shape: float
+    scale: float
+
+    def sample(self, generator: np.random.Generator, size: int) -> np.ndarray:
+        return generator.gamma(self.shape, self.scale, size)
+
+
+@dataclass(frozen=True)
+class Normal(Distribution):
+    loc: float
+    scale: float
+
+    def sample(self, generator: np.random.Generator, size: int) -> np.ndarray:
+        return generator.normal(self.loc, self.scale, size)
+
+
+@dataclass(frozen=True)
+class Binomial(Distribution):
+    n: int
+    p: float
+
+    def sample(self, generator: np.random.Generator, size: int) -> np.ndarray:
+        return generator.binomial(self.n, self.p, size)
+
+
+@dataclass(frozen=True)
+class UniformInt(Distribution):
+    """Uniformly distributed integer from `low` to `high`, both inclusive like in `random.randint`."""
+    low: int
+    high: int
+
+    def sample(self, generator: np.random.Generator, size: int) -> np.ndarray:
+        return generator.integers(self.low, self.high, size, endpoint=True)
+
+
+@dataclass(frozen=True)
+class _Categorical(Distribution):
+    """Index of one of the categories, drawn with the given `probabilities`."""
+    probabilities: Tuple[float, ...]
+
+    def sample(self, generator: np.random.Generator, size: int) -> np.ndarray:
+        return generator.choice(len(self.probabilities), size, p=self.probabilities)
+
+
+@dataclass(frozen=True)
+class ArrivalRateProfile(Distribution):
+    """Times between the arrivals of a Poisson process whose rate varies with the simulation time.
+
+    The rate, in arrivals per hour, is either the table `rates` of consecutive periods of `period_length` seconds,
+    repeated cyclically (e.g. 24 hourly rates of a day or 168 of a week), or `function` of the simulation time in
+    seconds, bounded by `max_rate`. The function has to accept a NumPy array of times.
+
+    Arrivals of a table are generated by inverting its cumulative intensity and the ones of a function by thinning,
+    both in blocks. Sampled times between the arrivals start at time 0.
+    """
+    rates: Optional[Tuple[float, ...]] = None
+    period_length: float = 60**2
+    function: Optional[Callable[[np.ndarray], np.ndarray]] = None
+    max_rate: Optional[float] = None
+
+    def __post_init__(self):
+        if (self.rates is None) == (self.function is None):
+            raise ValueError('An arrival rate profile requires either rates or a function.')
+        if self.rates is not None:
+            rates = np.asarray(self.rates, dtype=np.float64)
+            if rates.ndim != 1 or not rates.size or (rates < 0).any() or not rates.sum() > 0:
+                raise ValueError('Arrival rates must be a non-empty sequence of non-negative numbers, not all zero.')
+            object.__setattr__(self, 'rates', tuple(rates.tolist()))
+        elif self.max_rate is None or not self.max_rate > 0:
+            raise ValueError('An arrival rate function requires a positive max_rate.')
+
+    @classmethod
+    def from_table(cls, rates: Any, period_length: float = 60**2) -> 'ArrivalRateProfile':
+        return cls(rates=tuple(rates), period_length=period_length)
+
+    @classmethod
+    def from_function(cls, function: Callable[[np.ndarray], np.ndarray], max_rate: float) -> 'ArrivalRateProfile':
+        return cls(function=function, max_rate=max_rate)
+
+    @property
+    def mean_rate(self) -> float:
+        """Average arrivals per hour over a cycle of the table, or the bound of the function."""
+        return float(np.mean(self.rates)) if self.rates is not None else self.max_rate
+
+    def get_rates(self, times: np.ndarray) -> np.ndarray:
+        """Returns the arrivals per hour at the simulation `times` in seconds."""
+        times = np.asarray(times, dtype=np.float64)
+        if self.rates is not None:
+            periods = (times // self.period_length).astype(np.int64) % len(self.rates)
+            return np.asarray(self.rates, dtype=np.float64)[periods]
+        return np.broadcast_to(np.asarray(self.function(times), dtype=np.float64), times.shape)
+
+    def sample(self, generator: np.random.Generator, size: int) -> np.ndarray:
+        return np.diff(np.floor(self._get_arrival_times(generator, 0.0, size)), prepend=0.0)
+
+    def _get_arrival_times(self, generator: np.random.Generator, start: float, size: int) -> np.ndarray:
+        """Returns `size` consecutive arrival times after `start`."""
+        if self.rates is not None:
+            return self._invert_cumulative_intensity(generator, start, size)
+        return self._thin(generator, start, size)
+
+    def _invert_cumulative_intensity(self, generator: np.random.Generator, start: float, size: int) -> np.ndarray:
+        rates = np.asarray(self.rates) / 60**2
+        cumulative = np.concatenate([[0.0], np.cumsum(rates * self.period_length)])
+        cycle_length = self.period_length * rates.size
+
+        cycles, offset = divmod(start, cycle_length)
+        period = min(int(offset // self.period_length), rates.size - 1)
+        start_intensity = (
+            cycles * cumulative[-1] + cumulative[period] + (offset - period * self.period_length) * rates[period]
+        )
+        intensities = start_intensity + np.cumsum(generator.exponential(1.0, size))
+
+        cycles, intensities = np.divmod(intensities, cumulative[-1])
+        periods = np.minimum(np.searchsorted(cumulative, intensities, side='right') - 1, rates.size - 1)
+        return (
+            cycles * cycle_length
+            + periods * self.period_length
+            + (intensities - cumulative[periods]) / rates[periods]
+        )
+
+    def _thin(self, generator: np.random.Generator, start: float, size: int) -> np.ndarray:
+        max_rate = self.max_rate / 60**2
+        accepted = []
+        accepted_quantity = 0
+        while accepted_quantity < size:
+            candidates = start + np.cumsum(generator.exponential(1 / max_rate, size))
+            rates = np.broadcast_to(np.asarray(self.function(candidates), dtype=np.float64), candidates.shape)
+            if (rates > self.max_rate).any():
+                raise ValueError(f'The arrival rate function exceeds its max_rate {self.max_rate}.')
+            times = candidates[generator.random(size) * self.max_rate < rates]
+            accepted.append(times)
+            accepted_quantity += times.size
+            start = candidates[-1]
+        return np.concatenate(accepted)[:size]
+
+
+Sampleable = Union[Callable[[], Any], Distribution]
+
+
+class _BufferedSampler:
+    """Draws values of a distribution in blocks and hands them out one by one."""
+
+    __slots__ = ('_distribution', '_generator', '_block_size', '_values')
+
+    def __init__(
+            self,
+            distribution: Distribution,
+            generator: np.random.Generator,
+            block_size: int = _SAMPLING_BLOCK_SIZE,
+    ):
+        self._distribution = distribution
+        self._generator = generator
+        self._block_size = block_size
+        self._values: Iterator[int] = iter(())
+
+    def __call__(self) -> int:
+        value = next(self._values, None)
+        if value is None:
+            block = self._distribution.sample(self._generator, self._block_size)
+            self._values = iter(block.astype(np.int64).tolist())
+            value = next(self._values)
+        return value
+
+
+class _ArrivalTimesSampler:
+    """Hands out the times between consecutive arrivals of an `ArrivalRateProfile`, drawn in blocks.
+
+    The sampler keeps the time of the last arrival, so it has to be called once per arrival, in order.
+    """
+
+    __slots__ = ('_profile', '_generator', '_block_size', '_times', '_last_time', '_block_end')
+
+    def __init__(
+            self,
+            profile: ArrivalRateProfile,
+            generator: np.random.Generator,
+            block_size: int = _SAMPLING_BLOCK_SIZE,
+    ):
+        self._profile = profile
+        self._generator = generator
+        self._block_size = block_size
+        self.start_at(0)
+
+    def start_at(self, time: float):
+        """Makes the next arrival the first one after `time`."""
+        self._times: Iterator[int] = iter(())
+        self._last_time = math.floor(time)
+        self._block_end = float(time)
+
+    def __call__(self) -> int:
+        time = next(self._times, None)
+        if time is None:
+            block = self._profile._get_arrival_times(self._generator, self._block_end, self._block_size)  # noqa
+            self._block_end = float(block[-1])
+            self._times = iter(np.floor(block).astype(np.int64).tolist())
+            time = next(self._times)
+        delay = time - self._last_time
+        self._last_time = time
+        return delay
+
+
+def _to_sampler(value: Sampleable, generator: np.random.Generator) -> Callable[[], Any]:
+    if isinstance(value, ArrivalRateProfile):
+        return _ArrivalTimesSampler(value, generator)
+    if isinstance(value, Distribution):
+        return _BufferedSampler(value, generator)
+    return value
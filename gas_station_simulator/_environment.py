@@ -1,8 +1,13 @@
 import logging
-from typing import Type
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Type, Optional, List
 
 import simpy
 
+from gas_station_simulator._instrumentation import _EnvironmentInstrumentation
+from gas_station_simulator._settings import LoggingSettings
+from gas_station_simulator._trace import TraceRecorder
 from gas_station_simulator._utils import _get_time_string
 
 
@@ -12,27 +17,107 @@ class _EnvironmentLoggerFormatter(logging.Formatter):
         self._env = environment
 
     def formatTime(self, record, datefmt=None) -> str:
-        return _get_time_string(time=self._env.now)
+        return _get_time_string(time=getattr(record, 'simulation_time', self._env.now))
+
+
+class _SimulationTimeFilter(logging.Filter):
+    """Stamps records with the simulation time, since queued records are formatted after the clock has moved on."""
+
+    def __init__(self, environment: simpy.Environment):
+        super().__init__()
+        self._env = environment
+
+    def filter(self, record) -> bool:
+        record.simulation_time = self._env.now
+        return True
+
+
+class _PrefixLoggerAdapter(logging.LoggerAdapter):
+    """Prefixes the messages of one of the stations sharing an environment's logger with the station's name."""
+
+    def process(self, msg, kwargs):
+        return f'[{self.extra["name"]}] {msg}', kwargs
 
 
 class _SimulationEnvironment(simpy.Environment):
-    def __init__(self, formatter: Type[_EnvironmentLoggerFormatter] = _EnvironmentLoggerFormatter, *args, **kwargs):
-        super().__init__(*args, *kwargs)
-        self.logger = self._initialize_logger(formatter)
-        self.logger.info('[ENVIRONMENT] Environment set.')
+    def __init__(
+            self,
+            formatter: Type[_EnvironmentLoggerFormatter] = _EnvironmentLoggerFormatter,
+            logging_settings: Optional[LoggingSettings] = None,
+            *args,
+            **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self._formatter = formatter
+        self._log_handlers: List[logging.Handler] = []
+        self._log_listener: Optional[QueueListener] = None
+        # Like `verbose`, hot paths check it before recording the state transitions.
+        self.trace: Optional[TraceRecorder] = None
+        # Events processed by `step`.
+        self.events_quantity = 0
+        self.open_logger(logging_settings or LoggingSettings())
+        if self.verbose:
+            self.logger.info('[ENVIRONMENT] Environment set.')
+
+    def open_logger(self, logging_settings: LoggingSettings):
+        """Sets up the logger; also used to log again after `close_logger`, when a simulation is resumed."""
+        self.logger = self._initialize_logger(self._formatter, logging_settings)
+        # Hot paths check this flag before building any log message.
+        self.verbose = self.logger.isEnabledFor(logging.INFO)
+
+    def step(self):
+        super().step()
+        self.events_quantity += 1
+
+    def enable_instrumentation(self, queue_sample_interval: int = 100) -> _EnvironmentInstrumentation:
+        return _EnvironmentInstrumentation(self, queue_sample_interval=queue_sample_interval)
 
-    def _initialize_logger(self, formatter: Type[_EnvironmentLoggerFormatter]) -> logging.Logger:
-        logger = logging.getLogger('gas_station')
-        logger.setLevel(logging.INFO)
+    def close_logger(self):
+        if self._log_listener is not None:
+            self._log_listener.stop()
+            for handler in self._log_listener.handlers:
+                handler.close()
+            self._log_listener = None
+        for handler in self._log_handlers:
+            self.logger.removeHandler(handler)
+            handler.close()
+        self._log_handlers.clear()
+
+    def _initialize_logger(
+            self,
+            formatter: Type[_EnvironmentLoggerFormatter],
+            logging_settings: LoggingSettings,
+    ) -> logging.Logger:
+        logger = logging.getLogger(logging_settings.name)
+        logger.setLevel(logging_settings.level)
+
+        # Handlers left by a previous environment would write every message twice.
+        for handler in [h for h in logger.handlers if getattr(h, '_simulation_environment_handler', False)]:
+            logger.removeHandler(handler)
+            handler.close()
 
         formatter = formatter(self, '%(asctime)s: %(message)s')
+        handlers: List[logging.Handler] = []
+
+        if logging_settings.console:
+            ch = logging.StreamHandler()
+            ch.setFormatter(formatter)
+            handlers.append(ch)
 
-        ch = logging.StreamHandler()
-        ch.setFormatter(formatter)
+        if logging_settings.path is not None:
+            fh = logging.FileHandler(logging_settings.path)
+            fh.setFormatter(formatter)
+            handlers.append(fh)
 
-        fh = logging.FileHandler('logs.log')
-        fh.setFormatter(formatter)
+        if logging_settings.asynchronous and handlers:
+            qh = QueueHandler(queue.SimpleQueue())
+            qh.addFilter(_SimulationTimeFilter(self))
+            self._log_listener = QueueListener(qh.queue, *handlers)
+            self._log_listener.start()
+            handlers = [qh]
 
-        logger.addHandler(ch)
-        logger.addHandler(fh)
+        for handler in handlers:
+            handler._simulation_environment_handler = True
+            logger.addHandler(handler)
+        self._log_handlers = handlers
         return logger
@@ -0,0 +1,205 @@
+import dataclasses
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from gas_station_simulator._customer_results import ResultsSummary
+from gas_station_simulator._distributions import Distribution, Sampleable
+from gas_station_simulator._gas_station_simulator import GasStationSimulator
+from gas_station_simulator._profit_calculator import ProfitCalculator, _MONTH
+from gas_station_simulator._settings import SimulationSettings, ProfitCalculationSettings, LoggingSettings
+from gas_station_simulator._staffing import _get_mean_quantity
+
+
+def _sample(value: Sampleable, generator: np.random.Generator, samples: int) -> np.ndarray:
+    # Sampling keeps the truncation to integers of the simulation and also works for plain callables.
+    if isinstance(value, Distribution):
+        return value.sample(generator, samples).astype(np.int64)
+    return np.array([value() for _ in range(min(samples, 2_000))], dtype=np.float64)
+
+
+def _get_queue_state_probabilities(offered_load: float, servers: float, capacity: int) -> np.ndarray:
+    """Returns the stationary probabilities of 0..capacity customers in an M/M/c/K queue."""
+    n = np.arange(1, capacity + 1)
+    log_probabilities = np.concatenate([[0.0], np.cumsum(np.log(offered_load) - np.log(np.minimum(n, servers)))])
+    probabilities = np.exp(log_probabilities - log_probabilities.max())
+    return probabilities / probabilities.sum()
+
+
+def _get_waiting_probability(arrival_rate: float, service_time: float, servers: float) -> Tuple[float, float]:
+    """Returns the Erlang C probability of waiting in an M/M/c queue and its utilisation, capped just below one.
+
+    The probability of an average quantity of servers which changes over time is interpolated between the nearest
+    integer quantities.
+    """
+    if servers != int(servers):
+        lower, upper = max(int(servers), 1), int(servers) + 1
+        weight = servers - int(servers)
+        lower_probability, _ = _get_erlang_c(arrival_rate, service_time, lower)
+        upper_probability, _ = _get_erlang_c(arrival_rate, service_time, upper)
+        return (1 - weight) * lower_probability + weight * upper_probability, \
+            min(arrival_rate * service_time / servers, 0.999)
+    return _get_erlang_c(arrival_rate, service_time, int(servers))
+
+
+def _get_erlang_c(arrival_rate: float, service_time: float, servers: int) -> Tuple[float, float]:
+    utilisation = min(arrival_rate * service_time / servers, 0.999)
+    offered_load = utilisation * servers
+    n = np.arange(servers)
+    log_terms = n * np.log(offered_load) - np.cumsum(np.log(np.maximum(n, 1)))
+    log_last_term = servers * np.log(offered_load) - np.sum(np.log(np.arange(1, servers + 1))) - np.log(1 - utilisation)
+    return float(1 / (1 + np.exp(np.logaddexp.reduce(log_terms) - log_last_term))), utilisation
+
+
+class CapacityEstimator:
+    """Approximates the station's performance with queueing formulas instead of a discrete-event simulation.
+
+    The pump parking places are modelled as an M/M/c/K queue, where c is the pumps quantity (less the average quantity
+    of broken pumps) and K the parking capacity, and the cashiers as an M/M/c queue. Staffing schedules are replaced by
+    their average quantities. Both are solved together, since the time at the cashier extends the time a car takes a
+    pump parking place. Service times are far less variable than exponential ones, so the waiting room and the waiting
+    times are scaled with the Allen-Cunneen factor `(1 + cs^2) / 2`. It is meant for discarding clearly bad
+    configurations before simulating the promising ones.
+    """
+
+    def __init__(
+            self,
+            settings: SimulationSettings,
+            profit_calculation_settings: ProfitCalculationSettings,
+            simulation_time: int = _MONTH,
+            samples: int = 20_000,
+            seed: Optional[int] = 0,
+    ):
+        self.settings = settings
+        self.profit_calculation_settings = profit_calculation_settings
+        self.simulation_time = simulation_time
+        generator = np.random.default_rng(seed)
+        sampled = {
+            field.name: _sample(getattr(settings, field.name), generator, samples)
+            for field in dataclasses.fields(settings)
+            if callable(getattr(settings, field.name)) or isinstance(getattr(settings, field.name), Distribution)
+        }
+        sampled['fueling_time'] = (sampled['customer_fuel_needed'] / settings.pump_fueling_speed).astype(np.int64)
+        self._means = {name: float(values.mean()) for name, values in sampled.items()}
+        self._variances = {name: float(values.var()) for name, values in sampled.items()}
+
+    def estimate(self, iterations: int = 200) -> Dict[str, float]:
+        means = self._means
+        settings = self.settings
+        arrival_rate = 1 / means['next_car_arrival_time']
+        eating_probability = means['if_eating']
+        variances = self._variances
+        food_interaction_time = means['interaction_with_cashier_while_getting_food_time']
+        cashier_service_time = means['interaction_with_cashier_time'] + eating_probability * food_interaction_time
+        cashier_variability = (1 + variances['interaction_with_cashier_time'] / cashier_service_time**2) / 2
+        place_time_variance = sum(variances[name] for name in (
+            'getting_to_the_pump_time',
+            'fueling_time',
+            'going_to_the_building_time',
+            'interaction_with_cashier_time',
+            'going_back_to_the_car_time',
+        ))
+        broken_pumps = means['pump_outage_time'] / (means['pump_working_time'] + means['pump_outage_time'])
+        open_pumps = settings.pumps_quantity if settings.open_pumps is None else settings.open_pumps.mean_quantity
+        cashiers = _get_mean_quantity(settings.cashiers_quantity)
+        pump_places = max(open_pumps - broken_pumps, 1e-6)
+        # Leaving cars still take a parking place, but not a pump parking place.
+        capacity = settings.pumps_quantity * 4 - arrival_rate * means['leaving_the_station_time']
+
+        served_rate = arrival_rate
+        for _ in range(iterations):
+            waiting_probability, cashier_utilisation = _get_waiting_probability(
+                served_rate, cashier_service_time, cashiers)
+            # Customers taking the food have the priority, so they only wait for a cashier to finish the current one.
+            food_waiting_time = waiting_probability * cashier_service_time / cashiers
+            food_waiting_time *= cashier_variability
+            cashier_waiting_time = food_waiting_time / (1 - cashier_utilisation)
+            place_time = (
+                means['getting_to_the_pump_time']
+                + means['fueling_time']
+                + means['going_to_the_building_time']
+                + cashier_waiting_time
+                + means['interaction_with_cashier_time']
+                + eating_probability * (means['food_preparation_time'] + food_waiting_time + food_interaction_time)
+                + means['going_back_to_the_car_time']
+            )
+            place_variability = (1 + place_time_variance / place_time**2) / 2
+            waiting_room = max(int(round((capacity - pump_places) / place_variability)), 0)
+            probabilities = _get_queue_state_probabilities(
+                arrival_rate * place_time, pump_places, int(np.ceil(pump_places)) + waiting_room)
+            served_rate = 0.5 * served_rate + 0.5 * arrival_rate * (1 - probabilities[-1])
+
+        balking_probability = float(probabilities[-1])
+        n = np.arange(probabilities.size)
+        queue_length = float(np.sum(np.maximum(n - pump_places, 0) * probabilities)) * place_variability
+
+        summary = ResultsSummary(
+            cars_quantity=int(served_rate * self.simulation_time),
+            missed_cars_quantity=int(arrival_rate * balking_probability * self.simulation_time),
+            hot_dogs_quantity=int(served_rate * eating_probability * self.simulation_time),
+            fuel_needed=served_rate * means['customer_fuel_needed'] * self.simulation_time,
+        )
+        profit = ProfitCalculator(
+            simulation_settings=settings,
+            profit_calculation_settings=self.profit_calculation_settings,
+            results=summary,
+            simulation_time=self.simulation_time,
+        ).calculate()
+
+        return {
+            'pumps_utilisation': served_rate * means['fueling_time'] / settings.pumps_quantity,
+            'fuel_pump_parking_utilisation': served_rate * place_time / settings.pumps_quantity,
+            'cashiers_utilisation': served_rate * cashier_service_time / cashiers,
+            'balking_probability': balking_probability,
+            'pump_waiting_time': queue_length / served_rate + means['getting_to_the_pump_time'],
+            'cashier_waiting_time': cashier_waiting_time,
+            **profit,
+        }
+
+    def compare_with_simulation(self, seed: int = 0) -> pd.DataFrame:
+        """Runs the discrete-event simulation of the same settings and returns the relative errors of the estimate."""
+        simulator = GasStationSimulator(self.settings, logging_settings=LoggingSettings.quiet(), seed=seed)
+        simulator.run(time=self.simulation_time, return_dataframe=False)
+        kpis = simulator.get_kpis()
+        monitored_resources = simulator.get_monitored_resources(step=60)
+        simulated_profit = ProfitCalculator(
+            simulation_settings=self.settings,
+            profit_calculation_settings=self.profit_calculation_settings,
+            results=simulator.kpis.summary,
+            simulation_time=self.simulation_time,
+        ).calculate()
+        arrivals = kpis['cars_quantity'] + kpis['missed_cars_quantity']
+        simulated = {
+            'pumps_utilisation': monitored_resources['fuel_pumps'].mean() / self.settings.pumps_quantity,
+            'fuel_pump_parking_utilisation':
+                monitored_resources['fuel_pump_parking'].mean() / self.settings.pumps_quantity,
+            'cashiers_utilisation':
+                monitored_resources['cashiers'].mean() / _get_mean_quantity(self.settings.cashiers_quantity),
+            'balking_probability': kpis['missed_cars_quantity'] / arrivals if arrivals else np.nan,
+            'pump_waiting_time': kpis['pump_waiting_time_mean'],
+            'cashier_waiting_time': kpis['cashier_waiting_time_mean'],
+            **simulated_profit,
+        }
+        comparison = pd.DataFrame({'estimate': pd.Series(self.estimate()), 'simulation': pd.Series(simulated)})
+        comparison['relative_error'] = (comparison['estimate'] - comparison['simulation']) / comparison['simulation']
+        return comparison
+
+    @classmethod
+    def screen(
+            cls,
+            scenarios: Sequence[SimulationSettings],
+            profit_calculation_settings: ProfitCalculationSettings,
+            simulation_time: int = _MONTH,
+            top_fraction: float = 0.2,
+            min_profit: Optional[float] = None,
+    ) -> List[SimulationSettings]:
+        """Returns the most profitable `top_fraction` of the scenarios, optionally only those above `min_profit`."""
+        profits = np.array([
+            cls(scenario, profit_calculation_settings, simulation_time=simulation_time).estimate()['profit']
+            for scenario in scenarios
+        ])
+        order = np.argsort(-profits, kind='stable')[:max(int(np.ceil(len(scenarios) * top_fraction)), 1)]
+        if min_profit is not None:
+            order = order[profits[order] >= min_profit]
+        return [scenarios[index] for index in order.tolist()]
@@ -0,0 +1,508 @@
+import heapq
+import itertools
+import math
+from enum import IntEnum
+from typing import Callable, Dict, List, Optional, Tuple
+
+from gas_station_simulator._customer_results import _CustomerResultsRecorder
+from gas_station_simulator._kpi import KpiAccumulator
+from gas_station_simulator._monitored_resources import _ResourceMonitor
+from gas_station_simulator._settings import MonitoringSettings, _SampledSettings
+from gas_station_simulator._staffing import StaffingSchedule, _get_max_quantity
+from gas_station_simulator._trace import TraceEvent, TraceRecorder
+
+# Owner of the pump request of a breakdown; customers are identified by their slots, which are non-negative.
+_PUMP_BREAKER = -1
+# Priorities of the requests, the same as the ones of `_Customer` and `_GasStation`.
+_PUMP_BREAKER_PRIORITY = -1
+_FOOD_PRIORITY = 0
+_CUSTOMER_PRIORITY = 1
+
+
+class _Event(IntEnum):
+    """Kinds of the event records, each handled by the method of the same position in `_FastEngine._handlers`."""
+    ARRIVAL = 0
+    PUMP_BREAKS = 1
+    PUMP_REPAIRED = 2
+    BREAKER_GETS_PUMP = 3
+    GETS_PUMP_PARKING_PLACE = 4
+    AT_THE_PUMP = 5
+    GETS_PUMP = 6
+    FUELED = 7
+    LEFT_THE_PUMP = 8
+    AT_THE_BUILDING = 9
+    GETS_CASHIER = 10
+    PAID = 11
+    FOOD_READY = 12
+    GETS_CASHIER_WITH_FOOD = 13
+    TOOK_THE_FOOD = 14
+    BACK_AT_THE_CAR = 15
+    LEFT_THE_STATION = 16
+    STAFFING_CHANGE = 17
+
+
+class _Resource:
+    """Units of a resource shared by customers, with a priority queue of the waiting ones.
+
+    `users` maps the owners of the units to the keys of their requests, (priority, time), where lower keys are more
+    important. Units made unavailable by a staffing schedule are only counted: `withheld` of them are taken and
+    `to_withhold` should be, so the missing ones are taken as soon as they are released, before any waiting request.
+    Samples of the monitor are taken like the ones of the monitored SimPy resources.
+    """
+
+    __slots__ = ('monitor', 'capacity', 'users', 'queue', 'withheld', 'to_withhold', '_on_grant', '_sequence')
+
+    def __init__(self, monitor: _ResourceMonitor, capacity: int, on_grant: Callable[['_Resource', int, int], None]):
+        self.monitor = monitor
+        self.capacity = capacity
+        self.users: Dict[int, Tuple[int, float]] = {}
+        self.queue: List[Tuple[int, float, int, int]] = []
+        self.withheld = 0
+        self.to_withhold = 0
+        self._on_grant = on_grant
+        self._sequence = itertools.count()
+
+    def request(self, owner: int, priority: int, time: float) -> bool:
+        """Returns whether the unit is granted right away; otherwise `on_grant` is called when it is."""
+        self.monitor.record(time, len(self.users))
+        return self._acquire(owner, priority, time)
+
+    def request_preempting(self, owner: int, priority: int, time: float) -> Tuple[bool, Optional[int]]:
+        """Like `request`, but if there is no free unit it takes the one of the least important user, if that user's
+        request is less important, and also returns the owner it was taken from.
+        """
+        self.monitor.record(time, len(self.users))
+        preempted = None
+        if len(self.users) + self.withheld >= self.capacity and self.users:
+            owner_to_preempt = max(self.users, key=self.users.__getitem__)
+            if self.users[owner_to_preempt] > (priority, time):
+                del self.users[owner_to_preempt]
+                preempted = owner_to_preempt
+        return self._acquire(owner, priority, time), preempted
+
+    def release(self, owner: int, time: float):
+        self.monitor.record(time, len(self.users))
+        if self.users.pop(owner, None) is not None:
+            self._fill()
+
+    def set_available_capacity(self, capacity: int):
+        self.to_withhold = self.capacity - capacity
+        self.withheld = min(self.withheld, self.to_withhold)
+        self._fill()
+
+    def _acquire(self, owner: int, priority: int, time: float) -> bool:
+        if len(self.users) + self.withheld < self.capacity:
+            self.users[owner] = (priority, time)
+            return True
+        heapq.heappush(self.queue, (priority, time, next(self._sequence), owner))
+        return False
+
+    def _fill(self):
+        while len(self.users) + self.withheld < self.capacity:
+            if self.withheld < self.to_withhold:
+                self.withheld += 1
+            elif self.queue:
+                priority, time, _, owner = heapq.heappop(self.queue)
+                self.users[owner] = (priority, time)
+                self._on_grant(self, owner, priority)
+            else:
+                break
+
+
+class _FastEngine:
+    """Simulates the station as a flat state machine over a single heap of event records.
+
+    The customers' lifecycle is the one of `_Customer` and `_GasStation`, but customers are rows of parallel lists
+    reused after they leave, so no generators, processes or events are created. Records are (time, sequence, kind,
+    slot, token) tuples; a fueling stopped by a pump breakdown changes the customer's token, which invalidates its
+    pending records.
+    """
+
+    def __init__(
+            self,
+            settings: _SampledSettings,
+            results: _CustomerResultsRecorder,
+            kpis: KpiAccumulator,
+            monitoring_settings: Optional[MonitoringSettings] = None,
+    ):
+        self.now = 0.0
+        self.events_quantity = 0
+        self.next_car_number = 0
+        self.trace: Optional[TraceRecorder] = None
+        self._settings = settings
+        self._results = results
+        self._kpis = kpis
+        monitoring_settings = monitoring_settings or MonitoringSettings()
+        monitoring = {'flush_interval': monitoring_settings.flush_interval, 'path': monitoring_settings.path}
+
+        self.cashiers = _Resource(
+            _ResourceMonitor('cashiers', **monitoring), _get_max_quantity(settings.cashiers_quantity), self._grant)
+        self.fuel_pump_parking_place = _Resource(
+            _ResourceMonitor('fuel_pump_parking', **monitoring), settings.pumps_quantity, self._grant)
+        self.fuel_pumps = _Resource(_ResourceMonitor('fuel_pumps', **monitoring), settings.pumps_quantity, self._grant)
+        self.parking_places_monitor = _ResourceMonitor('gas_station_parking', **monitoring)
+        self.parking_places_capacity = settings.pumps_quantity * 4
+        self.parking_places_level = self.parking_places_capacity
+
+        self._queue: List[Tuple[float, int, int, int, int]] = []
+        self._sequence = itertools.count()
+        self._handlers: List[Callable[[int, int], None]] = [
+            self._arrive,
+            self._break_the_pump,
+            self._repair_the_pump,
+            self._breaker_gets_pump,
+            self._gets_pump_parking_place,
+            self._at_the_pump,
+            self._gets_pump,
+            self._fueled,
+            self._left_the_pump,
+            self._at_the_building,
+            self._gets_cashier,
+            self._paid,
+            self._food_ready,
+            self._gets_cashier_with_food,
+            self._took_the_food,
+            self._back_at_the_car,
+            self._left_the_station,
+            self._change_staffing,
+        ]
+
+        self._schedules: List[Tuple[_Resource, StaffingSchedule]] = []
+        if isinstance(settings.cashiers_quantity, StaffingSchedule):
+            self._schedules.append((self.cashiers, settings.cashiers_quantity))
+        if settings.open_pumps is not None:
+            if settings.open_pumps.max_quantity > settings.pumps_quantity:
+                raise ValueError(f'The schedule opens up to {settings.open_pumps.max_quantity} pumps, but there are'
+                                 f' only {settings.pumps_quantity}.')
+            self._schedules.append((self.fuel_pumps, settings.open_pumps))
+
+        # Customers' attributes by their slots.
+        self._free_slots: List[int] = []
+        self._numbers: List[int] = []
+        self._rows: List[int] = []
+        self._fuel_needed: List[float] = []
+        self._expected_fueling_time: List[int] = []
+        self._eating: List[bool] = []
+        self._interaction_with_cashier_time: List[int] = []
+        self._interaction_with_cashier_while_getting_food_time: List[int] = []
+        self._food_preparation_time: List[int] = []
+        self._getting_to_the_pump_time: List[int] = []
+        self._going_to_the_building_time: List[int] = []
+        self._going_back_to_the_car_time: List[int] = []
+        self._leaving_the_station_time: List[int] = []
+        self._arrival_time: List[float] = []
+        self._left_fueling_time: List[float] = []
+        self._fuel_gotten: List[float] = []
+        self._start_fueling_time: List[float] = []
+        self._fueling_started: List[bool] = []
+        self._fueling: List[bool] = []
+        self._waiting_for_cashier_start_time: List[float] = []
+        self._tokens: List[int] = []
+
+        self._working_time = settings.pump_working_time()
+        self._schedule(self._working_time, _Event.PUMP_BREAKS)
+        for index, (resource, schedule) in enumerate(self._schedules):
+            resource.set_available_capacity(schedule.get_quantity(0))
+            self._schedule_staffing_change(index)
+        self._schedule(settings.next_car_arrival_time(), _Event.ARRIVAL)
+
+    @property
+    def monitors(self) -> List[_ResourceMonitor]:
+        return [
+            self.cashiers.monitor,
+            self.fuel_pump_parking_place.monitor,
+            self.fuel_pumps.monitor,
+            self.parking_places_monitor,
+        ]
+
+    def run(self, until: float):
+        queue = self._queue
+        handlers = self._handlers
+        heappop = heapq.heappop
+        events_quantity = 0
+        while queue and queue[0][0] < until:
+            self.now, _, kind, slot, token = heappop(queue)
+            handlers[kind](slot, token)
+            events_quantity += 1
+        self.events_quantity += events_quantity
+        self.now = until
+
+    def flush_monitored_data(self):
+        for monitor in self.monitors:
+            monitor.flush()
+
+    def _schedule(self, delay: float, kind: _Event, slot: int = 0, token: int = 0):
+        heapq.heappush(self._queue, (self.now + delay, next(self._sequence), kind, slot, token))
+
+    def _grant(self, resource: _Resource, owner: int, priority: int):
+        if resource is self.fuel_pump_parking_place:
+            self._schedule(0, _Event.GETS_PUMP_PARKING_PLACE, owner)
+        elif owner == _PUMP_BREAKER:
+            self._schedule(0, _Event.BREAKER_GETS_PUMP)
+        elif resource is self.fuel_pumps:
+            self._schedule(0, _Event.GETS_PUMP, owner, self._tokens[owner])
+        elif priority == _FOOD_PRIORITY:
+            self._schedule(0, _Event.GETS_CASHIER_WITH_FOOD, owner)
+        else:
+            self._schedule(0, _Event.GETS_CASHIER, owner)
+
+    def _add_customer(self, number: int) -> int:
+        settings = self._settings
+        row = self._results.add(number=number, enter=True)
+        fuel_needed = settings.customer_fuel_needed()
+        expected_fueling_time = int(fuel_needed / settings.pump_fueling_speed)
+        eating = bool(settings.if_eating())
+        attributes = (
+            number,
+            row,
+            fuel_needed,
+            expected_fueling_time,
+            eating,
+            settings.interaction_with_cashier_time(),
+            settings.interaction_with_cashier_while_getting_food_time(),
+            settings.food_preparation_time(),
+            settings.getting_to_the_pump_time(),
+            settings.going_to_the_building_time(),
+            settings.going_back_to_the_car_time(),
+            settings.leaving_the_station_time(),
+            self.now,
+            expected_fueling_time,
+            0,
+            None,
+            False,
+            False,
+            None,
+        )
+        columns = (
+            self._numbers,
+            self._rows,
+            self._fuel_needed,
+            self._expected_fueling_time,
+            self._eating,
+            self._interaction_with_cashier_time,
+            self._interaction_with_cashier_while_getting_food_time,
+            self._food_preparation_time,
+            self._getting_to_the_pump_time,
+            self._going_to_the_building_time,
+            self._going_back_to_the_car_time,
+            self._leaving_the_station_time,
+            self._arrival_time,
+            self._left_fueling_time,
+            self._fuel_gotten,
+            self._start_fueling_time,
+            self._fueling_started,
+            self._fueling,
+            self._waiting_for_cashier_start_time,
+        )
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            for column, value in zip(columns, attributes):
+                column[slot] = value
+        else:
+            slot = len(self._numbers)
+            for column, value in zip(columns, attributes):
+                column.append(value)
+            self._tokens.append(0)
+        self._results.set(row, 'fuel_needed', fuel_needed)
+        self._results.set(row, 'expected_fueling_time', expected_fueling_time)
+        self._results.set_eating(row, eating)
+        return slot
+
+    def _arrive(self, slot: int, token: int):
+        now = self.now
+        number = self.next_car_number
+        self.next_car_number += 1
+        if self.parking_places_level > 0:
+            self.parking_places_monitor.record(now, self.parking_places_capacity - self.parking_places_level)
+            self.parking_places_level -= 1
+            slot = self._add_customer(number)
+            self._results.set(self._rows[slot], 'arrival_time', now)
+            if self.trace is not None:
+                self.trace.record(now, TraceEvent.ARRIVAL, number, self._fuel_needed[slot],
+                                  self._expected_fueling_time[slot], self._eating[slot])
+            if self._left_fueling_time[slot]:
+                self._request_pump_parking_place(slot)
+            else:
+                self._schedule(self._leaving_the_station_time[slot], _Event.LEFT_THE_STATION, slot)
+        else:
+            self._results.add(number=number, enter=False, arrival_time=now)
+            self._kpis.record_missed_car(arrival_time=now)
+            self._settings.skip_customer()
+            if self.trace is not None:
+                self.trace.record(now, TraceEvent.BALK, number)
+        self._schedule(self._settings.next_car_arrival_time(), _Event.ARRIVAL)
+
+    def _request_pump_parking_place(self, slot: int):
+        if self.fuel_pump_parking_place.request(slot, _CUSTOMER_PRIORITY, self.now):
+            self._gets_pump_parking_place(slot, 0)
+
+    def _gets_pump_parking_place(self, slot: int, token: int):
+        if self.trace is not None:
+            self.trace.record(self.now, TraceEvent.PUMP_PARKING_PLACE, self._numbers[slot])
+        self._schedule(self._getting_to_the_pump_time[slot], _Event.AT_THE_PUMP, slot)
+
+    def _at_the_pump(self, slot: int, token: int):
+        if self.fuel_pumps.request(slot, _CUSTOMER_PRIORITY, self.now):
+            self._gets_pump(slot, self._tokens[slot])
+
+    def _gets_pump(self, slot: int, token: int):
+        if token != self._tokens[slot]:
+            return
+        now = self.now
+        if self.trace is not None:
+            self.trace.record(now, TraceEvent.PUMP_ACQUIRE, self._numbers[slot])
+        self._start_fueling_time[slot] = now
+        if not self._fueling_started[slot]:
+            self._results.set(self._rows[slot], 'fueling_start_time', now)
+            self._kpis.record_pump_waiting_time(now - self._arrival_time[slot])
+            self._fueling_started[slot] = True
+        self._fueling[slot] = True
+        self._tokens[slot] += 1
+        self._schedule(self._left_fueling_time[slot], _Event.FUELED, slot, self._tokens[slot])
+
+    def _fueled(self, slot: int, token: int):
+        if token != self._tokens[slot]:
+            return
+        self._finish_fueling(slot)
+
+    def _finish_fueling(self, slot: int):
+        self._fueling[slot] = False
+        self._fuel_gotten[slot] = self._expected_fueling_time[slot]
+        self._left_fueling_time[slot] = 0
+        self._results.set(self._rows[slot], 'fueling_end_time', self.now)
+        if self.trace is not None:
+            self.trace.record(self.now, TraceEvent.FUELED, self._numbers[slot])
+        self._leave_the_pump(slot)
+
+    def _fueling_interrupted(self, slot: int):
+        # The pump was taken either during the fueling or after it was granted, before the fueling started. The new
+        # token invalidates the pending fueled or pump grant record.
+        self._tokens[slot] += 1
+        if not self._fueling[slot]:
+            self._at_the_pump(slot, 0)
+            return
+        fuel_got = self.now - self._start_fueling_time[slot]
+        if self._fuel_gotten[slot] + fuel_got > self._expected_fueling_time[slot]:
+            raise ValueError('Fuel gotten cannot be higher than fueling time')
+        if fuel_got == self._left_fueling_time[slot]:
+            # The pump was taken just as the tank got full, so the fueling has succeeded.
+            self._finish_fueling(slot)
+            return
+        self._fueling[slot] = False
+        self._fuel_gotten[slot] += fuel_got
+        if self.trace is not None:
+            self.trace.record(self.now, TraceEvent.PUMP_INTERRUPT, self._numbers[slot], self._fuel_gotten[slot],
+                              self._expected_fueling_time[slot])
+        self._left_fueling_time[slot] -= fuel_got
+        self._schedule(self._settings.leaving_the_pump_after_interruption_time(), _Event.LEFT_THE_PUMP, slot)
+
+    def _left_the_pump(self, slot: int, token: int):
+        self._getting_to_the_pump_time[slot] = self._settings.getting_back_to_the_pump_time()
+        self.fuel_pumps.release(slot, self.now)
+        if self.trace is not None:
+            self.trace.record(self.now, TraceEvent.PUMP_RELEASE, self._numbers[slot])
+        self.fuel_pump_parking_place.release(slot, self.now)
+        self._request_pump_parking_place(slot)
+
+    def _leave_the_pump(self, slot: int):
+        self.fuel_pumps.release(slot, self.now)
+        if self.trace is not None:
+            self.trace.record(self.now, TraceEvent.PUMP_RELEASE, self._numbers[slot])
+        self._schedule(self._going_to_the_building_time[slot], _Event.AT_THE_BUILDING, slot)
+
+    def _at_the_building(self, slot: int, token: int):
+        self._waiting_for_cashier_start_time[slot] = self.now
+        if self.trace is not None:
+            self.trace.record(self.now, TraceEvent.CASHIER_REQUEST, self._numbers[slot])
+        if self.cashiers.request(slot, _CUSTOMER_PRIORITY, self.now):
+            self._gets_cashier(slot, 0)
+
+    def _gets_cashier(self, slot: int, token: int):
+        now = self.now
+        self._kpis.record_cashier_waiting_time(now - self._waiting_for_cashier_start_time[slot])
+        self._results.set(self._rows[slot], 'interacting_with_cashier_start_time', now)
+        if self.trace is not None:
+            self.trace.record(self.now, TraceEvent.CASHIER_START, self._numbers[slot])
+        self._schedule(self._interaction_with_cashier_time[slot], _Event.PAID, slot)
+
+    def _paid(self, slot: int, token: int):
+        now = self.now
+        self._results.set(self._rows[slot], 'interacting_with_cashier_end_time', now)
+        if self.trace is not None:
+            self.trace.record(self.now, TraceEvent.CASHIER_END, self._numbers[slot])
+        self.cashiers.release(slot, now)
+        if self._eating[slot]:
+            self._results.set(self._rows[slot], 'waiting_for_food_time_start_time', now)
+            if self.trace is not None:
+                self.trace.record(now, TraceEvent.FOOD_WAIT, self._numbers[slot])
+            self._schedule(self._food_preparation_time[slot], _Event.FOOD_READY, slot)
+        else:
+            self._schedule(self._going_back_to_the_car_time[slot], _Event.BACK_AT_THE_CAR, slot)
+
+    def _food_ready(self, slot: int, token: int):
+        if self.trace is not None:
+            self.trace.record(self.now, TraceEvent.FOOD_READY, self._numbers[slot])
+        if self.cashiers.request(slot, _FOOD_PRIORITY, self.now):
+            self._gets_cashier_with_food(slot, 0)
+
+    def _gets_cashier_with_food(self, slot: int, token: int):
+        self._schedule(self._interaction_with_cashier_while_getting_food_time[slot], _Event.TOOK_THE_FOOD, slot)
+
+    def _took_the_food(self, slot: int, token: int):
+        self.cashiers.release(slot, self.now)
+        self._results.set(self._rows[slot], 'waiting_for_food_time_end_time', self.now)
+        if self.trace is not None:
+            self.trace.record(self.now, TraceEvent.FOOD_TAKEN, self._numbers[slot])
+        self._schedule(self._going_back_to_the_car_time[slot], _Event.BACK_AT_THE_CAR, slot)
+
+    def _back_at_the_car(self, slot: int, token: int):
+        self.fuel_pump_parking_place.release(slot, self.now)
+        self._schedule(self._leaving_the_station_time[slot], _Event.LEFT_THE_STATION, slot)
+
+    def _left_the_station(self, slot: int, token: int):
+        now = self.now
+        self.parking_places_monitor.record(now, self.parking_places_capacity - self.parking_places_level)
+        self.parking_places_level += 1
+        self._results.finish(self._rows[slot])
+        if self.trace is not None:
+            self.trace.record(now, TraceEvent.LEAVE, self._numbers[slot], now - self._arrival_time[slot])
+        self._kpis.record_served_car(
+            self._fuel_needed[slot],
+            self._eating[slot],
+            now - self._arrival_time[slot],
+            arrival_time=self._arrival_time[slot],
+        )
+        self._free_slots.append(slot)
+
+    def _break_the_pump(self, slot: int, token: int):
+        granted, preempted = self.fuel_pumps.request_preempting(_PUMP_BREAKER, _PUMP_BREAKER_PRIORITY, self.now)
+        if preempted is not None:
+            # Handled at once, like the urgent interrupts of SimPy, so no record of the customer due at the same time
+            # runs before it.
+            self._fueling_interrupted(preempted)
+        if granted:
+            self._breaker_gets_pump(slot, token)
+
+    def _breaker_gets_pump(self, slot: int, token: int):
+        outage_time = self._settings.pump_outage_time()
+        if self.trace is not None:
+            self.trace.record(self.now, TraceEvent.PUMP_BREAK, value=outage_time)
+        self._schedule(outage_time, _Event.PUMP_REPAIRED)
+
+    def _repair_the_pump(self, slot: int, token: int):
+        self.fuel_pumps.release(_PUMP_BREAKER, self.now)
+        if self.trace is not None:
+            self.trace.record(self.now, TraceEvent.PUMP_REPAIR)
+        self._working_time = self._settings.pump_working_time()
+        self._schedule(self._working_time, _Event.PUMP_BREAKS)
+
+    def _change_staffing(self, index: int, token: int):
+        resource, schedule = self._schedules[index]
+        resource.set_available_capacity(schedule.get_quantity(self.now))
+        self._schedule_staffing_change(index)
+
+    def _schedule_staffing_change(self, index: int):
+        _, schedule = self._schedules[index]
+        next_change_time = schedule.get_next_change_time(self.now)
+        if next_change_time != math.inf:
+            self._schedule(next_change_time - self.now, _Event.STAFFING_CHANGE, index)
@@ -1,44 +1,175 @@
-from typing import Generator, Any
+import math
+from enum import IntEnum
+from typing import Generator, Any, Optional, List, Union, Dict, Tuple, TYPE_CHECKING
 
-from simpy import Event
+from simpy import Event, Process
+from simpy.events import Timeout
+from simpy.resources.resource import Request
 
-from gas_station_simulator._environment import _SimulationEnvironment
+from gas_station_simulator._environment import _SimulationEnvironment, _PrefixLoggerAdapter
 from gas_station_simulator._monitored_resources import MonitoredResource, MonitoredPreemptiveResource, \
-    MonitoredPriorityResource, MonitoredContainer
-from gas_station_simulator._settings import SimulationSettings
+    MonitoredPriorityResource, MonitoredContainer, _MonitoredResource
+from gas_station_simulator._settings import SimulationSettings, MonitoringSettings
+from gas_station_simulator._staffing import StaffingSchedule, _get_max_quantity
+from gas_station_simulator._trace import TraceEvent
 from gas_station_simulator._utils import _get_time_string
 
+if TYPE_CHECKING:
+    from gas_station_simulator._customer import _Customer
+
+
+class _PumpBreakStage(IntEnum):
+    REPAIRED = 0
+    WORKING = 1
+    WAITING_FOR_PUMP = 2
+    OUT_OF_ORDER = 3
+
 
 class _GasStation:
-    def __init__(self, environment: _SimulationEnvironment, settings: SimulationSettings):
+    def __init__(
+            self,
+            environment: _SimulationEnvironment,
+            settings: SimulationSettings,
+            monitoring_settings: Optional[MonitoringSettings] = None,
+            parking_places_level: Optional[int] = None,
+            name: Optional[str] = None,
+    ):
+        """A station restored from a checkpoint gets the `parking_places_level` it had and does not start breaking the
+        pumps or following the staffing schedules until `resume_breaking_pumps` and `resume_staffing` are called.
+
+        A `name` is given to the stations sharing an environment; it prefixes their log messages and their monitored
+        data are saved in its subdirectory.
+        """
         self.env = environment
+        self.name = name
         self._settings = settings
+        self.logger = environment.logger if name is None else _PrefixLoggerAdapter(environment.logger, {'name': name})
+        monitoring_settings = monitoring_settings or MonitoringSettings()
+        path = monitoring_settings.path if name is None else monitoring_settings.path / name
+        monitoring = {'flush_interval': monitoring_settings.flush_interval, 'path': path}
 
-        self.fuel_pumps = MonitoredPreemptiveResource('fuel_pumps', environment, settings.pumps_quantity)
-        self.fuel_pump_parking_place = MonitoredResource('fuel_pump_parking', environment, settings.pumps_quantity)
-        self.cashiers = MonitoredPriorityResource('cashiers', environment, settings.cashiers_quantity)
+        self.fuel_pumps = MonitoredPreemptiveResource(
+            'fuel_pumps', environment, settings.pumps_quantity, **monitoring)
+        self.fuel_pump_parking_place = MonitoredResource(
+            'fuel_pump_parking', environment, settings.pumps_quantity, **monitoring)
+        self.cashiers = MonitoredPriorityResource(
+            'cashiers', environment, _get_max_quantity(settings.cashiers_quantity), **monitoring)
         self.parking_places = MonitoredContainer(
             'gas_station_parking',
             environment,
-            init=settings.pumps_quantity * 4,
+            init=settings.pumps_quantity * 4 if parking_places_level is None else parking_places_level,
             capacity=settings.pumps_quantity * 4,
+            **monitoring,
         )
-        environment.process(self._break_the_pump())
+        # Customers who are in the station, by their numbers.
+        self.customers: Dict[int, '_Customer'] = {}
+        self.pump_break_stage = _PumpBreakStage.REPAIRED
+        self.pump_break_request: Optional[Request] = None
+        self._working_time = 0
+        self._outage_time = 0
+        self._remaining_delay: Optional[float] = None
+        self.pump_breaker: Optional[Process] = None
+        # Resources whose available capacity follows a schedule, by their names, and the processes following them.
+        self.staffing_schedules: Dict[str, Tuple[_MonitoredResource, StaffingSchedule]] = {}
+        if isinstance(settings.cashiers_quantity, StaffingSchedule):
+            self.staffing_schedules[self.cashiers.name] = (self.cashiers, settings.cashiers_quantity)
+        if settings.open_pumps is not None:
+            if settings.open_pumps.max_quantity > settings.pumps_quantity:
+                raise ValueError(f'The schedule opens up to {settings.open_pumps.max_quantity} pumps, but there are'
+                                 f' only {settings.pumps_quantity}.')
+            self.staffing_schedules[self.fuel_pumps.name] = (self.fuel_pumps, settings.open_pumps)
+        self.staffing_processes: Dict[str, Process] = {}
+        if parking_places_level is None:
+            self.pump_breaker = environment.process(self._break_the_pump())
+            for name, (resource, schedule) in self.staffing_schedules.items():
+                resource.set_available_capacity(schedule.get_quantity(environment.now))
+                self.staffing_processes[name] = environment.process(self._follow_staffing_schedule(name))
+
+    @property
+    def monitored_resources(self) -> List[Union[MonitoredResource, MonitoredContainer]]:
+        return [self.cashiers, self.fuel_pump_parking_place, self.fuel_pumps, self.parking_places]
+
+    def flush_monitored_data(self):
+        for resource in self.monitored_resources:
+            resource.monitor.flush()
+
+    def get_pump_break_state(self) -> Dict[str, Any]:
+        return {
+            'pump_break_stage': self.pump_break_stage,
+            '_working_time': self._working_time,
+            '_outage_time': self._outage_time,
+        }
+
+    def resume_breaking_pumps(self, state: Dict[str, Any], delay: Optional[float]):
+        """Continues breaking the pumps from a checkpoint, waiting `delay` in the current timeout.
+
+        The pump request of the breakdown, if any, must have been restored before.
+        """
+        for attribute, value in state.items():
+            setattr(self, attribute, value)
+        self._remaining_delay = delay
+        self.pump_breaker = self.env.process(self._break_the_pump())
+
+    def resume_staffing(self, name: str, delay: Optional[float]):
+        """Continues following the staffing schedule of the resource `name` from a checkpoint, waiting `delay` for the
+        next change.
+
+        The placeholders of the unavailable units must have been restored before.
+        """
+        self.staffing_processes[name] = self.env.process(self._follow_staffing_schedule(name, delay))
+
+    def _follow_staffing_schedule(self, name: str, delay: Optional[float] = None) -> Generator[Event, Any, Any]:
+        resource, schedule = self.staffing_schedules[name]
+        while True:
+            if delay is None:
+                delay = schedule.get_next_change_time(self.env.now) - self.env.now
+                if delay == math.inf:
+                    return
+            yield self.env.timeout(delay)
+            delay = None
+            quantity = schedule.get_quantity(self.env.now)
+            resource.set_available_capacity(quantity)
+            if self.env.verbose:
+                self.logger.info(f'[STAFFING]: {quantity} of {resource.capacity} {name} are available.')
 
     def _break_the_pump(self) -> Generator[Event, Any, Any]:
         while True:
-            working_time = self._settings.pump_working_time()
-            self.env.logger.info(f'[PUMP BREAK]: A pump will break in'
-                                 f' {_get_time_string(working_time, print_days=False)}')
-            yield self.env.timeout(working_time)
-            self.env.logger.info(f'{self.fuel_pumps.count} of {self.fuel_pumps.capacity} pumps are allocated.')
-            if self.fuel_pumps.count == self.fuel_pumps.capacity:
-                self.env.logger.info('[PUMP BREAK]: Interrupting the fueling process since all of the pumps are'
-                                     ' allocated.')
-            with self.fuel_pumps.request(priority=-1) as request:
-                yield request
-                outage_time = self._settings.pump_outage_time()
-                self.env.logger.info(f'[PUMP BREAK]: One of the pumps has broken and will be unavailable for'
-                                     f' {_get_time_string(working_time, print_days=False)}.')
-                yield self.env.timeout(outage_time)
-                self.env.logger.info('[PUMP BREAK]: The pump is repaired.')
+            if self.pump_break_stage < _PumpBreakStage.WORKING:
+                self._working_time = self._settings.pump_working_time()
+                if self.env.verbose:
+                    self.logger.info(f'[PUMP BREAK]: A pump will break in'
+                                     f' {_get_time_string(self._working_time, print_days=False)}')
+
+            if self.pump_break_stage <= _PumpBreakStage.WORKING:
+                yield self._timeout(_PumpBreakStage.WORKING, self._working_time)
+                if self.env.verbose:
+                    self.logger.info(f'{self.fuel_pumps.count} of {self.fuel_pumps.capacity} pumps are'
+                                     f' allocated.')
+                if self.env.verbose and self.fuel_pumps.count == self.fuel_pumps.capacity:
+                    self.logger.info('[PUMP BREAK]: Interrupting the fueling process since all of the pumps'
+                                     ' are allocated.')
+                self.pump_break_stage = _PumpBreakStage.WAITING_FOR_PUMP
+                self.pump_break_request = self.fuel_pumps.request(priority=-1)
+
+            with self.pump_break_request as request:
+                if self.pump_break_stage == _PumpBreakStage.WAITING_FOR_PUMP:
+                    yield request
+                    self._outage_time = self._settings.pump_outage_time()
+                    if self.env.trace is not None:
+                        self.env.trace.record(self.env.now, TraceEvent.PUMP_BREAK, value=self._outage_time)
+                    if self.env.verbose:
+                        self.logger.info(f'[PUMP BREAK]: One of the pumps has broken and will be unavailable'
+                                         f' for {_get_time_string(self._working_time, print_days=False)}.')
+                yield self._timeout(_PumpBreakStage.OUT_OF_ORDER, self._outage_time)
+                if self.env.trace is not None:
+                    self.env.trace.record(self.env.now, TraceEvent.PUMP_REPAIR)
+                if self.env.verbose:
+                    self.logger.info('[PUMP BREAK]: The pump is repaired.')
+            self.pump_break_request = None
+            self.pump_break_stage = _PumpBreakStage.REPAIRED
+
+    def _timeout(self, stage: _PumpBreakStage, delay: float) -> Timeout:
+        self.pump_break_stage = stage
+        if self._remaining_delay is not None:
+            delay, self._remaining_delay = self._remaining_delay, None
+        return self.env.timeout(delay)
@@ -1,84 +1,387 @@
 import itertools
-import os
-from typing import List, Generator, Any, Union
+import pickle
+from pathlib import Path
+from typing import List, Generator, Any, Union, Optional, Dict, Tuple
 
 import pandas as pd
-from simpy import Event
+from simpy import Event, Process
 
-from gas_station_simulator._customer import _Customer, CustomerData
+from gas_station_simulator._checkpoint import SimulationCheckpoint, _SimulationState, _CAR_GENERATOR, \
+    _PUMP_BREAKER, _STAFFING, _get_pending_processes, _get_requests_state, _restore_requests, \
+    _assign_request_processes
+from gas_station_simulator._customer import _Customer, _admit_car
+from gas_station_simulator._customer_results import _CustomerResultsRecorder, CustomerData, ResultsSummary
 from gas_station_simulator._environment import _SimulationEnvironment
+from gas_station_simulator._fast_engine import _FastEngine
 from gas_station_simulator._gas_station import _GasStation
-from gas_station_simulator._monitored_resources import _MONITORED_RESOURCES_PATH
-from gas_station_simulator._settings import SimulationSettings
+from gas_station_simulator._instrumentation import InstrumentationReport
+from gas_station_simulator._kpi import KpiAccumulator
+from gas_station_simulator._monitored_resources import _align_monitored_data, _get_hourly_averages, _ResourceMonitor
+from gas_station_simulator._results_sinks import ResultsSink
+from gas_station_simulator._settings import SimulationSettings, MonitoringSettings, LoggingSettings, \
+    _SampledSettings, _validate_distributions
+from gas_station_simulator._trace import TraceRecorder
+
+
+_SIMPY_ENGINE = 'simpy'
+_FAST_ENGINE = 'fast'
 
 
 class GasStationSimulator:
-    def __init__(self, settings: SimulationSettings):
+    """Simulates a gas station with SimPy processes or, with the `fast` engine, with a flat state machine over a heap of
+    event records.
+
+    Both engines simulate the same customers' lifecycle, so their results are statistically equivalent, but not equal,
+    since simultaneous events are handled in a different order. The fast engine runs several times more customers per
+    second; it does not log the events and does not support instrumentation and checkpoints. Both engines record the
+    state transitions to a `trace`, if one is given.
+    """
+
+    def __init__(
+            self,
+            settings: SimulationSettings,
+            monitoring_settings: Optional[MonitoringSettings] = None,
+            logging_settings: Optional[LoggingSettings] = None,
+            seed: Optional[int] = None,
+            common_random_numbers: bool = False,
+            results_sink: Optional[ResultsSink] = None,
+            results_chunk_size: int = 10_000,
+            engine: str = _SIMPY_ENGINE,
+            trace: Optional[TraceRecorder] = None,
+    ):
+        if engine not in (_SIMPY_ENGINE, _FAST_ENGINE):
+            raise ValueError(f'Unknown engine {engine}, use {_SIMPY_ENGINE} or {_FAST_ENGINE}.')
+        self._engine = engine
         self._settings = settings
-        self._customers_results: List[CustomerData] = []
+        self._seed = seed
+        self._common_random_numbers = common_random_numbers
+        self._results_sink = results_sink
+        self._results_chunk_size = results_chunk_size
+        self._monitoring_settings = monitoring_settings
+        self._logging_settings = logging_settings
+        self._trace = trace
+        self._customers_results = _CustomerResultsRecorder()
+        self._sampled_settings: Optional[_SampledSettings] = None
+        self._gas_station: Optional[_GasStation] = None
+        self._environment: Optional[_SimulationEnvironment] = None
+        self._car_generator_process: Optional[Process] = None
+        self._fast_engine: Optional[_FastEngine] = None
+        self._next_car_number = 0
+        self.instrumentation_report: Optional[InstrumentationReport] = None
+        self.kpis = KpiAccumulator()
 
     def run(
             self,
             time: int,
             return_dataframe: bool = True,
             save: bool = False,
-    ) -> Union[List[CustomerData], pd.DataFrame]:
-        environment = _SimulationEnvironment()
-        gas_station = _GasStation(environment, settings=self._settings)
-        environment.process(self._car_generator(environment=environment, gas_station=gas_station))
-        environment.run(until=time)
-        if return_dataframe:
-            results = self._transform_results_to_dataframe(results=self._customers_results)
+            results_path: Path = Path('results.csv'),
+            instrument: bool = False,
+            resume: bool = False,
+    ) -> Union[List[CustomerData], pd.DataFrame, ResultsSummary]:
+        """Runs the simulation for `time` seconds.
+
+        If a results sink is set, the customers' results are streamed to it and only their summary is returned, so they
+        cannot be saved with `save`. With `instrument`, processed events and the wall time of the processes are
+        measured and stored as the `instrumentation_report`. With `resume`, the previous run or the restored checkpoint
+        continues until the simulation time `time` instead of starting over, and the results include the ones of the
+        previous runs.
+        """
+        if save and self._results_sink is not None:
+            raise ValueError('The results streamed to a results sink cannot be saved, read them from the sink instead.')
+        self.advance(time, instrument=instrument, resume=resume)
+        self.close()
+        if self._results_sink is not None:
+            results = self.kpis.summary
+        elif return_dataframe:
+            results = self._customers_results.to_dataframe()
         else:
-            results = self._customers_results
+            results = self._customers_results.to_customer_data()
         if save:
-            results.to_csv('results.csv', index=False)
-        environment.logger.handlers.clear()
+            self._customers_results.to_dataframe().to_csv(results_path, index=False)
         return results
 
-    def get_monitored_resources(self) -> pd.DataFrame:  # noqa
-        monitored_data = pd.DataFrame()
-        for file_name in os.listdir(_MONITORED_RESOURCES_PATH):
-            if monitored_data.empty:
-                monitored_data = pd.read_csv(_MONITORED_RESOURCES_PATH / file_name)
-            else:
-                monitored_data = pd.merge(
-                    monitored_data,
-                    pd.read_csv(_MONITORED_RESOURCES_PATH / file_name),
-                    on='time',
-                    how='outer',
-                )
-        monitored_data.sort_values(by='time', inplace=True)
-        monitored_data = monitored_data.fillna(method='ffill').fillna(method='bfill').reset_index(drop=True)
-        return monitored_data
+    def advance(self, time: int, instrument: bool = False, resume: bool = False):
+        """Runs the simulation like `run`, but does not build its results, e.g. to run it in many short slices.
 
-    def _car_generator(
-            self,
-            environment: _SimulationEnvironment,
-            gas_station: _GasStation,
-    ) -> Generator[Event, Any, Any]:
-        for i in itertools.count():
-            yield environment.timeout(self._settings.next_car_arrival_time())
-            available_parking_places = gas_station.parking_places.level
-            if available_parking_places > 0:
-                environment.logger.info('A car is arriving to the station.')
-                gas_station.parking_places.get(1)
-                customer = _Customer(environment=environment, number=i, settings=self._settings)
-                environment.process(self._car_process(environment, gas_station, customer))
+        The finished customers' results are written to the results sink, but the sink is not closed, since the
+        simulation goes on in the next slice; call `close` once the last one has run.
+        """
+        if self._engine == _FAST_ENGINE:
+            self._run_fast_engine(time, instrument=instrument, resume=resume)
+        else:
+            self._run_simpy_engine(time, instrument=instrument, resume=resume)
+        self._customers_results.flush()
+        if self._trace is not None:
+            self._trace.flush()
+
+    def close(self):
+        """Ends a run of the simulation advanced in slices, closing its results sink; `run` calls it."""
+        self._customers_results.close()
+
+    @property
+    def settings(self) -> SimulationSettings:
+        return self._settings
+
+    @property
+    def now(self) -> float:
+        """Simulation time reached by the last run, 0 before the first one."""
+        if self._engine == _FAST_ENGINE:
+            return self._fast_engine.now if self._fast_engine is not None else 0
+        return self._environment.now if self._environment is not None else 0
+
+    @property
+    def events_quantity(self) -> int:
+        """Events processed by the engine in the runs so far."""
+        if self._engine == _FAST_ENGINE:
+            return self._fast_engine.events_quantity if self._fast_engine is not None else 0
+        return self._environment.events_quantity if self._environment is not None else 0
+
+    @property
+    def monitoring_flush_time(self) -> float:
+        """Wall time spent writing the monitored data to files during the runs so far."""
+        return sum(monitor.flush_time for monitor in self._get_monitors())
+
+    def checkpoint(self) -> SimulationCheckpoint:
+        """Returns a snapshot of the simulation after the last run, from which `from_checkpoint` can resume it.
+
+        Requires distribution specifications of all the stochastic settings, since plain callables cannot be saved.
+        """
+        if self._engine == _FAST_ENGINE:
+            raise ValueError(f'Checkpoints require the {_SIMPY_ENGINE} engine.')
+        if self._environment is None:
+            raise ValueError('There is no simulation to checkpoint, call `run` first.')
+        _validate_distributions(self._settings, 'Checkpointing')
+        gas_station = self._gas_station
+        processes = {
+            _CAR_GENERATOR: self._car_generator_process,
+            _PUMP_BREAKER: gas_station.pump_breaker,
+            **{_STAFFING + name: process for name, process in gas_station.staffing_processes.items()},
+            **{number: customer.current_process for number, customer in gas_station.customers.items()},
+        }
+        state = _SimulationState(
+            settings=self._settings,
+            seed=self._seed,
+            common_random_numbers=self._common_random_numbers,
+            monitoring_settings=self._monitoring_settings,
+            sampled_settings=self._sampled_settings,
+            results=self._customers_results,
+            kpis=self.kpis,
+            time=self._environment.now,
+            next_car_number=self._next_car_number,
+            parking_places_level=gas_station.parking_places.level,
+            monitors={resource.name: resource.monitor for resource in gas_station.monitored_resources},
+            pump_break_state=gas_station.get_pump_break_state(),
+            customers=[customer.get_state() for customer in gas_station.customers.values()],
+            requests=_get_requests_state(gas_station),
+            processes=_get_pending_processes(self._environment, processes),
+        )
+        return SimulationCheckpoint(time=state.time, state=pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @classmethod
+    def from_checkpoint(
+            cls,
+            checkpoint: SimulationCheckpoint,
+            logging_settings: Optional[LoggingSettings] = None,
+            results_sink: Optional[ResultsSink] = None,
+            settings: Optional[SimulationSettings] = None,
+            seed: Optional[int] = None,
+            trace: Optional[TraceRecorder] = None,
+    ) -> 'GasStationSimulator':
+        """Restores a simulation from a checkpoint; `run(time, resume=True)` continues it until `time`.
+
+        Customers who are in the station keep the times drawn for them. Giving `settings` or `seed` replaces the
+        random streams of the rest of the simulation, to branch scenarios from a common state; the settings must keep
+        the quantities and schedules of pumps and cashiers. A `results_sink` replaces the one of the checkpoint and a
+        `trace` records the rest of the simulation.
+        """
+        state: _SimulationState = pickle.loads(checkpoint.state)
+        sampled_settings = state.sampled_settings
+        if settings is not None or seed is not None:
+            settings = settings or state.settings
+            if (settings.pumps_quantity, settings.cashiers_quantity, settings.open_pumps) != \
+                    (state.settings.pumps_quantity, state.settings.cashiers_quantity, state.settings.open_pumps):
+                raise ValueError('Simulations branched from a checkpoint must keep its pumps and cashiers quantities.')
+            seed = state.seed if seed is None else seed
+            sampled_settings = _SampledSettings(settings, seed, common_random_numbers=state.common_random_numbers)
+            # The pending arrival is already drawn, so the new arrivals follow it.
+            sampled_settings.start_arrivals_at(state.time + (dict(state.processes)[_CAR_GENERATOR] or 0))
+
+        simulator = cls(
+            settings or state.settings,
+            monitoring_settings=state.monitoring_settings,
+            logging_settings=logging_settings,
+            seed=state.seed if seed is None else seed,
+            common_random_numbers=state.common_random_numbers,
+            results_sink=results_sink,
+            trace=trace,
+        )
+        if results_sink is not None:
+            state.results.replace_sink(results_sink)
+        simulator._customers_results = state.results
+        simulator.kpis = state.kpis
+        simulator._next_car_number = state.next_car_number
+        simulator._sampled_settings = sampled_settings
+        simulator._restore(state)
+        return simulator
+
+    def get_results(self) -> pd.DataFrame:
+        """Returns the results of the customers of the last run which are kept in memory."""
+        return self._customers_results.to_dataframe()
+
+    def get_kpis(self) -> Dict[str, float]:
+        """Returns a snapshot of the key performance indicators gathered so far, without building any DataFrame."""
+        return self.kpis.snapshot()
+
+    def get_monitored_resources(self, step: Optional[int] = None) -> pd.DataFrame:
+        monitors = self._get_monitors()
+        if not monitors:
+            return pd.DataFrame()
+        return _align_monitored_data(monitors, step=step)
+
+    def get_monitored_resources_by_hour(self) -> pd.DataFrame:
+        """Returns the time-weighted averages of the monitored resources by the hour of day."""
+        monitors = self._get_monitors()
+        if not monitors:
+            return pd.DataFrame()
+        return _get_hourly_averages(monitors, end_time=self.now)
+
+    def _get_monitors(self) -> List[_ResourceMonitor]:
+        if self._engine == _FAST_ENGINE:
+            return self._fast_engine.monitors if self._fast_engine is not None else []
+        if self._gas_station is None:
+            return []
+        return [resource.monitor for resource in self._gas_station.monitored_resources]
+
+    def _run_simpy_engine(self, time: int, instrument: bool, resume: bool):
+        if resume:
+            environment, gas_station = self._resume(time)
+        else:
+            environment, gas_station = self._start()
+        instrumentation = environment.enable_instrumentation() if instrument else None
+        environment.run(until=time)
+        if instrumentation is not None:
+            instrumentation.disable()
+            self.instrumentation_report = instrumentation.report()
+        gas_station.flush_monitored_data()
+        environment.close_logger()
+
+    def _run_fast_engine(self, time: int, instrument: bool, resume: bool):
+        if instrument:
+            raise ValueError(f'Instrumentation requires the {_SIMPY_ENGINE} engine.')
+        if resume:
+            engine = self._fast_engine
+            if engine is None:
+                raise ValueError('There is no simulation to resume, call `run` first.')
+            self._validate_resume_time(engine.now, time)
+        else:
+            self._customers_results = _CustomerResultsRecorder(
+                sink=self._results_sink, chunk_size=self._results_chunk_size)
+            self.kpis = KpiAccumulator()
+            self._sampled_settings = _SampledSettings(
+                self._settings, self._seed, common_random_numbers=self._common_random_numbers)
+            engine = _FastEngine(
+                self._sampled_settings,
+                results=self._customers_results,
+                kpis=self.kpis,
+                monitoring_settings=self._monitoring_settings,
+            )
+            self._fast_engine = engine
+            if self._trace is not None:
+                engine.trace = self._trace
+                self._attach_trace(engine.monitors)
+        engine.run(until=time)
+        engine.flush_monitored_data()
+
+    def _start(self) -> Tuple[_SimulationEnvironment, _GasStation]:
+        self._customers_results = _CustomerResultsRecorder(sink=self._results_sink, chunk_size=self._results_chunk_size)
+        self.kpis = KpiAccumulator()
+        self._next_car_number = 0
+        settings = _SampledSettings(self._settings, self._seed, common_random_numbers=self._common_random_numbers)
+        self._sampled_settings = settings
+        environment = _SimulationEnvironment(logging_settings=self._logging_settings)
+        self._environment = environment
+        gas_station = _GasStation(environment, settings=settings, monitoring_settings=self._monitoring_settings)
+        self._gas_station = gas_station
+        if self._trace is not None:
+            environment.trace = self._trace
+            self._attach_trace([resource.monitor for resource in gas_station.monitored_resources])
+        self._car_generator_process = environment.process(
+            self._car_generator(environment=environment, gas_station=gas_station, settings=settings))
+        return environment, gas_station
+
+    def _resume(self, time: int) -> Tuple[_SimulationEnvironment, _GasStation]:
+        environment = self._environment
+        if environment is None:
+            raise ValueError('There is no simulation to resume, call `run` or `from_checkpoint` first.')
+        self._validate_resume_time(environment.now, time)
+        environment.close_logger()
+        environment.open_logger(self._logging_settings or LoggingSettings())
+        return environment, self._gas_station
+
+    def _attach_trace(self, monitors: List[_ResourceMonitor]):
+        if len(self._trace):
+            raise ValueError('The trace already has records, every simulation requires a new trace recorder.')
+        self._trace.attach_monitors(monitors)
+
+    @staticmethod
+    def _validate_resume_time(now: float, time: int):
+        if time <= now:
+            raise ValueError(
+                f'The simulation is already at {now}, it can only be resumed until a later time, got {time}.')
+
+    def _restore(self, state: _SimulationState):
+        settings = self._sampled_settings
+        environment = _SimulationEnvironment(logging_settings=self._logging_settings, initial_time=state.time)
+        self._environment = environment
+        gas_station = _GasStation(
+            environment,
+            settings=settings,
+            monitoring_settings=state.monitoring_settings,
+            parking_places_level=state.parking_places_level,
+        )
+        self._gas_station = gas_station
+        for resource in gas_station.monitored_resources:
+            resource.monitor = state.monitors[resource.name]
+        if self._trace is not None:
+            environment.trace = self._trace
+            self._attach_trace([resource.monitor for resource in gas_station.monitored_resources])
+        for customer_state in state.customers:
+            customer = _Customer(
+                environment=environment,
+                number=customer_state['number'],
+                settings=settings,
+                results=self._customers_results,
+                kpis=self.kpis,
+                state=customer_state,
+            )
+            gas_station.customers[customer.number] = customer
+        _restore_requests(gas_station, state.requests)
+
+        # Processes start in the order of their timeouts, so that the simultaneous ones keep their order.
+        for key, delay in state.processes:
+            if key == _CAR_GENERATOR:
+                self._car_generator_process = environment.process(self._car_generator(
+                    environment=environment, gas_station=gas_station, settings=settings, next_arrival_delay=delay))
+            elif key == _PUMP_BREAKER:
+                gas_station.resume_breaking_pumps(state.pump_break_state, delay)
+            elif isinstance(key, str) and key.startswith(_STAFFING):
+                gas_station.resume_staffing(key[len(_STAFFING):], delay)
             else:
-                self._customers_results.append(CustomerData(number=i, enter=False))
-                environment.logger.info('A car missed station since there are no left parking places.')
+                gas_station.customers[key].resume(gas_station, delay)
+        _assign_request_processes(gas_station)
 
-    def _car_process(
+    def _car_generator(
             self,
             environment: _SimulationEnvironment,
             gas_station: _GasStation,
-            customer: _Customer,
+            settings: _SampledSettings,
+            next_arrival_delay: Optional[float] = None,
     ) -> Generator[Event, Any, Any]:
-        customer_result = yield environment.process(customer.enter(gas_station=gas_station))
-        self._customers_results.append(customer_result)
-
-    def _transform_results_to_dataframe(self, results: List[CustomerData]) -> pd.DataFrame:  # noqa
-        transformed_results = pd.concat([pd.DataFrame.from_dict(r.__dict__, orient='index').T for r in results])
-        transformed_results.sort_values(by='number', inplace=True)
-        return transformed_results.reset_index(drop=True)
+        for i in itertools.count(self._next_car_number):
+            self._next_car_number = i
+            if next_arrival_delay is None:
+                next_arrival_delay = settings.next_car_arrival_time()
+            yield environment.timeout(next_arrival_delay)
+            next_arrival_delay = None
+            _admit_car(environment, gas_station, i, settings, self._customers_results, self.kpis)
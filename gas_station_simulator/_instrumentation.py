@@ -0,0 +1,112 @@
+import time
+from array import array
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+from simpy.events import Process
+
+if TYPE_CHECKING:
+    from gas_station_simulator._environment import _SimulationEnvironment
+
+_EVENT_TYPES = {
+    'Request': 'Request',
+    'PriorityRequest': 'Request',
+    'PreemptiveRequest': 'Request',
+    'Release': 'Release',
+    'ContainerGet': 'Container get',
+    'ContainerPut': 'Container put',
+    'Interruption': 'Interrupt',
+}
+
+_PROCESS_KINDS = {
+    '_Customer.enter': 'customer',
+    '_Customer.interact_with_the_cashier': 'customer',
+    '_Customer.wait_and_take_the_food': 'customer',
+    '_GasStation._break_the_pump': 'pump breaker',
+    'GasStationSimulator._car_generator': 'car generator',
+}
+
+
+@dataclass
+class InstrumentationReport:
+    events_by_type: Dict[str, int]
+    wall_time_by_process_kind: Dict[str, float]
+    steps_by_process_kind: Dict[str, int]
+    event_queue_length: pd.DataFrame
+    wall_time: float
+
+    @property
+    def events_quantity(self) -> int:
+        return sum(self.events_by_type.values())
+
+
+class _EnvironmentInstrumentation:
+    """Counts the processed events and measures the wall time of the processes they resume.
+
+    It replaces the `step` of a single environment instance, so environments without instrumentation run the
+    unchanged SimPy loop.
+    """
+
+    def __init__(self, environment: '_SimulationEnvironment', queue_sample_interval: int = 100):
+        self._env = environment
+        self._original_step = environment.step
+        self._queue_sample_interval = queue_sample_interval
+        self._events_by_type: Counter = Counter()
+        self._wall_time_by_process_kind: Dict[str, float] = defaultdict(float)
+        self._steps_by_process_kind: Counter = Counter()
+        self._queue_times = array('d')
+        self._queue_lengths = array('d')
+        self._steps = 0
+        self._wall_time = 0.0
+        environment.step = self._step
+
+    def disable(self):
+        self._env.step = self._original_step
+
+    def report(self) -> InstrumentationReport:
+        return InstrumentationReport(
+            events_by_type=dict(self._events_by_type),
+            wall_time_by_process_kind=dict(self._wall_time_by_process_kind),
+            steps_by_process_kind=dict(self._steps_by_process_kind),
+            event_queue_length=pd.DataFrame({
+                'time': np.array(self._queue_times, dtype=np.float64),
+                'event_queue_length': np.array(self._queue_lengths, dtype=np.float64),
+            }),
+            wall_time=self._wall_time,
+        )
+
+    def _step(self):
+        queue = self._env._queue  # noqa
+        if queue:
+            event = queue[0][3]
+            event_type = type(event).__name__
+            process_kind = self._get_process_kind(event)
+        else:
+            event_type = process_kind = None
+
+        start_time = time.perf_counter()
+        try:
+            self._original_step()
+        finally:
+            elapsed_time = time.perf_counter() - start_time
+            self._wall_time += elapsed_time
+            if event_type is not None:
+                self._events_by_type[_EVENT_TYPES.get(event_type, event_type)] += 1
+                self._wall_time_by_process_kind[process_kind] += elapsed_time
+                self._steps_by_process_kind[process_kind] += 1
+            self._steps += 1
+            if self._steps % self._queue_sample_interval == 0:
+                self._queue_times.append(self._env.now)
+                self._queue_lengths.append(len(queue))
+
+    @staticmethod
+    def _get_process_kind(event) -> str:
+        for callback in event.callbacks or ():
+            process = getattr(callback, '__self__', None)
+            if isinstance(process, Process):
+                name = process._generator.__qualname__  # noqa
+                return _PROCESS_KINDS.get(name, name)
+        return 'none'
@@ -0,0 +1,159 @@
+import math
+from typing import Dict, List
+
+from gas_station_simulator._customer_results import ResultsSummary
+
+
+def _get_hour(time: float) -> int:
+    return int(time // 60**2 % 24)
+
+
+class _RunningStatistics:
+    """Mean and variance updated with Welford's algorithm."""
+
+    __slots__ = ('count', 'mean', '_m2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class _StreamingQuantile:
+    """Estimates a quantile in constant memory with the P-square algorithm of Jain and Chlamtac."""
+
+    __slots__ = ('_p', '_heights', '_positions', '_desired_positions', '_increments')
+
+    def __init__(self, p: float):
+        self._p = p
+        self._heights: List[float] = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired_positions = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, value: float):
+        heights = self._heights
+        if len(heights) < 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        if value < heights[0]:
+            heights[0] = value
+            k = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= heights[k + 1]:
+                k += 1
+
+        positions = self._positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired_positions[i] += self._increments[i]
+
+        for i in range(1, 4):
+            d = self._desired_positions[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+                heights[i] = height
+                positions[i] += d
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self._heights, self._positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    @property
+    def value(self) -> float:
+        if not self._heights:
+            return math.nan
+        if len(self._heights) < 5:
+            index = min(int(round(self._p * (len(self._heights) - 1))), len(self._heights) - 1)
+            return self._heights[index]
+        return self._heights[2]
+
+
+class _WaitingTimeStatistics:
+    __slots__ = ('_statistics', '_p95')
+
+    def __init__(self):
+        self._statistics = _RunningStatistics()
+        self._p95 = _StreamingQuantile(0.95)
+
+    def add(self, value: float):
+        self._statistics.add(value)
+        self._p95.add(value)
+
+    def snapshot(self, prefix: str) -> Dict[str, float]:
+        return {
+            f'{prefix}_mean': self._statistics.mean if self._statistics.count else math.nan,
+            f'{prefix}_std': self._statistics.std,
+            f'{prefix}_p95': self._p95.value,
+        }
+
+
+class KpiAccumulator:
+    """Key performance indicators updated while the simulation runs, in constant memory.
+
+    Keeps the totals needed by `ProfitCalculator` and the statistics of the time customers wait for a pump (from the
+    arrival to the start of fueling) and for a cashier (from reaching the counter to the start of the interaction).
+    """
+
+    def __init__(self):
+        self.summary = ResultsSummary()
+        # Totals of the cars by the hour of day of their arrival.
+        self.summary_by_hour = [ResultsSummary() for _ in range(24)]
+        self._pump_waiting_time = _WaitingTimeStatistics()
+        self._cashier_waiting_time = _WaitingTimeStatistics()
+        self._time_in_station = _WaitingTimeStatistics()
+
+    def record_missed_car(self, arrival_time: float):
+        self.summary.missed_cars_quantity += 1
+        self.summary_by_hour[_get_hour(arrival_time)].missed_cars_quantity += 1
+
+    def record_pump_waiting_time(self, waiting_time: float):
+        self._pump_waiting_time.add(waiting_time)
+
+    def record_cashier_waiting_time(self, waiting_time: float):
+        self._cashier_waiting_time.add(waiting_time)
+
+    def record_served_car(self, fuel_needed: float, eating: bool, time_in_station: float, arrival_time: float):
+        for summary in (self.summary, self.summary_by_hour[_get_hour(arrival_time)]):
+            summary.cars_quantity += 1
+            summary.hot_dogs_quantity += int(eating)
+            summary.fuel_needed += fuel_needed
+        self._time_in_station.add(time_in_station)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            'cars_quantity': self.summary.cars_quantity,
+            'missed_cars_quantity': self.summary.missed_cars_quantity,
+            'hot_dogs_quantity': self.summary.hot_dogs_quantity,
+            'fuel_needed': self.summary.fuel_needed,
+            **self._pump_waiting_time.snapshot('pump_waiting_time'),
+            **self._cashier_waiting_time.snapshot('cashier_waiting_time'),
+            **self._time_in_station.snapshot('time_in_station'),
+        }
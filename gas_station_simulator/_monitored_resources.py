@@ -1,6 +1,10 @@
+import time
+from array import array
 from functools import wraps
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
 
+import numpy as np
 import pandas as pd
 import simpy
 from simpy import Container
@@ -8,66 +12,263 @@ from simpy.resources.container import ContainerPut, ContainerGet
 from simpy.resources.resource import Request, Release
 
 _MONITORED_RESOURCES_PATH = Path('monitored_resources')
+# Placeholder requests which make units unavailable go before the requests of all the users of a station.
+_PLACEHOLDER_PRIORITY = -2
+
+
+class _ResourceMonitor:
+    """Keeps the samples of a monitored resource in memory.
+
+    If `flush_interval` (in simulation seconds) is given, samples gathered since the previous flush are appended to
+    `<path>/<name>.csv` every time the interval elapses, so the file is never rewritten as a whole.
+    """
+
+    def __init__(self, name: str, flush_interval: Optional[int] = None, path: Path = _MONITORED_RESOURCES_PATH):
+        self.name = name
+        self.times = array('d')
+        self.values = array('d')
+        self._flush_interval = flush_interval
+        self._path = path
+        self._next_flush_time = flush_interval
+        self._flushed_samples = 0
+        self.flush_time = 0.0
+        # Set by a `TraceRecorder` to receive the samples too.
+        self.trace: Optional[Callable[[float, float], None]] = None
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The trace writes to an open file, so it is not kept in checkpoints.
+        return {**self.__dict__, 'trace': None}
+
+    def record(self, time: float, value: float):
+        self.times.append(time)
+        self.values.append(value)
+        if self.trace is not None:
+            self.trace(time, value)
+        if self._next_flush_time is not None and time >= self._next_flush_time:
+            self.flush()
+            self._next_flush_time = (time // self._flush_interval + 1) * self._flush_interval
+
+    def flush(self):
+        if self._flush_interval is None:
+            return
+        start_time = time.perf_counter()
+        file_path = (self._path / self.name).with_suffix('.csv')
+        if self._flushed_samples == 0:
+            self._path.mkdir(parents=True, exist_ok=True)
+            with open(file_path, 'w') as file:
+                file.write(f'time,{self.name}\n')
+        new_samples = np.column_stack([
+            np.frombuffer(self.times, dtype=np.float64)[self._flushed_samples:],
+            np.frombuffer(self.values, dtype=np.float64)[self._flushed_samples:],
+        ])
+        with open(file_path, 'a') as file:
+            np.savetxt(file, new_samples, fmt='%.15g', delimiter=',')
+        self._flushed_samples = len(self.times)
+        self.flush_time += time.perf_counter() - start_time
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            'time': np.array(self.times, dtype=np.float64),
+            self.name: np.array(self.values, dtype=np.float64),
+        })
+
+
+def _align_monitored_data(monitors: Sequence[_ResourceMonitor], step: Optional[int] = None) -> pd.DataFrame:
+    """Aligns the samples of all the monitors on a single time index.
+
+    The index is the sorted union of the sampling times or, if `step` is given, a regular grid with that step. Each
+    series takes its last sample at or before the index time; times before the first sample take the first sample.
+    """
+    times = [np.frombuffer(monitor.times, dtype=np.float64) for monitor in monitors]
+    non_empty_times = [t for t in times if t.size]
+    if not non_empty_times:
+        return pd.DataFrame(columns=['time'] + [monitor.name for monitor in monitors])
+
+    if step is None:
+        index = np.unique(np.concatenate(non_empty_times))
+    else:
+        start = min(t[0] for t in non_empty_times) // step * step
+        end = max(t[-1] for t in non_empty_times)
+        index = np.arange(start, end + step, step, dtype=np.float64)
+    return pd.DataFrame({'time': index, **_get_values_at(monitors, times, index)})
+
+
+def _get_hourly_averages(monitors: Sequence[_ResourceMonitor], end_time: float) -> pd.DataFrame:
+    """Returns the time-weighted averages of the monitored values by the hour of day, from time 0 to `end_time`.
+
+    Every value holds from its sample to the next one; before its first sample a monitor takes the first sample.
+    """
+    times = [np.frombuffer(monitor.times, dtype=np.float64) for monitor in monitors]
+    hour = 60**2
+    # Hour boundaries split the intervals, so every interval falls into a single hour.
+    index = np.unique(np.concatenate([*times, np.arange(0, end_time, hour, dtype=np.float64)]))
+    index = index[(index >= 0) & (index < end_time)]
+    durations = np.diff(index, append=end_time)
+    hours = (index // hour % 24).astype(np.int64)
+    total_durations = np.bincount(hours, weights=durations, minlength=24)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = {
+            name: np.bincount(hours, weights=values * durations, minlength=24) / total_durations
+            for name, values in _get_values_at(monitors, times, index).items()
+        }
+    return pd.DataFrame(averages, index=pd.RangeIndex(24, name='hour'))
+
+
+def _get_window_averages(monitors: Sequence[_ResourceMonitor], start: float, end: float) -> Dict[str, float]:
+    """Returns the time-weighted averages of the monitored values from `start` to `end`, like `_get_hourly_averages`.
+
+    Only the samples of the window are read, so the averages of consecutive windows of a long run are cheap.
+    """
+    averages = {}
+    for monitor in monitors:
+        times = np.frombuffer(monitor.times, dtype=np.float64)
+        values = np.frombuffer(monitor.values, dtype=np.float64)
+        if not values.size or end <= start:
+            averages[monitor.name] = np.nan
+            continue
+        first = max(int(np.searchsorted(times, start, side='right')) - 1, 0)
+        last = max(int(np.searchsorted(times, end, side='left')), first + 1)
+        window_times = times[first:last].copy()
+        # The value at the start of the window is its last sample before it or, if there is none, the first one.
+        window_times[0] = start
+        durations = np.diff(window_times, append=end)
+        averages[monitor.name] = float(np.dot(values[first:last], durations) / (end - start))
+    return averages
+
+
+def _get_values_at(
+        monitors: Sequence[_ResourceMonitor],
+        times: Sequence[np.ndarray],
+        index: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    aligned = {}
+    for monitor, monitor_times in zip(monitors, times):
+        values = np.frombuffer(monitor.values, dtype=np.float64)
+        if not values.size:
+            aligned[monitor.name] = np.full(index.size, np.nan)
+            continue
+        positions = np.searchsorted(monitor_times, index, side='right') - 1
+        aligned[monitor.name] = values[np.maximum(positions, 0)]
+    return aligned
 
 
 def save_monitored_data(method):
     @wraps(method)
     def inner(self, *args, **kwargs):
-        method_return_value = method(self, *args, **kwargs)
-        simulation_day = self._env.now // 60**2
-        if simulation_day > self._day:
-            _MONITORED_RESOURCES_PATH.mkdir(parents=True, exist_ok=True)
-            file_path = (_MONITORED_RESOURCES_PATH / self.name).with_suffix('.csv')
-            pd.DataFrame(self.data, columns=['time',  self.name]).to_csv(file_path, index=False)
-            self._day += 1
-        return method_return_value
+        self.monitor.record(self._env.now, self._monitored_value())
+        return method(self, *args, **kwargs)
     return inner
 
 
-class _MonitoredResource(simpy.PreemptiveResource):
-    def __init__(self, name: str, *args, **kwargs):
+class _MonitoredResource(simpy.Resource):
+    # Keyword arguments of the placeholder requests, see `set_available_capacity`.
+    _placeholder_arguments: Dict[str, Any] = {}
+
+    def __init__(
+            self,
+            name: str,
+            *args,
+            flush_interval: Optional[int] = None,
+            path: Path = _MONITORED_RESOURCES_PATH,
+            **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.name = name
-        self.data = []
-        self._day = 0
+        self.monitor = _ResourceMonitor(name, flush_interval=flush_interval, path=path)
+        self.placeholders: List[Request] = []
+
+    def _monitored_value(self) -> int:
+        if self.placeholders:
+            return self.count - sum(1 for placeholder in self.placeholders if placeholder.triggered)
+        return self.count
 
     @save_monitored_data
     def request(self, *args, **kwargs) -> Request:
-        self.data.append((self._env.now, self.count))
-        return super().request()
+        return super().request(*args, **kwargs)
 
     @save_monitored_data
     def release(self, request) -> Release:
-        self.data.append((self._env.now, self.count))
         return super().release(request)
 
+    def set_available_capacity(self, capacity: int):
+        """Makes only `capacity` of the units available, without rebuilding the resource.
+
+        The other units are taken by placeholder requests, which go before the waiting users and take the busy units
+        as soon as they are released, so the current users are never interrupted. Giving the units back cancels the
+        waiting placeholders first. Only the placeholders are touched, so a change costs the same however long the
+        queue is.
+        """
+        if not 0 <= capacity <= self.capacity:
+            raise ValueError(
+                f'The available capacity of {self.name} must be from 0 to {self.capacity}, got {capacity}.')
+        missing = self.capacity - capacity - len(self.placeholders)
+        for _ in range(missing):
+            self.placeholders.append(super().request(**self._placeholder_arguments))
+        for _ in range(-missing):
+            placeholder = self.placeholders.pop()
+            if placeholder.triggered:
+                super().release(placeholder)
+            else:
+                placeholder.cancel()
+
+    def restore_request(
+            self,
+            priority: int,
+            preempt: bool,
+            time: Optional[float],
+            usage_since: Optional[float],
+    ) -> Request:
+        """Recreates a request saved in a checkpoint, with its original time, without recording a sample.
+
+        Requests which held the resource have to be restored before the ones which waited for it.
+        """
+        if isinstance(self, simpy.PriorityResource):
+            request = super().request(priority=priority, preempt=preempt)
+            request.time = time
+            request.key = (priority, time, not preempt)
+        else:
+            request = super().request()
+        if usage_since is not None:
+            request.usage_since = usage_since
+        return request
+
 
 class MonitoredResource(_MonitoredResource):
     pass
 
 
-class MonitoredPriorityResource(_MonitoredResource):
-    pass
+class MonitoredPriorityResource(_MonitoredResource, simpy.PriorityResource):
+    _placeholder_arguments = {'priority': _PLACEHOLDER_PRIORITY}
 
 
-class MonitoredPreemptiveResource(_MonitoredResource):
-    pass
+class MonitoredPreemptiveResource(_MonitoredResource, simpy.PreemptiveResource):
+    # Placeholders wait for the units to be released instead of interrupting their users.
+    _placeholder_arguments = {'priority': _PLACEHOLDER_PRIORITY, 'preempt': False}
 
 
 class MonitoredContainer(Container):
-    def __init__(self, name: str, *args, **kwargs):
+    def __init__(
+            self,
+            name: str,
+            *args,
+            flush_interval: Optional[int] = None,
+            path: Path = _MONITORED_RESOURCES_PATH,
+            **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.name = name
-        self.data = []
-        self._day = 0
-        _MONITORED_RESOURCES_PATH.mkdir(parents=True, exist_ok=True)
+        self.monitor = _ResourceMonitor(name, flush_interval=flush_interval, path=path)
+
+    def _monitored_value(self) -> int:
+        return self.capacity - self.level
 
     @save_monitored_data
     def put(self, *args, **kwargs) -> ContainerPut:
-        self.data.append((self._env.now, self.capacity - self.level))
         return super().put(*args, **kwargs)
 
     @save_monitored_data
     def get(self, *args, **kwargs) -> ContainerGet:
-        self.data.append((self._env.now, self.capacity - self.level))
         return super().get(*args, **kwargs)
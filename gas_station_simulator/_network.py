@@ -0,0 +1,170 @@
+import itertools
+from typing import Any, Callable, Dict, Generator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from simpy import Event
+
+from gas_station_simulator._customer import _admit_car
+from gas_station_simulator._customer_results import _CustomerResultsRecorder
+from gas_station_simulator._distributions import Sampleable, UniformInt, _Categorical, _to_sampler
+from gas_station_simulator._environment import _SimulationEnvironment
+from gas_station_simulator._gas_station import _GasStation
+from gas_station_simulator._kpi import KpiAccumulator
+from gas_station_simulator._monitored_resources import _align_monitored_data, _get_hourly_averages
+from gas_station_simulator._settings import SimulationSettings, MonitoringSettings, LoggingSettings, \
+    _SampledSettings
+
+
+class _NetworkStation:
+    """A station of the network with its own random streams, results and KPIs."""
+
+    def __init__(
+            self,
+            name: str,
+            environment: _SimulationEnvironment,
+            settings: SimulationSettings,
+            seed: np.random.SeedSequence,
+            monitoring_settings: Optional[MonitoringSettings],
+    ):
+        self.name = name
+        self.settings = _SampledSettings(settings, seed)
+        self.gas_station = _GasStation(
+            environment, settings=self.settings, monitoring_settings=monitoring_settings, name=name)
+        self.results = _CustomerResultsRecorder()
+        self.kpis = KpiAccumulator()
+
+
+class GasStationNetwork:
+    """Several gas stations along one road, simulated in a single environment with a single logger.
+
+    Cars of the road traffic arrive every `next_car_arrival_time` and stop at one of the stations, which is drawn with
+    `arrival_shares` (all the stations equally by default). A car which finds no free parking place drives for
+    `travel_time` to the next station along the road, in the order of `stations`, and is lost by the network when
+    the last one is full too. The `next_car_arrival_time` of the stations' settings is not used.
+
+    Cars are numbered across the network, so a redirected car has the same number in the results of every station it
+    has visited. Every station records it as missed if it could not enter.
+    """
+
+    def __init__(
+            self,
+            stations: Dict[str, SimulationSettings],
+            next_car_arrival_time: Sampleable,
+            travel_time: Sampleable = UniformInt(300, 900),
+            arrival_shares: Optional[Sequence[float]] = None,
+            monitoring_settings: Optional[MonitoringSettings] = None,
+            logging_settings: Optional[LoggingSettings] = None,
+            seed: Optional[int] = None,
+    ):
+        if not stations:
+            raise ValueError('The network requires at least one station.')
+        if arrival_shares is None:
+            arrival_shares = [1] * len(stations)
+        if len(arrival_shares) != len(stations):
+            raise ValueError(f'Got {len(arrival_shares)} arrival shares for {len(stations)} stations.')
+        shares = np.asarray(arrival_shares, dtype=np.float64)
+        if (shares < 0).any() or shares.sum() <= 0:
+            raise ValueError('Arrival shares must be non-negative and not all zero.')
+
+        self._settings = stations
+        self._next_car_arrival_time = next_car_arrival_time
+        self._travel_time = travel_time
+        self._arrival_probabilities = tuple((shares / shares.sum()).tolist())
+        self._monitoring_settings = monitoring_settings
+        self._logging_settings = logging_settings
+        self._seed = seed
+        self._stations: List[_NetworkStation] = []
+        self._environment: Optional[_SimulationEnvironment] = None
+        self.redirected_cars_quantity = 0
+        self.lost_cars_quantity = 0
+
+    @property
+    def station_names(self) -> List[str]:
+        return list(self._settings)
+
+    def run(self, time: int) -> Dict[str, pd.DataFrame]:
+        """Runs the simulation of the network for `time` seconds and returns the customers' results by station."""
+        road_seed, *station_seeds = np.random.SeedSequence(self._seed).spawn(len(self._settings) + 1)
+        environment = _SimulationEnvironment(logging_settings=self._logging_settings)
+        self._environment = environment
+        self._stations = [
+            _NetworkStation(name, environment, settings, station_seed, self._monitoring_settings)
+            for (name, settings), station_seed in zip(self._settings.items(), station_seeds)
+        ]
+        self.redirected_cars_quantity = 0
+        self.lost_cars_quantity = 0
+
+        road_generator = np.random.default_rng(road_seed)
+        environment.process(self._road_traffic(
+            environment,
+            next_car_arrival_time=_to_sampler(self._next_car_arrival_time, road_generator),
+            travel_time=_to_sampler(self._travel_time, road_generator),
+            first_station=_to_sampler(_Categorical(self._arrival_probabilities), road_generator),
+        ))
+        environment.run(until=time)
+        for station in self._stations:
+            station.gas_station.flush_monitored_data()
+        environment.close_logger()
+        return self.get_results()
+
+    def get_results(self) -> Dict[str, pd.DataFrame]:
+        return {station.name: station.results.to_dataframe() for station in self._stations}
+
+    def get_kpis(self) -> pd.DataFrame:
+        """Returns the key performance indicators of every station, one row per station."""
+        return pd.DataFrame.from_dict(
+            {station.name: station.kpis.snapshot() for station in self._stations}, orient='index')
+
+    def get_monitored_resources(self, step: Optional[int] = None) -> Dict[str, pd.DataFrame]:
+        return {
+            station.name: _align_monitored_data(
+                [resource.monitor for resource in station.gas_station.monitored_resources], step=step)
+            for station in self._stations
+        }
+
+    def get_monitored_resources_by_hour(self) -> Dict[str, pd.DataFrame]:
+        return {
+            station.name: _get_hourly_averages(
+                [resource.monitor for resource in station.gas_station.monitored_resources],
+                end_time=self._environment.now,
+            )
+            for station in self._stations
+        }
+
+    def _road_traffic(
+            self,
+            environment: _SimulationEnvironment,
+            next_car_arrival_time: Callable[[], Any],
+            travel_time: Callable[[], Any],
+            first_station: Callable[[], Any],
+    ) -> Generator[Event, Any, Any]:
+        for i in itertools.count():
+            yield environment.timeout(next_car_arrival_time())
+            self._stop_at_station(environment, i, first_station(), travel_time)
+
+    def _stop_at_station(
+            self,
+            environment: _SimulationEnvironment,
+            number: int,
+            index: int,
+            travel_time: Callable[[], Any],
+    ):
+        station = self._stations[index]
+        if _admit_car(environment, station.gas_station, number, station.settings, station.results, station.kpis):
+            return
+        if index + 1 < len(self._stations):
+            self.redirected_cars_quantity += 1
+            environment.process(self._drive_to_the_next_station(environment, number, index + 1, travel_time))
+        else:
+            self.lost_cars_quantity += 1
+
+    def _drive_to_the_next_station(
+            self,
+            environment: _SimulationEnvironment,
+            number: int,
+            index: int,
+            travel_time: Callable[[], Any],
+    ) -> Generator[Event, Any, Any]:
+        yield environment.timeout(travel_time())
+        self._stop_at_station(environment, number, index, travel_time)
@@ -0,0 +1,168 @@
+import dataclasses
+import itertools
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from gas_station_simulator._distributions import Distribution
+from gas_station_simulator._gas_station_simulator import GasStationSimulator
+from gas_station_simulator._profit_calculator import ProfitCalculator
+from gas_station_simulator._settings import SimulationSettings, ProfitCalculationSettings, LoggingSettings
+
+_worker_state: Dict[str, Any] = {}
+
+
+def _describe_settings(settings: SimulationSettings) -> Dict[str, Any]:
+    description = {}
+    for field in dataclasses.fields(settings):
+        value = getattr(settings, field.name)
+        if isinstance(value, Distribution):
+            description.update({f'{field.name}.{key}': param for key, param in dataclasses.asdict(value).items()})
+        elif not callable(value):
+            description[field.name] = value
+    return description
+
+
+def _initialize_worker(
+        scenarios: Sequence[SimulationSettings],
+        profit_calculation_settings: ProfitCalculationSettings,
+        simulation_time: int,
+        common_random_numbers: bool = False,
+):
+    _worker_state['scenarios'] = scenarios
+    _worker_state['profit_calculation_settings'] = profit_calculation_settings
+    _worker_state['simulation_time'] = simulation_time
+    _worker_state['common_random_numbers'] = common_random_numbers
+
+
+def _get_multiprocessing_context() -> multiprocessing.context.BaseContext:
+    # Forked workers inherit the scenarios, so settings built from lambdas do not have to be picklable. Elsewhere the
+    # settings have to use distribution specifications.
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def _spawn_seeds(seed: Optional[int], quantity: int) -> List[int]:
+    return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(quantity)]
+
+
+def _run_scenario(index: int, seed: int) -> Dict[str, Any]:
+    # Plain callables in the settings draw from the module-level generators, which are private to each worker process.
+    random.seed(seed)
+    np.random.seed(seed)
+
+    settings = _worker_state['scenarios'][index]
+    simulation_time = _worker_state['simulation_time']
+    simulator = GasStationSimulator(
+        settings=settings,
+        logging_settings=LoggingSettings.quiet(name=f'gas_station.scenario_{index}'),
+        seed=seed,
+        common_random_numbers=_worker_state['common_random_numbers'],
+    )
+    simulator.run(time=simulation_time, return_dataframe=False)
+    profit_calculator = ProfitCalculator(
+        simulation_settings=settings,
+        profit_calculation_settings=_worker_state['profit_calculation_settings'],
+        results=simulator.kpis.summary,
+        simulation_time=simulation_time,
+    )
+    return {'scenario': index, 'seed': seed, **profit_calculator.calculate()}
+
+
+class ParameterSweep:
+    """Runs the simulation and the profit calculation for many settings in a process pool.
+
+    Every scenario gets its own seed spawned from `seed`, a quiet logger and keeps the monitored
+    resources in memory, so the workers do not share any state. With `common_random_numbers` all the scenarios use
+    the same seed and the simulator's common random numbers mode, so their differences are not swamped by noise.
+    """
+
+    def __init__(
+            self,
+            scenarios: Sequence[SimulationSettings],
+            profit_calculation_settings: ProfitCalculationSettings,
+            simulation_time: int,
+            seed: Optional[int] = None,
+            max_workers: Optional[int] = None,
+            labels: Optional[Sequence[Mapping[str, Any]]] = None,
+            common_random_numbers: bool = False,
+    ):
+        if labels is not None and len(labels) != len(scenarios):
+            raise ValueError('There has to be exactly one label per scenario.')
+        self.scenarios = list(scenarios)
+        self.profit_calculation_settings = profit_calculation_settings
+        self.simulation_time = simulation_time
+        self.max_workers = max_workers or os.cpu_count()
+        self._labels = [dict(label) for label in labels] if labels is not None else [{} for _ in self.scenarios]
+        self.common_random_numbers = common_random_numbers
+        if common_random_numbers:
+            self._seeds = _spawn_seeds(seed, 1) * len(self.scenarios)
+        else:
+            self._seeds = _spawn_seeds(seed, len(self.scenarios))
+
+    @classmethod
+    def from_grid(
+            cls,
+            base_settings: SimulationSettings,
+            grid: Mapping[str, Sequence[Any]],
+            profit_calculation_settings: ProfitCalculationSettings,
+            simulation_time: int,
+            seed: Optional[int] = None,
+            max_workers: Optional[int] = None,
+            common_random_numbers: bool = False,
+    ) -> 'ParameterSweep':
+        """Creates a sweep over the cartesian product of the `grid` values applied to `base_settings`.
+
+        Callable grid values (e.g. different arrival time distributions) are labelled with their position in the grid.
+        """
+        scenarios: List[SimulationSettings] = []
+        labels: List[Dict[str, Any]] = []
+        for values in itertools.product(*(enumerate(values) for values in grid.values())):
+            changes = {key: value for key, (_, value) in zip(grid, values)}
+            scenarios.append(dataclasses.replace(base_settings, **changes))
+            labels.append({key: index if callable(value) else value for key, (index, value) in zip(grid, values)})
+        return cls(
+            scenarios=scenarios,
+            profit_calculation_settings=profit_calculation_settings,
+            simulation_time=simulation_time,
+            seed=seed,
+            max_workers=max_workers,
+            labels=labels,
+            common_random_numbers=common_random_numbers,
+        )
+
+    def iter_results(self) -> Iterator[Dict[str, Any]]:
+        """Yields the results of the scenarios in the order in which the workers finish them."""
+        with ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=_get_multiprocessing_context(),
+                initializer=_initialize_worker,
+                initargs=(
+                    self.scenarios,
+                    self.profit_calculation_settings,
+                    self.simulation_time,
+                    self.common_random_numbers,
+                ),
+        ) as executor:
+            futures = [executor.submit(_run_scenario, index, seed) for index, seed in enumerate(self._seeds)]
+            for future in as_completed(futures):
+                result = future.result()
+                index = result['scenario']
+                yield {
+                    'scenario': index,
+                    'seed': result['seed'],
+                    **_describe_settings(self.scenarios[index]),
+                    **self._labels[index],
+                    **{key: value for key, value in result.items() if key not in ('scenario', 'seed')},
+                }
+
+    def run(self) -> pd.DataFrame:
+        results = pd.DataFrame(list(self.iter_results()))
+        results.sort_values(by='scenario', inplace=True)
+        return results.reset_index(drop=True)
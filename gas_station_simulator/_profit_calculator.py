@@ -1,8 +1,25 @@
-from typing import Dict
+from typing import Dict, List, Optional, Sequence, Union
 
+import numpy as np
 import pandas as pd
 
 from gas_station_simulator import ProfitCalculationSettings, SimulationSettings
+from gas_station_simulator._customer_results import ResultsSummary
+from gas_station_simulator._staffing import StaffingSchedule
+
+_MONTH = 60**2 * 24 * 30
+
+
+def _get_months(simulation_time: float) -> float:
+    return simulation_time / _MONTH
+
+
+def _get_cashier_hours(simulation_settings: SimulationSettings, simulation_time: int) -> float:
+    """Returns the hours worked by all the cashiers during the simulation."""
+    cashiers_quantity = simulation_settings.cashiers_quantity
+    if isinstance(cashiers_quantity, StaffingSchedule):
+        return float(cashiers_quantity.get_quantity_hours_by_hour(simulation_time).sum())
+    return simulation_time / 60**2 * cashiers_quantity
 
 
 class ProfitCalculator:
@@ -10,13 +27,15 @@ class ProfitCalculator:
             self,
             simulation_settings: SimulationSettings,
             profit_calculation_settings: ProfitCalculationSettings,
-            results: pd.DataFrame,
+            results: Union[pd.DataFrame, ResultsSummary],
             simulation_time: int,
     ):
         self.simulation_settings = simulation_settings
         self.profit_calculation_settings = profit_calculation_settings
         self.results = results
         self.simulation_time = simulation_time
+        self._summary = results if isinstance(results, ResultsSummary) else ResultsSummary.from_dataframe(results)
+        self._months = _get_months(simulation_time)
 
     def calculate(self) -> Dict[str, int]:
         results_by_source = {
@@ -24,14 +43,13 @@ class ProfitCalculator:
             'cashiers_cost': self._calculate_cashiers_cost(),
             'hot_dogs_income': self._calculate_hot_dogs_profit(),
             'fuel_income': self._calculate_fuel_profit(),
-            'cars_quantity': int(self.results['enter'].sum()),
-            'missed_cars_quantity': int(self.results['enter'].size - self.results['enter'].sum()),
+            'cars_quantity': self._summary.cars_quantity,
+            'missed_cars_quantity': self._summary.missed_cars_quantity,
         }
 
         results_by_source_with_totals = self._add_total_cost_and_income(results_by_source=results_by_source)
 
-        months = self.simulation_time / (60**2 * 24 * 30)
-        results = {key: int(value/months) for key, value in results_by_source_with_totals.items()}
+        results = {key: int(value/self._months) for key, value in results_by_source_with_totals.items()}
 
         results['income_per_car'] = int(results['total_income'] / results['cars_quantity'])
         results['profit'] = results['total_income'] - results['total_cost']
@@ -39,6 +57,52 @@ class ProfitCalculator:
 
         return results
 
+    def calculate_by_hour(self, summary_by_hour: Optional[Sequence[ResultsSummary]] = None) -> pd.DataFrame:
+        """Breaks the monthly results of `calculate` down by the hour of day.
+
+        Cars and incomes go to the hour of the cars' arrivals, taken from the results DataFrame or from
+        `summary_by_hour`, e.g. the one of `KpiAccumulator`. Costs are split by the simulated time in every hour, the
+        cashiers' ones following their schedule, if any.
+        """
+        if summary_by_hour is None:
+            if not isinstance(self.results, pd.DataFrame):
+                raise ValueError('The breakdown by hour requires the results DataFrame or the summary by hour.')
+            summary_by_hour = self._get_summary_by_hour(self.results)
+
+        hourly_time_shares = self._get_hourly_time_shares()
+        pumps_cost = self._calculate_pumps_cost()
+        cashiers_quantity = self.simulation_settings.cashiers_quantity
+        if isinstance(cashiers_quantity, StaffingSchedule):
+            hourly_cashiers_costs = self.profit_calculation_settings.cashier_hourly_cost * \
+                cashiers_quantity.get_quantity_hours_by_hour(self.simulation_time)
+        else:
+            hourly_cashiers_costs = self._calculate_cashiers_cost() * hourly_time_shares
+        rows = []
+        for summary, time_share, cashiers_cost in zip(summary_by_hour, hourly_time_shares, hourly_cashiers_costs):
+            results_by_source = self._add_total_cost_and_income(results_by_source={
+                'pumps_cost': pumps_cost * time_share,
+                'cashiers_cost': cashiers_cost,
+                'hot_dogs_income': self.profit_calculation_settings.hot_dog_profit * summary.hot_dogs_quantity,
+                'fuel_income': self.profit_calculation_settings.fuel_profit_per_litre * summary.fuel_needed,
+                'cars_quantity': summary.cars_quantity,
+                'missed_cars_quantity': summary.missed_cars_quantity,
+            })
+            row = {key: int(value/self._months) for key, value in results_by_source.items()}
+            row['profit'] = row['total_income'] - row['total_cost']
+            rows.append(row)
+        return pd.DataFrame(rows, index=pd.RangeIndex(24, name='hour'))
+
+    def _get_hourly_time_shares(self) -> np.ndarray:
+        hour = 60**2
+        days, last_day_time = divmod(self.simulation_time, 24 * hour)
+        hourly_time = days * hour + np.clip(last_day_time - np.arange(24) * hour, 0, hour)
+        return hourly_time / self.simulation_time
+
+    @staticmethod
+    def _get_summary_by_hour(results: pd.DataFrame) -> List[ResultsSummary]:
+        hours = results['arrival_time'] // 60**2 % 24
+        return [ResultsSummary.from_dataframe(results[hours == hour]) for hour in range(24)]
+
     def _add_total_cost_and_income(self, results_by_source: Dict[str, float]) -> Dict[str, float]:  # noqa
         for flow_type in ['cost', 'income']:
             values = [value for key, value in results_by_source.items() if flow_type in key]
@@ -46,18 +110,21 @@ class ProfitCalculator:
         return results_by_source
 
     def _calculate_pumps_cost(self) -> int:
-        months = self.simulation_time / (60**2 * 24 * 30)
         monthly_cost = \
             self.simulation_settings.pumps_quantity * self.profit_calculation_settings.pump_monthly_depreciation_cost
-        return int(monthly_cost * months)
+        return int(monthly_cost * self._months)
 
     def _calculate_cashiers_cost(self) -> int:
+        cashiers_quantity = self.simulation_settings.cashiers_quantity
+        if isinstance(cashiers_quantity, StaffingSchedule):
+            cashier_hours = _get_cashier_hours(self.simulation_settings, self.simulation_time)
+            return int(cashier_hours * self.profit_calculation_settings.cashier_hourly_cost)
+        # Grouped like the original formula, since the costs are truncated and constant staffing keeps its numbers.
         hours = self.simulation_time / 60**2
-        hourly_cost = self.simulation_settings.cashiers_quantity * self.profit_calculation_settings.cashier_hourly_cost
-        return int(hours * hourly_cost)
+        return int(hours * (cashiers_quantity * self.profit_calculation_settings.cashier_hourly_cost))
 
     def _calculate_hot_dogs_profit(self) -> int:
-        return int(self.profit_calculation_settings.hot_dog_profit * self.results['eating'].sum())
+        return int(self.profit_calculation_settings.hot_dog_profit * self._summary.hot_dogs_quantity)
 
     def _calculate_fuel_profit(self) -> int:
-        return int(self.profit_calculation_settings.fuel_profit_per_litre * self.results['fuel_needed'].sum())
+        return int(self.profit_calculation_settings.fuel_profit_per_litre * self._summary.fuel_needed)
@@ -0,0 +1,96 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+import pandas as pd
+
+from gas_station_simulator._parameter_sweep import _initialize_worker, _get_multiprocessing_context, _spawn_seeds, \
+    _run_scenario
+from gas_station_simulator._settings import SimulationSettings, ProfitCalculationSettings
+from gas_station_simulator._utils import _student_t_quantile
+
+
+class ReplicationRunner:
+    """Runs independent, seeded replications of a simulation and aggregates their profit calculations.
+
+    Replications run in a process pool and only the `ProfitCalculator` results are sent back from the workers.
+    If `tolerance` is given, no new replications are started once the confidence interval half-width of `profit`
+    drops below it (but not before `min_replications` have finished).
+    """
+
+    def __init__(
+            self,
+            settings: SimulationSettings,
+            profit_calculation_settings: ProfitCalculationSettings,
+            simulation_time: int,
+            max_replications: int = 100,
+            min_replications: int = 5,
+            tolerance: Optional[float] = None,
+            confidence_level: float = 0.95,
+            seed: Optional[int] = None,
+            max_workers: Optional[int] = None,
+    ):
+        if min_replications < 2:
+            raise ValueError('At least two replications are needed to calculate a confidence interval.')
+        if max_replications < min_replications:
+            raise ValueError('Maximum replications quantity cannot be lower than the minimum one.')
+        self.settings = settings
+        self.profit_calculation_settings = profit_calculation_settings
+        self.simulation_time = simulation_time
+        self.max_replications = max_replications
+        self.min_replications = min_replications
+        self.tolerance = tolerance
+        self.confidence_level = confidence_level
+        self.max_workers = max_workers or os.cpu_count()
+        self._seeds = _spawn_seeds(seed, max_replications)
+        self.replications = pd.DataFrame()
+
+    def run(self) -> pd.DataFrame:
+        """Returns the mean, standard deviation and confidence interval of every profit calculation key."""
+        replications: List[Dict[str, Any]] = []
+        seeds = iter(self._seeds)
+
+        with ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=_get_multiprocessing_context(),
+                initializer=_initialize_worker,
+                initargs=([self.settings], self.profit_calculation_settings, self.simulation_time),
+        ) as executor:
+            pending = {executor.submit(_run_scenario, 0, seed) for seed, _ in zip(seeds, range(self.max_workers))}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    del result['scenario']
+                    replications.append(result)
+                if self._is_precise_enough(replications):
+                    for future in pending:
+                        future.cancel()
+                    break
+                for seed, _ in zip(seeds, range(len(done))):
+                    pending.add(executor.submit(_run_scenario, 0, seed))
+
+        self.replications = pd.DataFrame(replications)
+        return self._summarize(self.replications.drop(columns='seed'))
+
+    def _is_precise_enough(self, replications: List[Dict[str, Any]]) -> bool:
+        if self.tolerance is None or len(replications) < self.min_replications:
+            return False
+        profits = np.array([replication['profit'] for replication in replications], dtype=np.float64)
+        return self._half_width(profits.std(ddof=1), profits.size) < self.tolerance
+
+    def _half_width(self, std: float, quantity: int) -> float:
+        t = _student_t_quantile(0.5 + self.confidence_level / 2, quantity - 1)
+        return t * std / np.sqrt(quantity)
+
+    def _summarize(self, replications: pd.DataFrame) -> pd.DataFrame:
+        summary = pd.DataFrame({
+            'mean': replications.mean(),
+            'std': replications.std(ddof=1),
+        })
+        summary['half_width'] = self._half_width(summary['std'], len(replications))
+        summary['ci_lower'] = summary['mean'] - summary['half_width']
+        summary['ci_upper'] = summary['mean'] + summary['half_width']
+        summary['replications'] = len(replications)
+        return summary
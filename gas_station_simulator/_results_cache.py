@@ -0,0 +1,220 @@
+import dataclasses
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from gas_station_simulator._customer_results import ResultsSummary
+from gas_station_simulator._gas_station_simulator import GasStationSimulator, _SIMPY_ENGINE
+from gas_station_simulator._settings import SimulationSettings, LoggingSettings
+from gas_station_simulator._version import __version__
+
+_RESULTS_CACHE_PATH = Path('results_cache')
+_METADATA_FILE = 'metadata.json'
+_RESULTS = 'results'
+_MONITORED_RESOURCES = 'monitored_resources'
+# Kinds of the stored columns: plain NumPy arrays and the masked booleans and strings of columns with missing values.
+_ARRAY = 'array'
+_BOOLEAN = 'boolean'
+_STRING = 'string'
+
+
+def _describe(value: Any) -> Any:
+    """Returns a JSON representation of a settings value which does not depend on the process or the session."""
+    if dataclasses.is_dataclass(value):
+        return {
+            'type': type(value).__name__,
+            **{field.name: _describe(getattr(value, field.name)) for field in dataclasses.fields(value)},
+        }
+    if isinstance(value, (tuple, list)):
+        return [_describe(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    raise ValueError(f'Results caching requires distribution specifications, got {value!r}.')
+
+
+def _save_dataframe(dataframe: pd.DataFrame, directory: Path, name: str) -> List[Dict[str, str]]:
+    columns = []
+    for position, (column, values) in enumerate(dataframe.items()):
+        file = f'{name}.{position}'
+        if isinstance(values.dtype, pd.BooleanDtype):
+            kind = _BOOLEAN
+            np.save(directory / f'{file}.npy', values.fillna(False).to_numpy(dtype=bool))
+            np.save(directory / f'{file}.mask.npy', values.isna().to_numpy())
+        elif pd.api.types.is_numeric_dtype(values.dtype) or pd.api.types.is_bool_dtype(values.dtype):
+            kind = _ARRAY
+            np.save(directory / f'{file}.npy', values.to_numpy())
+        else:
+            kind = _STRING
+            np.save(directory / f'{file}.npy', values.fillna('').to_numpy(dtype=str))
+            np.save(directory / f'{file}.mask.npy', values.isna().to_numpy())
+        columns.append({'name': column, 'file': file, 'kind': kind})
+    return columns
+
+
+def _load_dataframe(directory: Path, columns: List[Dict[str, str]]) -> pd.DataFrame:
+    data = {}
+    for column in columns:
+        values = np.load(directory / f'{column["file"]}.npy', mmap_mode='r')
+        if column['kind'] == _BOOLEAN:
+            mask = np.load(directory / f'{column["file"]}.mask.npy')
+            values = pd.arrays.BooleanArray(np.asarray(values), mask)
+        elif column['kind'] == _STRING:
+            mask = np.load(directory / f'{column["file"]}.mask.npy')
+            values = pd.Series(values.astype(object)).where(~mask).to_numpy()
+        data[column['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def _get_size(directory: Path) -> int:
+    return sum(file.stat().st_size for file in directory.iterdir())
+
+
+@dataclass
+class CachedRun:
+    """Outputs of a simulation run served by `ResultsCache`; `hit` tells whether they were read from the cache."""
+    results: pd.DataFrame
+    monitored_resources: pd.DataFrame
+    summary: ResultsSummary
+    kpis: Dict[str, float]
+    hit: bool
+
+
+class ResultsCache:
+    """Local disk cache of the outputs of simulation runs.
+
+    Runs are addressed by a hash of the settings, the simulation time, the seed, the engine and the package version,
+    so the settings have to use distribution specifications. Every run is stored in its own directory as a NumPy file
+    per column, which is memory-mapped when it is read back. The least recently used runs are evicted once the cache
+    exceeds `max_size` bytes.
+    """
+
+    def __init__(self, path: Path = _RESULTS_CACHE_PATH, max_size: int = 2 * 1024**3):
+        self.path = Path(path)
+        self.max_size = max_size
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def get_key(
+            settings: SimulationSettings,
+            simulation_time: int,
+            seed: int,
+            engine: str = _SIMPY_ENGINE,
+            common_random_numbers: bool = False,
+    ) -> str:
+        description = {
+            'settings': _describe(settings),
+            'simulation_time': simulation_time,
+            'seed': seed,
+            'engine': engine,
+            'common_random_numbers': common_random_numbers,
+            'version': __version__,
+        }
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    @property
+    def size(self) -> int:
+        return sum(_get_size(entry) for entry in self._get_entries())
+
+    def get(
+            self,
+            settings: SimulationSettings,
+            simulation_time: int,
+            seed: int,
+            engine: str = _SIMPY_ENGINE,
+            common_random_numbers: bool = False,
+    ) -> Optional[CachedRun]:
+        """Returns the cached outputs of a run, or None if they are not in the cache."""
+        directory = self.path / self.get_key(settings, simulation_time, seed, engine, common_random_numbers)
+        try:
+            with open(directory / _METADATA_FILE) as file:
+                metadata = json.load(file)
+            cached_run = CachedRun(
+                results=_load_dataframe(directory, metadata[_RESULTS]),
+                monitored_resources=_load_dataframe(directory, metadata[_MONITORED_RESOURCES]),
+                summary=ResultsSummary(**metadata['summary']),
+                kpis=metadata['kpis'],
+                hit=True,
+            )
+            os.utime(directory)
+        except FileNotFoundError:
+            return None
+        return cached_run
+
+    def run(
+            self,
+            settings: SimulationSettings,
+            simulation_time: int,
+            seed: int,
+            engine: str = _SIMPY_ENGINE,
+            common_random_numbers: bool = False,
+    ) -> CachedRun:
+        """Returns the cached outputs of a run, simulating and caching it first if they are not in the cache."""
+        cached_run = self.get(settings, simulation_time, seed, engine, common_random_numbers)
+        if cached_run is not None:
+            return cached_run
+
+        simulator = GasStationSimulator(
+            settings=settings,
+            logging_settings=LoggingSettings.quiet(),
+            seed=seed,
+            common_random_numbers=common_random_numbers,
+            engine=engine,
+        )
+        results = simulator.run(time=simulation_time)
+        cached_run = CachedRun(
+            results=results,
+            monitored_resources=simulator.get_monitored_resources(),
+            summary=simulator.kpis.summary,
+            kpis=simulator.get_kpis(),
+            hit=False,
+        )
+        self._put(self.get_key(settings, simulation_time, seed, engine, common_random_numbers), cached_run)
+        return cached_run
+
+    def clear(self):
+        for entry in self._get_entries():
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def _put(self, key: str, cached_run: CachedRun):
+        # The run is written to a temporary directory and renamed, so readers never see a partially written run.
+        temporary_directory = Path(tempfile.mkdtemp(prefix=f'.{key}.', dir=self.path))
+        try:
+            metadata = {
+                _RESULTS: _save_dataframe(cached_run.results, temporary_directory, _RESULTS),
+                _MONITORED_RESOURCES: _save_dataframe(
+                    cached_run.monitored_resources, temporary_directory, _MONITORED_RESOURCES),
+                'summary': dataclasses.asdict(cached_run.summary),
+                'kpis': cached_run.kpis,
+                'version': __version__,
+                'created': time.time(),
+            }
+            with open(temporary_directory / _METADATA_FILE, 'w') as file:
+                json.dump(metadata, file)
+            os.replace(temporary_directory, self.path / key)
+        except OSError:
+            # Another process has cached the same run in the meantime.
+            shutil.rmtree(temporary_directory, ignore_errors=True)
+        self._evict()
+
+    def _get_entries(self) -> List[Path]:
+        return [entry for entry in self.path.iterdir() if entry.is_dir() and not entry.name.startswith('.')]
+
+    def _evict(self):
+        # The most recently used run is kept even if it exceeds the size on its own.
+        entries = sorted(self._get_entries(), key=lambda entry: entry.stat().st_mtime, reverse=True)
+        size = _get_size(entries[0]) if entries else 0
+        for entry in entries[1:]:
+            size += _get_size(entry)
+            if size > self.max_size:
+                shutil.rmtree(entry, ignore_errors=True)
@@ -0,0 +1,105 @@
+from pathlib import Path
+from typing import Callable, Iterator
+
+import pandas as pd
+
+
+class ResultsSink:
+    """Destination of the customers' results which are written in chunks during the simulation."""
+
+    def open(self):
+        """Called before the first chunk of a new simulation, which replaces the results of the previous one."""
+
+    def write(self, chunk: pd.DataFrame):
+        raise NotImplementedError
+
+    def close(self):
+        """Called after the last chunk of a run; a resumed simulation writes its next chunks after it."""
+
+    def read_chunks(self) -> Iterator[pd.DataFrame]:
+        raise NotImplementedError
+
+
+class CsvResultsSink(ResultsSink):
+    """Appends the chunks to a single CSV file, which is overwritten by the first chunk of a simulation."""
+
+    def __init__(self, path: Path, read_chunk_size: int = 100_000):
+        self.path = Path(path)
+        self._read_chunk_size = read_chunk_size
+        self._header_written = False
+
+    def open(self):
+        self._header_written = False
+
+    def write(self, chunk: pd.DataFrame):
+        chunk.to_csv(self.path, mode='a' if self._header_written else 'w', header=not self._header_written, index=False)
+        self._header_written = True
+
+    def read_chunks(self) -> Iterator[pd.DataFrame]:
+        if not self.path.exists():
+            return
+        yield from pd.read_csv(self.path, chunksize=self._read_chunk_size)
+
+
+class _ChunkFilesResultsSink(ResultsSink):
+    suffix = ''
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._chunks_quantity = 0
+
+    def open(self):
+        self._chunks_quantity = 0
+
+    def write(self, chunk: pd.DataFrame):
+        if self._chunks_quantity == 0:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            for old_chunk in self.directory.glob(f'chunk-*{self.suffix}'):
+                old_chunk.unlink()
+        self._write_chunk(chunk, self.directory / f'chunk-{self._chunks_quantity:06d}{self.suffix}')
+        self._chunks_quantity += 1
+
+    def read_chunks(self) -> Iterator[pd.DataFrame]:
+        for path in sorted(self.directory.glob(f'chunk-*{self.suffix}')):
+            yield self._read_chunk(path)
+
+    def _write_chunk(self, chunk: pd.DataFrame, path: Path):
+        raise NotImplementedError
+
+    def _read_chunk(self, path: Path) -> pd.DataFrame:
+        raise NotImplementedError
+
+
+class ParquetResultsSink(_ChunkFilesResultsSink):
+    """Writes every chunk to a separate Parquet file in `directory`. Requires pyarrow or fastparquet."""
+    suffix = '.parquet'
+
+    def _write_chunk(self, chunk: pd.DataFrame, path: Path):
+        chunk.to_parquet(path, index=False)
+
+    def _read_chunk(self, path: Path) -> pd.DataFrame:
+        return pd.read_parquet(path)
+
+
+class FeatherResultsSink(_ChunkFilesResultsSink):
+    """Writes every chunk to a separate Feather file in `directory`. Requires pyarrow."""
+    suffix = '.feather'
+
+    def _write_chunk(self, chunk: pd.DataFrame, path: Path):
+        chunk.to_feather(path)
+
+    def _read_chunk(self, path: Path) -> pd.DataFrame:
+        return pd.read_feather(path)
+
+
+class CallbackResultsSink(ResultsSink):
+    """Passes every chunk to `callback`; the chunks are not kept, so they cannot be read back."""
+
+    def __init__(self, callback: Callable[[pd.DataFrame], None]):
+        self._callback = callback
+
+    def write(self, chunk: pd.DataFrame):
+        self._callback(chunk)
+
+    def read_chunks(self) -> Iterator[pd.DataFrame]:
+        raise NotImplementedError('Chunks passed to a callback are not stored.')
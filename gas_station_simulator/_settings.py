@@ -1,20 +1,131 @@
+import logging
 from dataclasses import dataclass
-from typing import Callable
+from pathlib import Path
+from typing import Optional, Any, Union
+
+import numpy as np
+
+from gas_station_simulator._distributions import Sampleable, UniformInt, Distribution, _to_sampler
+from gas_station_simulator._monitored_resources import _MONITORED_RESOURCES_PATH
+from gas_station_simulator._staffing import StaffingSchedule
 
 
 @dataclass
 class SimulationSettings:
+    """Settings of a simulated station.
+
+    `cashiers_quantity` may follow a `StaffingSchedule`, and `open_pumps` may close some of the `pumps_quantity`
+    pumps for parts of the day; all of them are open by default.
+    """
     pumps_quantity: int
-    cashiers_quantity: int
-    pump_working_time: Callable[[], int]
-    pump_outage_time: Callable[[], int]
-    customer_fuel_needed: Callable[[], int]
+    cashiers_quantity: Union[int, StaffingSchedule]
+    pump_working_time: Sampleable
+    pump_outage_time: Sampleable
+    customer_fuel_needed: Sampleable
     pump_fueling_speed: float
-    interaction_with_cashier_time: Callable[[], int]
-    interaction_with_cashier_while_getting_food_time: Callable[[], int]
-    food_preparation_time: Callable[[], int]
-    if_eating: Callable[[], bool]
-    next_car_arrival_time: Callable[[], int]
+    interaction_with_cashier_time: Sampleable
+    interaction_with_cashier_while_getting_food_time: Sampleable
+    food_preparation_time: Sampleable
+    if_eating: Sampleable
+    next_car_arrival_time: Sampleable
+    getting_to_the_pump_time: Sampleable = UniformInt(20, 40)
+    leaving_the_pump_after_interruption_time: Sampleable = UniformInt(20, 40)
+    going_to_the_building_time: Sampleable = UniformInt(30, 60)
+    going_back_to_the_car_time: Sampleable = UniformInt(30, 60)
+    leaving_the_station_time: Sampleable = UniformInt(15, 30)
+    open_pumps: Optional[StaffingSchedule] = None
+
+
+# The order defines the random number streams of the common random numbers mode, so new settings go at the end.
+_STOCHASTIC_SETTINGS = (
+    'pump_working_time',
+    'pump_outage_time',
+    'customer_fuel_needed',
+    'interaction_with_cashier_time',
+    'interaction_with_cashier_while_getting_food_time',
+    'food_preparation_time',
+    'if_eating',
+    'next_car_arrival_time',
+    'getting_to_the_pump_time',
+    'leaving_the_pump_after_interruption_time',
+    'going_to_the_building_time',
+    'going_back_to_the_car_time',
+    'leaving_the_station_time',
+)
+
+# Drawn once for every arriving car, so that all scenarios see the same customers in the common random numbers mode.
+_CUSTOMER_SETTINGS = (
+    'customer_fuel_needed',
+    'if_eating',
+    'interaction_with_cashier_time',
+    'interaction_with_cashier_while_getting_food_time',
+    'food_preparation_time',
+    'getting_to_the_pump_time',
+    'going_to_the_building_time',
+    'going_back_to_the_car_time',
+    'leaving_the_station_time',
+)
+
+# Settings drawn again during a visit, under their own names, from streams which follow the ones of
+# `_STOCHASTIC_SETTINGS`. A redraw from a customer's stream would shift the draws of all the later customers.
+_REDRAWN_SETTINGS = {
+    'getting_back_to_the_pump_time': 'getting_to_the_pump_time',
+}
+
+
+class _SampledSettings:
+    """Simulation settings whose distribution specifications are replaced by samplers of a single simulation.
+
+    In the common random numbers mode every stochastic setting gets its own stream spawned from the seed, so
+    simulations of different configurations with the same seed see the same arrivals, customers and pump breakdowns.
+    """
+
+    def __init__(self, settings: SimulationSettings, seed: Optional[int], common_random_numbers: bool = False):
+        self._settings = settings
+        self.common_random_numbers = common_random_numbers
+        streams_quantity = len(_STOCHASTIC_SETTINGS) + len(_REDRAWN_SETTINGS)
+        if common_random_numbers:
+            self._validate_common_random_numbers(settings, seed)
+            seeds = np.random.SeedSequence(seed).spawn(streams_quantity)
+            generators = [np.random.default_rng(stream_seed) for stream_seed in seeds]
+        else:
+            generators = [np.random.default_rng(seed)] * streams_quantity
+        for name, generator in zip(_STOCHASTIC_SETTINGS, generators):
+            setattr(self, name, _to_sampler(getattr(settings, name), generator))
+        for (name, setting), generator in zip(_REDRAWN_SETTINGS.items(), generators[len(_STOCHASTIC_SETTINGS):]):
+            # Without common random numbers the redraws come from the sampler of their setting.
+            setattr(self, name, _to_sampler(getattr(settings, setting), generator) if common_random_numbers
+                    else getattr(self, setting))
+
+    def __getattr__(self, item: str) -> Any:
+        # `_settings` is missing only while unpickling, before the state is restored.
+        if item == '_settings':
+            raise AttributeError(item)
+        return getattr(self._settings, item)
+
+    def start_arrivals_at(self, time: float):
+        """Makes the arrival rate profile, if any, draw the next arrival after `time` instead of after time 0."""
+        start_at = getattr(self.next_car_arrival_time, 'start_at', None)
+        if start_at is not None:
+            start_at(time)
+
+    def skip_customer(self):
+        """Consumes the draws of a car which has not entered the station, to keep the customers' streams aligned."""
+        if self.common_random_numbers:
+            for name in _CUSTOMER_SETTINGS:
+                getattr(self, name)()
+
+    @staticmethod
+    def _validate_common_random_numbers(settings: SimulationSettings, seed: Optional[int]):
+        if seed is None:
+            raise ValueError('The common random numbers mode requires a seed.')
+        _validate_distributions(settings, 'The common random numbers mode')
+
+
+def _validate_distributions(settings: SimulationSettings, feature: str):
+    callables = [name for name in _STOCHASTIC_SETTINGS if not isinstance(getattr(settings, name), Distribution)]
+    if callables:
+        raise ValueError(f'{feature} requires distribution specifications, got callables for: {", ".join(callables)}.')
 
 
 @dataclass
@@ -23,3 +134,22 @@ class ProfitCalculationSettings:
     cashier_hourly_cost: float
     hot_dog_profit: float
     fuel_profit_per_litre: float
+
+
+@dataclass
+class MonitoringSettings:
+    flush_interval: Optional[int] = None
+    path: Path = _MONITORED_RESOURCES_PATH
+
+
+@dataclass
+class LoggingSettings:
+    name: str = 'gas_station'
+    path: Optional[Path] = Path('logs.log')
+    console: bool = True
+    level: int = logging.INFO
+    asynchronous: bool = False
+
+    @classmethod
+    def quiet(cls, name: str = 'gas_station') -> 'LoggingSettings':
+        return cls(name=name, path=None, console=False, level=logging.WARNING)
@@ -0,0 +1,82 @@
+import math
+from dataclasses import dataclass
+from typing import Mapping, Tuple, Union
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class StaffingSchedule:
+    """Quantity of cashiers or open pumps which follows a schedule, e.g. the shifts of a day.
+
+    `quantities` hold for consecutive periods of `period_length` seconds and are repeated cyclically, e.g. 24 hourly
+    quantities of a day or 3 of eight-hour shifts. The station keeps the highest quantity of resources and makes the
+    missing ones unavailable; a cashier or pump which is busy when its shift ends finishes the current customer first.
+    """
+    quantities: Tuple[int, ...]
+    period_length: float = 60**2
+
+    def __post_init__(self):
+        quantities = tuple(int(quantity) for quantity in self.quantities)
+        if not quantities or min(quantities) < 0 or max(quantities) == 0:
+            raise ValueError('Staffing quantities must be a non-empty sequence of non-negative integers, not all zero.')
+        if not self.period_length > 0:
+            raise ValueError('The period length of a staffing schedule must be positive.')
+        object.__setattr__(self, 'quantities', quantities)
+
+    @classmethod
+    def from_shifts(cls, shifts: Mapping[int, int]) -> 'StaffingSchedule':
+        """Creates an hourly schedule of a day from the quantities starting at the given hours, e.g. {6: 3, 22: 1}."""
+        if not shifts or not all(0 <= hour < 24 for hour in shifts):
+            raise ValueError('Shifts have to start at hours from 0 to 23.')
+        starts = sorted(shifts)
+        # Hours before the first shift belong to the last shift of the previous day.
+        quantities = [
+            shifts[max((start for start in starts if start <= hour), default=starts[-1])] for hour in range(24)]
+        return cls(quantities=tuple(quantities))
+
+    @property
+    def max_quantity(self) -> int:
+        return max(self.quantities)
+
+    @property
+    def mean_quantity(self) -> float:
+        return sum(self.quantities) / len(self.quantities)
+
+    @property
+    def cycle_length(self) -> float:
+        return self.period_length * len(self.quantities)
+
+    def get_quantity(self, time: float) -> int:
+        return self.quantities[int(time // self.period_length) % len(self.quantities)]
+
+    def get_next_change_time(self, time: float) -> float:
+        """Returns the first time after `time` when the quantity changes, or infinity if it never does."""
+        period = int(time // self.period_length)
+        quantity = self.quantities[period % len(self.quantities)]
+        for next_period in range(period + 1, period + len(self.quantities) + 1):
+            if self.quantities[next_period % len(self.quantities)] != quantity:
+                return next_period * self.period_length
+        return math.inf
+
+    def get_quantity_hours_by_hour(self, end_time: float) -> np.ndarray:
+        """Returns the quantity multiplied by the time in hours from time 0 to `end_time`, by the hour of day."""
+        hour = 60**2
+        # Hour and period boundaries split the time, so the quantity is constant within every hour of every interval.
+        times = np.unique(np.concatenate([
+            np.arange(0, end_time, hour, dtype=np.float64),
+            np.arange(0, end_time, self.period_length, dtype=np.float64),
+        ]))
+        durations = np.diff(times, append=end_time)
+        quantities = np.asarray(self.quantities, dtype=np.float64)[
+            (times // self.period_length).astype(np.int64) % len(self.quantities)]
+        hours = (times // hour % 24).astype(np.int64)
+        return np.bincount(hours, weights=quantities * durations / hour, minlength=24)
+
+
+def _get_max_quantity(quantity: Union[int, StaffingSchedule]) -> int:
+    return quantity.max_quantity if isinstance(quantity, StaffingSchedule) else quantity
+
+
+def _get_mean_quantity(quantity: Union[int, StaffingSchedule]) -> float:
+    return quantity.mean_quantity if isinstance(quantity, StaffingSchedule) else quantity
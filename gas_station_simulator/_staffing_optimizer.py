@@ -0,0 +1,148 @@
+import dataclasses
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from gas_station_simulator._distributions import ArrivalRateProfile, Exponential
+from gas_station_simulator._estimator import CapacityEstimator, _MONTH, _sample
+from gas_station_simulator._parameter_sweep import ParameterSweep
+from gas_station_simulator._settings import SimulationSettings, ProfitCalculationSettings
+from gas_station_simulator._staffing import StaffingSchedule
+
+
+def _get_hourly_arrival_rates(settings: SimulationSettings, simulation_time: int, seed: Optional[int]) -> np.ndarray:
+    """Returns the average arrivals per hour in every hour of day of the simulation."""
+    arrival_time = settings.next_car_arrival_time
+    if isinstance(arrival_time, ArrivalRateProfile):
+        times = np.arange(0, simulation_time, 60, dtype=np.float64) + 30
+        hours = (times // 60**2 % 24).astype(np.int64)
+        rates = np.bincount(hours, weights=arrival_time.get_rates(times), minlength=24)
+        return rates / np.bincount(hours, minlength=24)
+    mean_arrival_time = float(_sample(arrival_time, np.random.default_rng(seed), 20_000).mean())
+    return np.full(24, 60**2 / mean_arrival_time)
+
+
+class StaffingOptimizer:
+    """Searches the cashiers' staffing schedule which maximises the station's profit.
+
+    The day is split into shifts of `shift_length` hours, starting at midnight, and every shift gets from
+    `min_cashiers` to `max_cashiers` cashiers. The `estimator` method evaluates every shift on its own with the
+    `CapacityEstimator`, as a station with a constant quantity of cashiers and the average arrival rate of the shift,
+    and takes the most profitable quantity of each one. The `simulation` method starts from that schedule and improves
+    it by local search: every step simulates, in parallel with a `ParameterSweep`, the schedules with one cashier more
+    or less in a single shift and moves to the most profitable one, until none of them is better. The simulations use
+    common random numbers by default, which require distribution specifications of the stochastic settings.
+
+    The schedules evaluated by the last `optimize` are kept in `history`.
+    """
+
+    def __init__(
+            self,
+            settings: SimulationSettings,
+            profit_calculation_settings: ProfitCalculationSettings,
+            simulation_time: int = _MONTH,
+            shift_length: int = 8,
+            min_cashiers: int = 1,
+            max_cashiers: int = 6,
+            seed: Optional[int] = 0,
+            max_workers: Optional[int] = None,
+            common_random_numbers: bool = True,
+    ):
+        if shift_length < 1 or 24 % shift_length:
+            raise ValueError(f'The shift length has to divide the 24 hours of a day, got {shift_length}.')
+        if not 1 <= min_cashiers <= max_cashiers:
+            raise ValueError('Cashiers quantities require 1 <= min_cashiers <= max_cashiers.')
+        self.settings = settings
+        self.profit_calculation_settings = profit_calculation_settings
+        self.simulation_time = simulation_time
+        self.shift_length = shift_length
+        self.min_cashiers = min_cashiers
+        self.max_cashiers = max_cashiers
+        self.seed = seed
+        self.max_workers = max_workers
+        self.common_random_numbers = common_random_numbers
+        self.history = pd.DataFrame()
+
+    @property
+    def shifts_quantity(self) -> int:
+        return 24 // self.shift_length
+
+    def get_schedule(self, quantities: Tuple[int, ...]) -> StaffingSchedule:
+        return StaffingSchedule(quantities=quantities, period_length=self.shift_length * 60**2)
+
+    def estimate(self) -> pd.DataFrame:
+        """Returns the estimated monthly profit of a station staffed all the time like every shift (rows) with every
+        quantity of cashiers (columns).
+        """
+        hourly_rates = _get_hourly_arrival_rates(self.settings, self.simulation_time, self.seed)
+        shift_rates = hourly_rates.reshape(self.shifts_quantity, self.shift_length).mean(axis=1)
+        cashiers = range(self.min_cashiers, self.max_cashiers + 1)
+        profits = [
+            [
+                CapacityEstimator(
+                    dataclasses.replace(
+                        self.settings, cashiers_quantity=quantity, next_car_arrival_time=Exponential(60**2 / rate)),
+                    self.profit_calculation_settings,
+                    simulation_time=self.simulation_time,
+                    seed=self.seed,
+                ).estimate()['profit']
+                for quantity in cashiers
+            ]
+            for rate in shift_rates.tolist()
+        ]
+        return pd.DataFrame(
+            profits,
+            index=pd.RangeIndex(0, 24, self.shift_length, name='shift_start_hour'),
+            columns=pd.Index(list(cashiers), name='cashiers_quantity'),
+        )
+
+    def optimize(self, method: str = 'estimator', max_steps: int = 10) -> StaffingSchedule:
+        """Returns the most profitable schedule found with the `estimator` or the `simulation` method."""
+        if method not in ('estimator', 'simulation'):
+            raise ValueError(f'Unknown optimisation method {method}, use estimator or simulation.')
+        shift_profits = self.estimate()
+        quantities = tuple(int(quantity) for quantity in shift_profits.idxmax(axis=1).tolist())
+        # Shifts take equal parts of the day, so the profit of the whole schedule is the mean of the shifts' ones.
+        history: List[Dict[str, Any]] = [{
+            'step': 0,
+            'method': 'estimator',
+            'quantities': quantities,
+            'profit': float(shift_profits.max(axis=1).mean()),
+        }]
+        if method == 'simulation':
+            for step in range(1, max_steps + 1):
+                candidates = [quantities] + self._get_neighbours(quantities)
+                profits = self._simulate(candidates)
+                history.extend(
+                    {'step': step, 'method': 'simulation', 'quantities': candidate, 'profit': profit}
+                    for candidate, profit in zip(candidates, profits)
+                )
+                best = int(np.argmax(profits))
+                if best == 0:
+                    break
+                quantities = candidates[best]
+        self.history = pd.DataFrame(history)
+        return self.get_schedule(quantities)
+
+    def _get_neighbours(self, quantities: Tuple[int, ...]) -> List[Tuple[int, ...]]:
+        neighbours = []
+        for shift, quantity in enumerate(quantities):
+            for change in (-1, 1):
+                if self.min_cashiers <= quantity + change <= self.max_cashiers:
+                    neighbours.append(quantities[:shift] + (quantity + change,) + quantities[shift + 1:])
+        return neighbours
+
+    def _simulate(self, candidates: List[Tuple[int, ...]]) -> List[float]:
+        sweep = ParameterSweep(
+            scenarios=[
+                dataclasses.replace(self.settings, cashiers_quantity=self.get_schedule(quantities))
+                for quantities in candidates
+            ],
+            profit_calculation_settings=self.profit_calculation_settings,
+            simulation_time=self.simulation_time,
+            seed=self.seed,
+            max_workers=self.max_workers,
+            common_random_numbers=self.common_random_numbers,
+        )
+        return sweep.run()['profit'].astype(float).tolist()
@@ -0,0 +1,301 @@
+import asyncio
+import dataclasses
+import json
+import math
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from gas_station_simulator._gas_station_simulator import GasStationSimulator
+from gas_station_simulator._monitored_resources import _get_window_averages
+from gas_station_simulator._profit_calculator import ProfitCalculator
+from gas_station_simulator._settings import ProfitCalculationSettings, SimulationSettings
+from gas_station_simulator._staffing import _get_max_quantity
+
+_HTTP_REASONS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+def _get_capacities(settings: SimulationSettings) -> Dict[str, int]:
+    return {
+        'cashiers': _get_max_quantity(settings.cashiers_quantity),
+        'fuel_pump_parking': settings.pumps_quantity,
+        'fuel_pumps': settings.pumps_quantity,
+        'gas_station_parking': settings.pumps_quantity * 4,
+    }
+
+
+def _to_json(value: Any) -> Any:
+    # NaN is not valid JSON, so the statistics which are not known yet are sent as nulls.
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, dict):
+        return {key: _to_json(item) for key, item in value.items()}
+    return value
+
+
+@dataclass
+class SimulationSnapshot:
+    """State of a streamed simulation after one of its slices.
+
+    `utilisation` holds the time-weighted average share of every monitored resource in use during the slice and
+    `profit` the monthly profit of the simulation so far, if the stream has the profit calculation settings.
+    """
+    name: str
+    time: float
+    end_time: int
+    cars_quantity: int
+    missed_cars_quantity: int
+    utilisation: Dict[str, float]
+    profit: Optional[int]
+    kpis: Dict[str, float]
+    finished: bool
+
+    @property
+    def progress(self) -> float:
+        return self.time / self.end_time
+
+    def to_dict(self) -> Dict[str, Any]:
+        return _to_json({**dataclasses.asdict(self), 'progress': self.progress})
+
+
+class SimulationStream:
+    """Runs a simulation until `time` in slices of `slice_length` simulated seconds and publishes a
+    `SimulationSnapshot` after every slice.
+
+    `run` is a coroutine which gives the control back to the event loop between the slices, so many streams and an
+    HTTP server can share a loop. Slices run in the loop's thread, or in `executor` if it is given. Every subscriber
+    gets a queue of at most `queue_size` snapshots; a slow subscriber loses its oldest snapshots instead of holding the
+    simulation back. The queues get None when the stream ends, also when it is cancelled.
+    """
+
+    def __init__(
+            self,
+            simulator: GasStationSimulator,
+            time: int,
+            slice_length: int = 60**2,
+            profit_calculation_settings: Optional[ProfitCalculationSettings] = None,
+            name: str = 'simulation',
+            executor: Optional[Executor] = None,
+            queue_size: int = 100,
+    ):
+        if slice_length <= 0:
+            raise ValueError(f'The slice length has to be positive, got {slice_length}.')
+        self.simulator = simulator
+        self.time = time
+        self.slice_length = slice_length
+        self.profit_calculation_settings = profit_calculation_settings
+        self.name = name
+        self.executor = executor
+        self.queue_size = queue_size
+        self.latest: Optional[SimulationSnapshot] = None
+        self.cancelled = False
+        self._subscribers: List[asyncio.Queue] = []
+        self._capacities = _get_capacities(simulator.settings)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.cancelled or (self.latest is not None and self.latest.finished)
+
+    def subscribe(self) -> asyncio.Queue:
+        """Returns a queue of the next snapshots, starting with the latest one."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.latest is not None:
+            queue.put_nowait(self.latest)
+        if self.done:
+            queue.put_nowait(None)
+        else:
+            self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+    async def snapshots(self) -> AsyncIterator[SimulationSnapshot]:
+        queue = self.subscribe()
+        try:
+            while True:
+                snapshot = await queue.get()
+                if snapshot is None:
+                    return
+                yield snapshot
+        finally:
+            self.unsubscribe(queue)
+
+    def start(self) -> asyncio.Task:
+        """Runs the stream as a task of the running event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run(), name=self.name)
+        return self._task
+
+    def cancel(self):
+        self.cancelled = True
+        if self._task is not None:
+            self._task.cancel()
+
+    async def run(self) -> Optional[SimulationSnapshot]:
+        """Runs the rest of the simulation and returns its last snapshot.
+
+        The simulator is closed, with its results sink, when the stream ends, also when it is cancelled.
+        """
+        simulator = self.simulator
+        slice_future: Optional[Future] = None
+        try:
+            while not self.cancelled and simulator.now < self.time:
+                start = simulator.now
+                end = min(start + self.slice_length, self.time)
+                if self.executor is None:
+                    simulator.advance(end, resume=start > 0)
+                else:
+                    slice_future = self.executor.submit(simulator.advance, end, resume=start > 0)
+                    await asyncio.wrap_future(slice_future)
+                self._publish(self._get_snapshot(start, end))
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        finally:
+            # A slice cancelled in an executor may still be running, so the simulator is closed after it.
+            if slice_future is not None and not slice_future.done():
+                slice_future.add_done_callback(lambda _: simulator.close())
+            else:
+                simulator.close()
+            for queue in self._subscribers:
+                self._put(queue, None)
+            self._subscribers.clear()
+        return self.latest
+
+    def _get_snapshot(self, start: float, end: float) -> SimulationSnapshot:
+        simulator = self.simulator
+        averages = _get_window_averages(simulator._get_monitors(), start, end)  # noqa
+        summary = simulator.kpis.summary
+        profit = None
+        if self.profit_calculation_settings is not None and summary.cars_quantity:
+            profit = ProfitCalculator(
+                simulation_settings=simulator.settings,
+                profit_calculation_settings=self.profit_calculation_settings,
+                results=summary,
+                simulation_time=int(end),
+            ).calculate()['profit']
+        return SimulationSnapshot(
+            name=self.name,
+            time=end,
+            end_time=self.time,
+            cars_quantity=summary.cars_quantity,
+            missed_cars_quantity=summary.missed_cars_quantity,
+            utilisation={name: average / self._capacities[name] for name, average in averages.items()},
+            profit=profit,
+            kpis=simulator.get_kpis(),
+            finished=end >= self.time,
+        )
+
+    def _publish(self, snapshot: SimulationSnapshot):
+        self.latest = snapshot
+        for queue in self._subscribers:
+            self._put(queue, snapshot)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, snapshot: Optional[SimulationSnapshot]):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(snapshot)
+
+
+class SimulationService:
+    """Runs many `SimulationStream`s concurrently in one event loop and serves them over a minimal HTTP API.
+
+    The API is a stand-in for local testing of dashboards, not a production server:
+
+    - `GET /simulations` returns the latest snapshots of all the simulations,
+    - `GET /simulations/<name>` returns the latest snapshot of one of them,
+    - `GET /simulations/<name>/events` streams its snapshots as server-sent events,
+    - `DELETE /simulations/<name>` cancels it.
+    """
+
+    def __init__(self):
+        self.streams: Dict[str, SimulationStream] = {}
+
+    def start(self, stream: SimulationStream) -> asyncio.Task:
+        if stream.name in self.streams:
+            raise ValueError(f'There already is a simulation named {stream.name}.')
+        self.streams[stream.name] = stream
+        return stream.start()
+
+    def cancel(self, name: str):
+        self.streams[name].cancel()
+
+    async def wait(self) -> Dict[str, Optional[SimulationSnapshot]]:
+        """Waits for all the simulations and returns their last snapshots; the cancelled ones return their latest."""
+        streams = list(self.streams.values())
+        await asyncio.gather(*(stream.start() for stream in streams), return_exceptions=True)
+        return {stream.name: stream.latest for stream in streams}
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8080) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            while (await reader.readline()).strip():
+                pass
+            if len(request_line) < 2:
+                await self._respond(writer, 400, {'error': 'Malformed request.'})
+                return
+            method, path = request_line[0], request_line[1].rstrip('/')
+            status, body, stream = self._route(method, path)
+            if stream is None:
+                await self._respond(writer, status, body)
+            else:
+                await self._stream_events(writer, stream)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _route(self, method: str, path: str) -> Tuple[int, Any, Optional[SimulationStream]]:
+        parts = path.split('/')[1:]
+        if not parts or parts[0] != 'simulations' or len(parts) > 3:
+            return 404, {'error': f'Unknown path {path}.'}, None
+        if len(parts) == 1:
+            if method != 'GET':
+                return 405, {'error': f'Method {method} is not allowed.'}, None
+            return 200, {
+                name: stream.latest.to_dict() if stream.latest is not None else None
+                for name, stream in self.streams.items()
+            }, None
+        stream = self.streams.get(parts[1])
+        if stream is None:
+            return 404, {'error': f'Unknown simulation {parts[1]}.'}, None
+        if len(parts) == 3:
+            if parts[2] != 'events' or method != 'GET':
+                return 404, {'error': f'Unknown path {path}.'}, None
+            return 200, None, stream
+        if method == 'DELETE':
+            stream.cancel()
+            return 202, {'cancelled': stream.name}, None
+        if method != 'GET':
+            return 405, {'error': f'Method {method} is not allowed.'}, None
+        return 200, stream.latest.to_dict() if stream.latest is not None else None, None
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, body: Any):
+        content = json.dumps(body, allow_nan=False).encode()
+        writer.write(
+            f'HTTP/1.1 {status} {_HTTP_REASONS[status]}\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(content)}\r\nConnection: close\r\n\r\n'.encode() + content
+        )
+        await writer.drain()
+
+    @staticmethod
+    async def _stream_events(writer: asyncio.StreamWriter, stream: SimulationStream):
+        writer.write(
+            b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+            b'Connection: close\r\n\r\n'
+        )
+        await writer.drain()
+        async for snapshot in stream.snapshots():
+            writer.write(f'data: {json.dumps(snapshot.to_dict(), allow_nan=False)}\n\n'.encode())
+            await writer.drain()
+        writer.write(b'event: end\ndata: {}\n\n')
+        await writer.drain()
@@ -0,0 +1,312 @@
+import functools
+import json
+import math
+import os
+from enum import IntEnum
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from gas_station_simulator._customer_results import _CustomerResultsRecorder, _FLOAT_COLUMNS, CustomerData
+from gas_station_simulator._monitored_resources import _ResourceMonitor, _align_monitored_data
+from gas_station_simulator._utils import _get_time_string
+
+_TRACE_MAGIC = b'GSTRACE1'
+# The header holds the magic bytes, the quantity of records, the length of the JSON metadata and the metadata itself.
+_HEADER_SIZE = 4096
+_HEADER_PREFIX = np.dtype([('magic', 'S8'), ('size', '<u8'), ('metadata_length', '<u8')])
+_RECORD = np.dtype([
+    ('time', '<f8'),
+    ('event', 'u1'),
+    ('flag', 'u1'),
+    ('customer', '<i8'),
+    ('value', '<f8'),
+    ('extra', '<f8'),
+])
+_BLOCK_SIZE = 4096
+
+
+class TraceEvent(IntEnum):
+    """State transitions recorded by a `TraceRecorder`.
+
+    Records of the customers keep their numbers; `ARRIVAL` keeps the fuel needed as the value, the expected fueling
+    time as the extra value and whether the customer eats as the flag, `PUMP_INTERRUPT` the fueling time gotten so
+    far and the expected one and `LEAVE` the time spent in the station. `PUMP_BREAK` keeps the outage time and
+    `RESOURCE` the index of the monitored resource instead of a customer and its new value.
+    """
+    ARRIVAL = 0
+    BALK = 1
+    PUMP_PARKING_PLACE = 2
+    PUMP_ACQUIRE = 3
+    PUMP_INTERRUPT = 4
+    FUELED = 5
+    PUMP_RELEASE = 6
+    CASHIER_REQUEST = 7
+    CASHIER_START = 8
+    CASHIER_END = 9
+    FOOD_WAIT = 10
+    FOOD_READY = 11
+    FOOD_TAKEN = 12
+    LEAVE = 13
+    PUMP_BREAK = 14
+    PUMP_REPAIR = 15
+    RESOURCE = 16
+
+
+_MESSAGES = {
+    TraceEvent.ARRIVAL: '[Car {customer}]: Entering the station.',
+    TraceEvent.BALK: '[Car {customer}]: Missed the station since there are no left parking places.',
+    TraceEvent.PUMP_PARKING_PLACE: '[Car {customer}]: Entering a fuel pump parking place.',
+    TraceEvent.PUMP_ACQUIRE: '[Car {customer}]: Fueling.',
+    TraceEvent.PUMP_INTERRUPT: '[Car {customer}]: Fueling has been interrupted. Have {percentage:.2f}% of the fuel'
+                               ' needed.',
+    TraceEvent.FUELED: '[Car {customer}]: Fueling succeeded.',
+    TraceEvent.PUMP_RELEASE: '[Car {customer}]: Releasing a pump.',
+    TraceEvent.CASHIER_REQUEST: '[Car {customer}]: Waiting at the counter.',
+    TraceEvent.CASHIER_START: '[Car {customer}]: Interacting with the cashier.',
+    TraceEvent.CASHIER_END: '[Car {customer}]: Paid.',
+    TraceEvent.FOOD_WAIT: '[Car {customer}]: Waiting for a hot-dog.',
+    TraceEvent.FOOD_READY: '[Car {customer}]: The hot-dog is ready.',
+    TraceEvent.FOOD_TAKEN: '[Car {customer}]: Got a hot-dog.',
+    TraceEvent.LEAVE: '[Car {customer}]: Leaving the station.',
+    TraceEvent.PUMP_BREAK: '[PUMP BREAK]: One of the pumps has broken and will be unavailable for {duration}.',
+    TraceEvent.PUMP_REPAIR: '[PUMP BREAK]: The pump is repaired.',
+    TraceEvent.RESOURCE: '[STATION]: {resource} at {value:g}.',
+}
+
+# Events which set the columns of the customers' results to their times.
+_RESULTS_COLUMNS_BY_EVENT = {
+    TraceEvent.FUELED: 'fueling_end_time',
+    TraceEvent.CASHIER_START: 'interacting_with_cashier_start_time',
+    TraceEvent.CASHIER_END: 'interacting_with_cashier_end_time',
+    TraceEvent.FOOD_WAIT: 'waiting_for_food_time_start_time',
+    TraceEvent.FOOD_TAKEN: 'waiting_for_food_time_end_time',
+}
+
+
+def _read_header(file) -> Tuple[int, Dict[str, Any]]:
+    prefix = np.frombuffer(file.read(_HEADER_PREFIX.itemsize), dtype=_HEADER_PREFIX)[0]
+    if prefix['magic'] != _TRACE_MAGIC:
+        raise ValueError(f'{file.name} is not a simulation trace.')
+    metadata = json.loads(file.read(int(prefix['metadata_length'])))
+    return int(prefix['size']), metadata
+
+
+class TraceRecorder:
+    """Records the state transitions of a simulation as fixed-width binary records in a memory-mapped file.
+
+    Pass it to `GasStationSimulator` to trace a run, including its resumed parts, and read it with `TraceReader`.
+    Records are written in blocks and the file is grown by doubling; the header is updated by `flush`, which the
+    simulator calls at the end of every run, and by `close`.
+    """
+
+    def __init__(self, path: Path, capacity: int = 1 << 16):
+        self.path = Path(path)
+        self._capacity = max(capacity, _BLOCK_SIZE)
+        self._size = 0
+        self._buffer: List[Tuple[float, int, int, int, float, float]] = []
+        self._resources: List[str] = []
+        with open(self.path, 'wb') as file:
+            file.truncate(_HEADER_SIZE + self._capacity * _RECORD.itemsize)
+        self._records: Optional[np.memmap] = self._open_records()
+        self._write_header()
+
+    def __len__(self) -> int:
+        return self._size + len(self._buffer)
+
+    def __enter__(self) -> 'TraceRecorder':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def record(
+            self,
+            time: float,
+            event: TraceEvent,
+            customer: int = -1,
+            value: float = math.nan,
+            extra: float = math.nan,
+            flag: int = 0,
+    ):
+        self._buffer.append((time, event, flag, customer, value, extra))
+        if len(self._buffer) >= _BLOCK_SIZE:
+            self._write_buffer()
+
+    def attach_monitors(self, monitors: Sequence[_ResourceMonitor]):
+        """Records the samples the `monitors` already have and all their next ones as `RESOURCE` records."""
+        times, indices, values = [np.empty(0)], [np.empty(0, dtype=np.int64)], [np.empty(0)]
+        for monitor in monitors:
+            index = len(self._resources)
+            self._resources.append(monitor.name)
+            times.append(np.frombuffer(monitor.times, dtype=np.float64))
+            indices.append(np.full(len(monitor), index))
+            values.append(np.frombuffer(monitor.values, dtype=np.float64))
+            monitor.trace = functools.partial(self._record_resource, index)
+        # The samples of a resumed run are merged by time, since the reader searches the records by their times.
+        times, indices, values = np.concatenate(times), np.concatenate(indices), np.concatenate(values)
+        for position in np.argsort(times, kind='stable'):
+            self.record(float(times[position]), TraceEvent.RESOURCE, int(indices[position]), float(values[position]))
+
+    def flush(self):
+        self._write_buffer()
+        self._records.flush()
+        self._write_header()
+
+    def close(self):
+        if self._records is None:
+            return
+        self.flush()
+        self._records = None
+        os.truncate(self.path, _HEADER_SIZE + self._size * _RECORD.itemsize)
+
+    def _record_resource(self, index: int, time: float, value: float):
+        self._buffer.append((time, TraceEvent.RESOURCE, 0, index, value, math.nan))
+        if len(self._buffer) >= _BLOCK_SIZE:
+            self._write_buffer()
+
+    def _open_records(self) -> np.memmap:
+        return np.memmap(self.path, dtype=_RECORD, mode='r+', offset=_HEADER_SIZE, shape=(self._capacity,))
+
+    def _write_buffer(self):
+        if not self._buffer:
+            return
+        if self._size + len(self._buffer) > self._capacity:
+            self._records.flush()
+            self._records = None
+            while self._size + len(self._buffer) > self._capacity:
+                self._capacity *= 2
+            os.truncate(self.path, _HEADER_SIZE + self._capacity * _RECORD.itemsize)
+            self._records = self._open_records()
+        self._records[self._size:self._size + len(self._buffer)] = self._buffer
+        self._size += len(self._buffer)
+        self._buffer.clear()
+
+    def _write_header(self):
+        metadata = json.dumps({'resources': self._resources}).encode()
+        if _HEADER_PREFIX.itemsize + len(metadata) > _HEADER_SIZE:
+            raise ValueError('The metadata of the trace do not fit in its header.')
+        prefix = np.array([(_TRACE_MAGIC, self._size, len(metadata))], dtype=_HEADER_PREFIX)
+        with open(self.path, 'r+b') as file:
+            file.write(prefix.tobytes() + metadata)
+
+
+class TraceReader:
+    """Queries a trace written by `TraceRecorder` through a read-only memory map, without parsing any text.
+
+    Records are in the order of the simulation time, so time windows are found by binary search.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as file:
+            size, metadata = _read_header(file)
+        self.resources: List[str] = metadata['resources']
+        self.records = (
+            np.memmap(self.path, dtype=_RECORD, mode='r', offset=_HEADER_SIZE, shape=(size,))
+            if size else np.empty(0, dtype=_RECORD)
+        )
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def query(
+            self,
+            start: Optional[float] = None,
+            end: Optional[float] = None,
+            customers: Optional[Iterable[int]] = None,
+            events: Optional[Iterable[TraceEvent]] = None,
+    ) -> np.ndarray:
+        """Returns the records from `start` (inclusive) to `end` (exclusive) of the `customers` and the `events`."""
+        times = self.records['time']
+        first = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+        last = len(times) if end is None else int(np.searchsorted(times, end, side='left'))
+        records = self.records[first:last]
+        mask = np.ones(len(records), dtype=bool)
+        if customers is not None:
+            customer_records = records['event'] != TraceEvent.RESOURCE
+            mask &= customer_records & np.isin(records['customer'], np.fromiter(customers, dtype=np.int64))
+        if events is not None:
+            mask &= np.isin(records['event'], np.fromiter(events, dtype=np.uint8))
+        return records if mask.all() else records[mask]
+
+    def to_dataframe(self, records: Optional[np.ndarray] = None) -> pd.DataFrame:
+        records = self.records if records is None else records
+        dataframe = pd.DataFrame({name: records[name] for name in _RECORD.names})
+        dataframe['event'] = pd.Categorical.from_codes(
+            dataframe['event'], categories=[event.name for event in TraceEvent])
+        return dataframe
+
+    def render(self, records: Optional[np.ndarray] = None) -> Iterator[str]:
+        """Yields the records as lines in the format of the simulation log."""
+        records = self.records if records is None else records
+        for time, event, flag, customer, value, extra in records.tolist():
+            event = TraceEvent(event)
+            message = _MESSAGES[event].format(
+                customer=customer,
+                value=value,
+                percentage=value / extra * 100 if event == TraceEvent.PUMP_INTERRUPT else math.nan,
+                duration=_get_time_string(int(value), print_days=False) if event == TraceEvent.PUMP_BREAK else '',
+                resource=self.resources[customer] if event == TraceEvent.RESOURCE else '',
+            )
+            yield f'{_get_time_string(int(time))}: {message}'
+
+    def get_results(self) -> pd.DataFrame:
+        """Rebuilds the results of the customers who left the station, like `GasStationSimulator.get_results`."""
+        return self._get_results_recorder().to_dataframe()
+
+    def get_customers_data(self) -> List[CustomerData]:
+        return self._get_results_recorder().to_customer_data()
+
+    def get_monitored_resources(self, step: Optional[int] = None) -> pd.DataFrame:
+        """Rebuilds the monitored resources, like `GasStationSimulator.get_monitored_resources`."""
+        records = self.records[self.records['event'] == TraceEvent.RESOURCE]
+        monitors = []
+        for index, name in enumerate(self.resources):
+            resource_records = records[records['customer'] == index]
+            monitor = _ResourceMonitor(name)
+            monitor.times.frombytes(np.ascontiguousarray(resource_records['time']).tobytes())
+            monitor.values.frombytes(np.ascontiguousarray(resource_records['value']).tobytes())
+            monitors.append(monitor)
+        if not monitors:
+            return pd.DataFrame()
+        return _align_monitored_data(monitors, step=step)
+
+    def _get_results_recorder(self) -> _CustomerResultsRecorder:
+        events = self.records['event']
+        arrivals = self.records[(events == TraceEvent.ARRIVAL) | (events == TraceEvent.BALK)]
+        numbers = arrivals['customer']
+        order = np.argsort(numbers, kind='stable')
+        # Customers who arrived before the trace started, e.g. in a simulation restored from a checkpoint, are left out.
+        records = self.records[(events != TraceEvent.RESOURCE) & np.isin(self.records['customer'], numbers)]
+        events = records['event']
+
+        def get_rows(customers: np.ndarray) -> np.ndarray:
+            return order[np.searchsorted(numbers, customers, sorter=order)]
+
+        enter = arrivals['event'] == TraceEvent.ARRIVAL
+        floats = {column: np.full(len(arrivals), np.nan) for column in _FLOAT_COLUMNS}
+        floats['arrival_time'][:] = arrivals['time']
+        floats['fuel_needed'][enter] = arrivals['value'][enter]
+        floats['expected_fueling_time'][enter] = arrivals['extra'][enter]
+
+        acquisitions = records[events == TraceEvent.PUMP_ACQUIRE]
+        # Only the first acquisition of a pump starts the fueling, the next ones continue an interrupted one.
+        _, first_acquisitions = np.unique(acquisitions['customer'], return_index=True)
+        acquisitions = acquisitions[first_acquisitions]
+        floats['fueling_start_time'][get_rows(acquisitions['customer'])] = acquisitions['time']
+        for event, column in _RESULTS_COLUMNS_BY_EVENT.items():
+            event_records = records[events == event]
+            floats[column][get_rows(event_records['customer'])] = event_records['time']
+
+        finished = ~enter
+        finished[get_rows(records[events == TraceEvent.LEAVE]['customer'])] = True
+        return _CustomerResultsRecorder.from_columns({
+            'number': numbers,
+            'enter': enter,
+            'eating': enter & (arrivals['flag'] == 1),
+            'finished': finished,
+            **floats,
+        })
@@ -1,4 +1,8 @@
-from math import floor
+from math import atan, cos, floor, pi, sin, sqrt
+from statistics import NormalDist
+
+# Degrees of freedom up to which the quantiles of the t-distribution are computed exactly.
+_EXACT_QUANTILE_DEGREES_OF_FREEDOM = 10
 
 
 def _get_time_string(time: int, print_days: bool = True) -> str:
@@ -22,3 +26,55 @@ def _get_time_string(time: int, print_days: bool = True) -> str:
         if print_days
         else f'{hours:02d}:{minutes:02d}:{left_time:02d}'
     )
+
+
+def _student_t_distribution(t: float, degrees_of_freedom: int) -> float:
+    """Returns the exact cumulative distribution function of the Student's t-distribution with integer degrees of
+    freedom, from its finite series in the angle `atan(t / sqrt(degrees_of_freedom))`."""
+    theta = atan(t / sqrt(degrees_of_freedom))
+    cos_squared = cos(theta)**2
+    if degrees_of_freedom % 2:
+        term, series = cos(theta), 0.0
+        for j in range(1, (degrees_of_freedom - 1) // 2 + 1):
+            series += term
+            term *= cos_squared * 2 * j / (2 * j + 1)
+        probability = 2 / pi * (theta + sin(theta) * series)
+    else:
+        term, series = 1.0, 0.0
+        for j in range(1, degrees_of_freedom // 2 + 1):
+            series += term
+            term *= cos_squared * (2 * j - 1) / (2 * j)
+        probability = sin(theta) * series
+    return 0.5 + probability / 2
+
+
+def _student_t_quantile(probability: float, degrees_of_freedom: int) -> float:
+    """Returns the quantile of the Student's t-distribution.
+
+    The Cornish-Fisher expansion is too narrow for a few degrees of freedom (11.30 instead of 12.71 for the 97.5%
+    quantile with one), so up to `_EXACT_QUANTILE_DEGREES_OF_FREEDOM` the exact distribution function is inverted by
+    bisection instead.
+    """
+    if degrees_of_freedom <= _EXACT_QUANTILE_DEGREES_OF_FREEDOM:
+        if probability < 0.5:
+            return -_student_t_quantile(1 - probability, degrees_of_freedom)
+        low, high = 0.0, 1.0
+        while _student_t_distribution(high, degrees_of_freedom) < probability:
+            low, high = high, 2 * high
+        for _ in range(100):
+            middle = (low + high) / 2
+            if _student_t_distribution(middle, degrees_of_freedom) < probability:
+                low = middle
+            else:
+                high = middle
+        return (low + high) / 2
+
+    z = NormalDist().inv_cdf(probability)
+    n = degrees_of_freedom
+    return (
+        z
+        + (z**3 + z) / (4 * n)
+        + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * n**2)
+        + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * n**3)
+        + (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z) / (92160 * n**4)
+    )
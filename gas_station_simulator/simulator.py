@@ -1,10 +1,8 @@
 if __name__ == '__main__':
     import random
 
-    import numpy as np
-
     from gas_station_simulator import SimulationSettings, ProfitCalculationSettings, GasStationSimulator, \
-        ProfitCalculator
+        ProfitCalculator, Exponential, Gamma, Normal, Binomial, UniformInt
 
     random.seed(0)
 
@@ -22,18 +20,18 @@ if __name__ == '__main__':
     settings = SimulationSettings(
         pumps_quantity=pumps_quantity,
         cashiers_quantity=3,
-        pump_working_time=lambda: int(np.random.exponential(2 * 24 * 60 * 60 / pumps_quantity)),
-        pump_outage_time=lambda: int(np.random.gamma(50 * 60, 250 / (50 * 60))),
-        interaction_with_cashier_time=lambda: int(np.random.normal(2 * 60, 20)),
-        interaction_with_cashier_while_getting_food_time=lambda: random.randint(30, 60),
-        food_preparation_time=lambda: random.randint(2 * 60, 3 * 60),
-        if_eating=lambda: np.random.binomial(1, 0.4) == 1,
-        next_car_arrival_time=lambda: int(np.random.exponential(average_arrival_time)),
-        customer_fuel_needed=lambda: int(np.random.exponential(50)),
+        pump_working_time=Exponential(2 * 24 * 60 * 60 / pumps_quantity),
+        pump_outage_time=Gamma(50 * 60, 250 / (50 * 60)),
+        interaction_with_cashier_time=Normal(2 * 60, 20),
+        interaction_with_cashier_while_getting_food_time=UniformInt(30, 60),
+        food_preparation_time=UniformInt(2 * 60, 3 * 60),
+        if_eating=Binomial(1, 0.4),
+        next_car_arrival_time=Exponential(average_arrival_time),
+        customer_fuel_needed=Exponential(50),
         pump_fueling_speed=0.2,
     )
 
-    gas_station_simulator = GasStationSimulator(settings=settings)
+    gas_station_simulator = GasStationSimulator(settings=settings, seed=0)
     results = gas_station_simulator.run(time=simulation_time, save=False)
 
     monitored_resources = gas_station_simulator.get_monitored_resources()
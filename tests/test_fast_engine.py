@@ -0,0 +1,100 @@
+import dataclasses
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gas_station_simulator import SimulationSettings, GasStationSimulator, LoggingSettings, StaffingSchedule, \
+    Exponential, Gamma, Normal, Binomial, UniformInt
+
+SIMULATION_TIME = 60**2 * 24 * 3
+SEEDS = range(6)
+KPIS = (
+    'cars_quantity',
+    'missed_cars_quantity',
+    'hot_dogs_quantity',
+    'pump_waiting_time_mean',
+    'cashier_waiting_time_mean',
+    'time_in_station_mean',
+)
+# Differences of the means are allowed up to this many standard errors of the difference.
+STANDARD_ERRORS = 3
+
+SETTINGS = SimulationSettings(
+    pumps_quantity=10,
+    cashiers_quantity=3,
+    pump_working_time=Exponential(2 * 24 * 60 * 60 / 10),
+    pump_outage_time=Gamma(50 * 60, 250 / (50 * 60)),
+    interaction_with_cashier_time=Normal(2 * 60, 20),
+    interaction_with_cashier_while_getting_food_time=UniformInt(30, 60),
+    food_preparation_time=UniformInt(2 * 60, 3 * 60),
+    if_eating=Binomial(1, 0.4),
+    next_car_arrival_time=Exponential(24 * 60 * 60 / 80_000 * 50 / 0.9),
+    customer_fuel_needed=Exponential(50),
+    pump_fueling_speed=0.2,
+)
+STAFFED_SETTINGS = dataclasses.replace(
+    SETTINGS,
+    cashiers_quantity=StaffingSchedule.from_shifts({6: 3, 14: 4, 22: 1}),
+    open_pumps=StaffingSchedule.from_shifts({6: 10, 22: 6}),
+)
+
+
+def _get_statistics(settings: SimulationSettings, engine: str) -> pd.DataFrame:
+    rows = []
+    for seed in SEEDS:
+        simulator = GasStationSimulator(settings, logging_settings=LoggingSettings.quiet(), seed=seed, engine=engine)
+        simulator.run(SIMULATION_TIME, return_dataframe=False)
+        kpis = simulator.get_kpis()
+        rows.append({
+            **{kpi: kpis[kpi] for kpi in KPIS},
+            **simulator.get_monitored_resources_by_hour().mean().to_dict(),
+        })
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize('settings', [SETTINGS, STAFFED_SETTINGS], ids=['constant', 'staffing schedules'])
+def test_fast_engine_matches_simpy_engine(settings):
+    simpy_statistics = _get_statistics(settings, 'simpy')
+    fast_statistics = _get_statistics(settings, 'fast')
+
+    assert list(fast_statistics.columns) == list(simpy_statistics.columns)
+    difference = (fast_statistics.mean() - simpy_statistics.mean()).abs()
+    standard_error = np.sqrt(simpy_statistics.var() / len(SEEDS) + fast_statistics.var() / len(SEEDS))
+    mismatched = difference[difference > STANDARD_ERRORS * standard_error]
+    assert mismatched.empty, f'Statistics of the engines differ: {mismatched.to_dict()}'
+
+
+def _get_tie_settings() -> SimulationSettings:
+    # A single car gets to the only pump at 120 and fuels for 50 seconds, until the pump breaks at 170.
+    arrival_times = itertools.chain([100], itertools.repeat(10**9))
+    return SimulationSettings(
+        pumps_quantity=1,
+        cashiers_quantity=1,
+        pump_working_time=lambda: 170,
+        pump_outage_time=lambda: 100,
+        customer_fuel_needed=lambda: 10,
+        pump_fueling_speed=0.2,
+        interaction_with_cashier_time=lambda: 60,
+        interaction_with_cashier_while_getting_food_time=lambda: 30,
+        food_preparation_time=lambda: 120,
+        if_eating=lambda: 0,
+        next_car_arrival_time=lambda: next(arrival_times),
+        getting_to_the_pump_time=lambda: 20,
+        leaving_the_pump_after_interruption_time=lambda: 20,
+        going_to_the_building_time=lambda: 30,
+        going_back_to_the_car_time=lambda: 30,
+        leaving_the_station_time=lambda: 15,
+    )
+
+
+@pytest.mark.parametrize('engine', ['simpy', 'fast'])
+def test_pump_breaking_when_the_tank_gets_full_completes_the_fueling(engine):
+    simulator = GasStationSimulator(_get_tie_settings(), logging_settings=LoggingSettings.quiet(), engine=engine)
+    results = simulator.run(60**2)
+
+    assert simulator.get_kpis()['cars_quantity'] == len(results) == 1
+    assert results.loc[0, 'fueling_start_time'] == 120
+    assert results.loc[0, 'fueling_end_time'] == 170
+    assert results.loc[0, 'interacting_with_cashier_start_time'] == 200